@@ -1,5 +1,5 @@
-from ethereum.tools import _solidity
-from ethereum.abi import ContractTranslator
+from eth_compile_cache import CompilationCache, IMPORT_RE
+from concurrent.futures import ProcessPoolExecutor
 from subprocess import CalledProcessError
 import click
 import json
@@ -16,13 +16,26 @@ ch.setFormatter(formatter)
 logger.addHandler(ch)
 
 
+def compile_abi(file_path, extra_args):
+    # Runs in a worker process when sources are compiled one by one
+    try:
+        return CompilationCache().compile_file(file_path, libraries=None, combined='abi', extra_args=extra_args)
+    except CalledProcessError:
+        return None
+
+
 class EthABI:
 
-    def __init__(self, f, contract_dir, abi_dir):
-        self.solidity = _solidity
+    def __init__(self, f, contract_dir, abi_dir, workers=None):
+        self.solidity = CompilationCache()
         self.f = f
         self.contract_dir = contract_dir
         self.abi_dir = abi_dir
+        self.workers = workers
+        # Create list of valid paths once, every compilation shares them
+        self.absolute_path = os.path.realpath(contract_dir)
+        self.sub_dirs = [x[0] for x in os.walk(self.absolute_path)]
+        self.extra_args = ' '.join(['{}={}'.format(d.split('/')[-1], d) for d in self.sub_dirs])
 
     @staticmethod
     def log(string):
@@ -32,26 +45,124 @@ class EthABI:
     def get_file_name(file_path):
         return file_path.split("/")[-1].split(".")[0]
 
-    def create_abi(self, file_path):
-        # Create list of valid paths
-        absolute_path = self.contract_dir if self.contract_dir.startswith('/') else '{}/{}'.format(os.getcwd(),
-                                                                                                   self.contract_dir)                                                                                   
-        sub_dirs = [x[0] for x in os.walk(absolute_path)]
-        extra_args = ' '.join(['{}={}'.format(d.split('/')[-1], d) for d in sub_dirs])
+    def unit_name(self, path):
+        # Sources are named relative to the parent of the contracts directory, the
+        # way they are imported, e.g. contracts/Tokens/StandardToken.sol
+        return os.path.relpath(os.path.realpath(path), os.path.dirname(self.absolute_path))
+
+    def remappings(self):
+        return ['{}={}'.format(d.split('/')[-1], self.unit_name(d)) for d in self.sub_dirs]
+
+    def source_files(self):
+        for root, directories, files in os.walk(self.contract_dir):
+            for file_name in sorted(files):
+                if file_name.endswith('.sol'):
+                    yield os.path.join(root, file_name)
 
+    def unit_keys(self, file_path, abi):
+        # solc runs in the directory of file_path, so combined output names the
+        # file itself relative to it and imports by their remapped absolute
+        # path. Keys are renamed to 'source unit:Contract' as in standard JSON
+        if abi is None:
+            return None
+        keyed = {}
+        for key, output in abi.items():
+            path, contract_name = key.rsplit(':', 1)
+            keyed['{}:{}'.format(self.unit_name(os.path.join(os.path.dirname(file_path), path)),
+                                 contract_name)] = output
+        return keyed
+
+    def create_abi(self, file_path):
         try:
-            return self.solidity.compile_file(file_path, libraries=None, combined='abi', extra_args=extra_args)
+            return self.unit_keys(file_path, self.solidity.compile_file(file_path, libraries=None, combined='abi',
+                                                                        extra_args=self.extra_args))
         except CalledProcessError:
             file_name = self.get_file_name(file_path)
             logger.error('Error: {} ABI not generated.'.format(file_name))
-      
+
+    def resolve_import(self, unit, name, remappings):
+        if name.startswith('.'):
+            return os.path.normpath(os.path.join(os.path.dirname(unit), name))
+        for remapping in sorted(remappings, key=len, reverse=True):
+            prefix, target = remapping.split('=', 1)
+            if name.startswith(prefix):
+                return os.path.normpath(target + name[len(prefix):])
+        return name
+
+    def unit_path(self, unit):
+        return os.path.join(os.path.dirname(self.absolute_path), unit)
+
+    def read_sources(self, file_paths):
+        # The given files and everything they import, by source unit name
+        sources, pending = {}, [self.unit_name(file_path) for file_path in file_paths]
+        remappings = self.remappings()
+        while pending:
+            unit = pending.pop()
+            if unit in sources or not os.path.isfile(self.unit_path(unit)):
+                continue
+            with open(self.unit_path(unit), 'r') as source_file:
+                sources[unit] = source_file.read()
+            pending.extend(self.resolve_import(unit, name, remappings) for name in IMPORT_RE.findall(sources[unit]))
+        return sources
+
+    def imported_units(self, unit, sources, remappings):
+        # The unit and everything it imports, the contracts an ABI file lists
+        units, pending = [], [unit]
+        while pending:
+            current = pending.pop()
+            if current in units or current not in sources:
+                continue
+            units.append(current)
+            pending.extend(self.resolve_import(current, name, remappings)
+                           for name in IMPORT_RE.findall(sources[current]))
+        return units
+
+    def create_abis_standard(self, file_paths):
+        # One solc run for every source. ABI files keep the layout of combined
+        # output: {'source:Contract': {'abi': [...]}} for the file and its imports
+        sources = self.read_sources(file_paths)
+        remappings = self.remappings()
+        contracts = self.solidity.compile_standard(sources, remappings)
+
+        abis = {}
+        for file_path in file_paths:
+            abi = {}
+            for unit in self.imported_units(self.unit_name(file_path), sources, remappings):
+                for contract_name, output in contracts.get(unit, {}).items():
+                    abi['{}:{}'.format(unit, contract_name)] = {'abi': output['abi']}
+            abis[file_path] = abi
+        return abis
+
+    def create_abis_parallel(self, file_paths):
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(compile_abi, file_paths, [self.extra_args] * len(file_paths)))
+        for file_path, abi in zip(file_paths, results):
+            if abi is None:
+                logger.error('Error: {} ABI not generated.'.format(self.get_file_name(file_path)))
+        return dict((file_path, self.unit_keys(file_path, abi)) for file_path, abi in zip(file_paths, results))
+
+    def create_abis(self, file_paths):
+        try:
+            return self.create_abis_standard(file_paths)
+        except (OSError, ValueError, CalledProcessError) as e:
+            # Compiler errors in one file or a solc without --standard-json, compile
+            # every file on its own so the others still get their ABIs
+            logger.info('Standard JSON compilation failed, compiling files separately: {}'.format(e))
+            return self.create_abis_parallel(file_paths)
 
     def save_abi(self, file_path, abi):
         file_name = self.get_file_name(file_path)
-        with open('{}/{}.json'.format(self.abi_dir, file_name), 'w+') as abi_file:
-            abi_file.write(json.dumps(abi, indent=4, separators=(',', ': ')))
-            abi_file.close()
+        path = '{}/{}.json'.format(self.abi_dir, file_name)
+        content = json.dumps(abi, indent=4, separators=(',', ': '))
+        if os.path.isfile(path):
+            with open(path, 'r') as abi_file:
+                if abi_file.read() == content:
+                    logger.info('{} ABI unchanged.'.format(file_name))
+                    return False
+        with open(path, 'w+') as abi_file:
+            abi_file.write(content)
         logger.info('{} ABI generated.'.format(file_name))
+        return True
 
     def process(self):
         if self.f:
@@ -60,21 +171,22 @@ class EthABI:
                 print('ABI output:', abi)
                 self.save_abi(self.f, abi)
         else:
-            for root, directories, files in os.walk(self.contract_dir):
-                for file_name in files:
-                    if file_name.endswith('.sol'):
-                        file_path = os.path.join(root, file_name)
-                        abi = self.create_abi(file_path)
-                        if abi:
-                            self.save_abi(file_path, abi)
+            self.build(list(self.source_files()))
+
+    def build(self, file_paths):
+        abis = self.create_abis(file_paths)
+        written = sum(1 for file_path in file_paths if abis.get(file_path) and self.save_abi(file_path, abis[file_path]))
+        self.log('{} of {} ABIs written.'.format(written, len(file_paths)))
+        return written
 
 
 @click.command()
 @click.option('--f', help='Path to contract')
 @click.option('--contract-dir', default="contracts", help='Path to contracts directory')
 @click.option('--abi-dir', default="abi", help='Path to abi directory')
-def setup(f, contract_dir, abi_dir):
-    eth_abi = EthABI(f, contract_dir, abi_dir)
+@click.option('--workers', default=None, type=int, help='Processes used when files are compiled one by one')
+def setup(f, contract_dir, abi_dir, workers):
+    eth_abi = EthABI(f, contract_dir, abi_dir, workers)
     eth_abi.process()
 
 if __name__ == '__main__':
@@ -0,0 +1,39 @@
+from eth_codec import codec_for
+
+
+# Encodes contract view calls as eth_call requests and sends many of them in a
+# single JSON-RPC batch, all evaluated against the same block.
+class ContractBatch:
+
+    def __init__(self, rpc, address, abi):
+        self.rpc = rpc
+        self.address = address
+        self.codec = codec_for(abi)
+
+    @staticmethod
+    def format_block(block):
+        return hex(block) if isinstance(block, int) else block
+
+    def request(self, data, _from=None, block='latest'):
+        tx = {'to': self.address, 'data': data}
+        if _from:
+            tx['from'] = _from
+        return 'eth_call', [tx, self.format_block(block)]
+
+    def eth_call(self, function_name, args, _from=None, block='latest'):
+        return self.request('0x' + self.codec.encode_function_call(function_name, list(args)).hex(), _from, block)
+
+    def decode(self, function_name, result):
+        return self.codec.decode_hex_result(function_name, result)
+
+    def call(self, calls, _from=None, block='latest'):
+        # calls is a list of (function_name, args); results are returned in the same order
+        results = self.rpc.batch([self.eth_call(function_name, args, _from, block) for function_name, args in calls])
+        return [self.decode(function_name, result) for (function_name, _), result in zip(calls, results)]
+
+    def call_many(self, function_name, args_list, _from=None, block='latest'):
+        # Same function with many argument lists, e.g. registered for a list of addresses
+        block = self.format_block(block)
+        results = self.rpc.batch([self.request(data, _from, block)
+                                  for data in self.codec.encode_calls(function_name, args_list)])
+        return [self.decode(function_name, result) for result in results]
@@ -0,0 +1,187 @@
+from ethereum.abi import ContractTranslator, EncodingError, ValueOutOfBounds, decode_single, encode_single, \
+    process_type
+from ethereum.utils import encode_int, zpad
+import json
+import re
+import threading
+
+WORD = 32
+
+HEX_ADDRESS_RE = re.compile(r'^[0-9a-fA-F]{40}$')
+
+# Compiled codecs by ABI, shared by every caller in the process
+codecs = {}
+codecs_lock = threading.Lock()
+
+
+def encode_uint(bits):
+    limit = 2 ** bits
+
+    def encode(typ, arg):
+        if isinstance(arg, bool) or not isinstance(arg, int):
+            return encode_single(typ, arg)
+        if not 0 <= arg < limit:
+            raise ValueOutOfBounds(repr(arg))
+        return arg.to_bytes(WORD, 'big')
+    return encode
+
+
+def encode_int_word(bits):
+    low, high = -2 ** (bits - 1), 2 ** (bits - 1)
+
+    def encode(typ, arg):
+        if isinstance(arg, bool) or not isinstance(arg, int):
+            return encode_single(typ, arg)
+        if not low <= arg < high:
+            raise ValueOutOfBounds(repr(arg))
+        return arg.to_bytes(WORD, 'big', signed=True)
+    return encode
+
+
+def encode_address(typ, arg):
+    if isinstance(arg, str) and len(arg) in (40, 42):
+        digits = arg[2:] if len(arg) == 42 else arg
+        if (len(arg) == 42 and not arg.startswith('0x')) or not HEX_ADDRESS_RE.match(digits):
+            raise EncodingError('Could not parse address: {!r}'.format(arg))
+        return bytes(12) + bytes.fromhex(digits)
+    elif isinstance(arg, bytes) and len(arg) == 20:
+        return bytes(12) + arg
+    return encode_single(typ, arg)
+
+
+def encode_bool(typ, arg):
+    if isinstance(arg, bool):
+        return (b'\x00' * (WORD - 1)) + (b'\x01' if arg else b'\x00')
+    return encode_single(typ, arg)
+
+
+def encode_fixed_bytes(size):
+    def encode(typ, arg):
+        if isinstance(arg, bytes) and len(arg) <= size:
+            return arg + bytes(WORD - len(arg))
+        return encode_single(typ, arg)
+    return encode
+
+
+def decode_generic(typ, word):
+    return decode_single(typ, bytes(word))
+
+
+def compile_encoder(type_string):
+    # Returns (typ, encoder) for one word types, None for types that need the generic codec
+    typ = process_type(type_string)
+    base, sub, arrlist = typ
+    if arrlist:
+        return None
+    if base == 'uint':
+        return typ, encode_uint(int(sub))
+    if base == 'int':
+        return typ, encode_int_word(int(sub))
+    if base == 'address':
+        return typ, encode_address
+    if base == 'bool':
+        return typ, encode_bool
+    if base == 'bytes' and sub:
+        return typ, encode_fixed_bytes(int(sub))
+    return None
+
+
+def compile_decoder(type_string):
+    typ = process_type(type_string)
+    base, sub, arrlist = typ
+    if arrlist or (base in ('bytes', 'string') and not sub):
+        return None
+    if base == 'uint':
+        return typ, lambda typ, word: int.from_bytes(word, 'big')
+    if base == 'int':
+        return typ, lambda typ, word: int.from_bytes(word, 'big', signed=True)
+    if base == 'bool':
+        return typ, lambda typ, word: bool(int.from_bytes(word, 'big'))
+    return typ, decode_generic
+
+
+def compile_all(compile_one, types):
+    # None when any of the types is not a one word type
+    compiled = [compile_one(type_string) for type_string in types]
+    return None if any(c is None for c in compiled) else compiled
+
+
+# ContractTranslator with every function compiled once: the selector is
+# computed up front and arguments and results made of one word types (uint,
+# int, address, bool, bytesN) are encoded and decoded by precomputed functions
+# writing into a single buffer. Functions with dynamic types fall back to the
+# generic pyethereum codec. Being a ContractTranslator it can be passed to
+# tester.ABIContract and anything else that takes one.
+class ContractCodec(ContractTranslator):
+
+    def __init__(self, contract_interface):
+        super(ContractCodec, self).__init__(contract_interface)
+        self.selectors = {}
+        self.encoders = {}
+        self.decoders = {}
+        for function_name, description in self.function_data.items():
+            self.selectors[function_name] = zpad(encode_int(description['prefix']), 4)
+            self.encoders[function_name] = compile_all(compile_encoder, description['encode_types'])
+            self.decoders[function_name] = compile_all(compile_decoder, description['decode_types'])
+        self.constructor_encoders = None
+        if self.constructor_data:
+            self.constructor_encoders = compile_all(compile_encoder, self.constructor_data['encode_types'])
+
+    @staticmethod
+    def write_arguments(buffer, offset, encoders, args):
+        if len(args) != len(encoders):
+            raise TypeError('Expected {} arguments, got {}'.format(len(encoders), len(args)))
+        for (typ, encode), arg in zip(encoders, args):
+            buffer[offset:offset + WORD] = encode(typ, arg)
+            offset += WORD
+
+    def encode_function_call(self, function_name, args):
+        encoders = self.encoders.get(function_name)
+        if encoders is None:
+            return super(ContractCodec, self).encode_function_call(function_name, args)
+        buffer = bytearray(4 + WORD * len(encoders))
+        buffer[:4] = self.selectors[function_name]
+        self.write_arguments(buffer, 4, encoders, args)
+        return bytes(buffer)
+
+    def encode_calls(self, function_name, args_list):
+        # Call data of many calls to one function as 0x prefixed hex strings. The
+        # selector is written once and every call reuses the same buffer
+        encoders = self.encoders.get(function_name)
+        if encoders is None:
+            return ['0x' + self.encode_function_call(function_name, list(args)).hex() for args in args_list]
+        buffer = bytearray(4 + WORD * len(encoders))
+        buffer[:4] = self.selectors[function_name]
+        encoded = []
+        for args in args_list:
+            self.write_arguments(buffer, 4, encoders, args)
+            encoded.append('0x' + buffer.hex())
+        return encoded
+
+    def encode_constructor_arguments(self, args):
+        if self.constructor_encoders is None:
+            return super(ContractCodec, self).encode_constructor_arguments(args)
+        buffer = bytearray(WORD * len(self.constructor_encoders))
+        self.write_arguments(buffer, 0, self.constructor_encoders, args)
+        return bytes(buffer)
+
+    def decode_function_result(self, function_name, data):
+        decoders = self.decoders.get(function_name)
+        if decoders is None or len(data) < WORD * len(decoders):
+            return super(ContractCodec, self).decode_function_result(function_name, data)
+        words = memoryview(data)
+        return [decode(typ, words[i * WORD:(i + 1) * WORD]) for i, (typ, decode) in enumerate(decoders)]
+
+    def decode_hex_result(self, function_name, result):
+        # eth_call result as returned by the node, a single value is unwrapped
+        decoded = self.decode_function_result(function_name, bytes.fromhex(result[2:]))
+        return decoded[0] if len(decoded) == 1 else decoded
+
+
+def codec_for(abi):
+    # ABIs can be given as loaded JSON or as a JSON string
+    key = abi if isinstance(abi, str) else json.dumps(abi, sort_keys=True)
+    with codecs_lock:
+        if key not in codecs:
+            codecs[key] = ContractCodec(abi)
+        return codecs[key]
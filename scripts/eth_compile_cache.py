@@ -0,0 +1,161 @@
+from ethereum.tools import _solidity
+from ethereum.utils import decode_hex
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tempfile
+
+IMPORT_RE = re.compile(r'^\s*import\s+(?:[^;]*?\bfrom\s+)?["\']([^"\']+)["\']', re.MULTILINE)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), '.solc_cache')
+
+
+# On-disk cache of solc output. Entries are keyed by the content of the compiled
+# source and every file it imports, the solc binary and the compiler options, so
+# an unchanged tree never reaches solc. The methods mirror ethereum.tools._solidity.
+class CompilationCache:
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.compiler = None
+
+    @staticmethod
+    def parse_remappings(extra_args):
+        remappings = []
+        for arg in (extra_args or '').split():
+            if '=' in arg and not arg.startswith('-'):
+                prefix, target = arg.split('=', 1)
+                remappings.append((prefix, target))
+        # solc applies the longest matching prefix
+        return sorted(remappings, key=lambda r: len(r[0]), reverse=True)
+
+    @staticmethod
+    def resolve_import(base_dir, name, remappings):
+        if name.startswith('.'):
+            return os.path.realpath(os.path.join(base_dir, name))
+        for prefix, target in remappings:
+            if name.startswith(prefix):
+                return os.path.realpath(target + name[len(prefix):])
+        return os.path.realpath(os.path.join(base_dir, name))
+
+    def hash_sources(self, digest, code, base_dir, remappings, seen):
+        digest.update(code.encode('utf-8'))
+        for name in IMPORT_RE.findall(code):
+            path = self.resolve_import(base_dir, name, remappings)
+            if path in seen:
+                continue
+            seen.add(path)
+            digest.update(path.encode('utf-8'))
+            # Missing imports are left for solc to report
+            if os.path.isfile(path):
+                with open(path, 'r') as source_file:
+                    self.hash_sources(digest, source_file.read(), os.path.dirname(path), remappings, seen)
+
+    def compiler_identity(self):
+        # Identify solc by its binary rather than running `solc --version`
+        if self.compiler is None:
+            compiler_path = os.path.realpath(_solidity.get_compiler_path())
+            stat = os.stat(compiler_path)
+            self.compiler = '{}:{}:{}'.format(compiler_path, stat.st_size, int(stat.st_mtime))
+        return self.compiler
+
+    def key(self, code, path, combined, optimize, extra_args):
+        digest = hashlib.sha256()
+        digest.update(json.dumps([self.compiler_identity(), os.getcwd(), path, combined, optimize, extra_args],
+                                 sort_keys=True).encode('utf-8'))
+        base_dir = os.path.dirname(os.path.realpath(path)) if path else os.getcwd()
+        self.hash_sources(digest, code, base_dir, self.parse_remappings(extra_args), set())
+        return digest.hexdigest()
+
+    def load(self, key):
+        try:
+            with open(os.path.join(self.cache_dir, '{}.json'.format(key)), 'r') as cache_file:
+                contracts = json.load(cache_file)
+        except (IOError, ValueError):
+            return None
+        for value in contracts.values():
+            if 'bin_hex' in value:
+                try:
+                    value['bin'] = decode_hex(value['bin_hex'])
+                except (TypeError, ValueError):
+                    # Unresolved library placeholders, same as solc_parse_output
+                    value['bin'] = value['bin_hex']
+        return contracts
+
+    def store(self, key, contracts):
+        # Raw bytecode is restored from bin_hex on load
+        serializable = {name: {k: v for k, v in value.items() if not isinstance(v, bytes)}
+                        for name, value in contracts.items()}
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        # Write atomically so concurrent runs never read a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, 'w') as cache_file:
+            json.dump(serializable, cache_file)
+        os.replace(tmp_path, os.path.join(self.cache_dir, '{}.json'.format(key)))
+
+    def compile_file(self, filepath, libraries=None, combined='bin,abi', optimize=True, extra_args=None):
+        with open(filepath, 'r') as source_file:
+            code = source_file.read()
+        # The path as given is part of the key because solc echoes it in the contract names
+        key = self.key(code, filepath, combined, optimize, [libraries, extra_args])
+        contracts = self.load(key)
+        if contracts is None:
+            contracts = _solidity.compile_file(filepath, libraries=libraries, combined=combined,
+                                               optimize=optimize, extra_args=extra_args)
+            self.store(key, contracts)
+        return contracts
+
+    def compile_code(self, sourcecode, libraries=None, combined='bin,abi', optimize=True, extra_args=None):
+        key = self.key(sourcecode, None, combined, optimize, [libraries, extra_args])
+        contracts = self.load(key)
+        if contracts is None:
+            contracts = _solidity.compile_code(sourcecode, libraries=libraries, combined=combined,
+                                               optimize=optimize, extra_args=extra_args)
+            self.store(key, contracts)
+        return contracts
+
+    def compile_standard(self, sources, remappings=(), outputs=('abi',)):
+        # Compiles many sources, given as {source unit name: code}, in a single
+        # solc --standard-json run. Returns {source unit name: {contract name: output}}
+        standard_input = json.dumps({'language': 'Solidity',
+                                     'sources': dict((name, {'content': code}) for name, code in sources.items()),
+                                     'settings': {'remappings': list(remappings),
+                                                  'outputSelection': {'*': {'*': list(outputs)}}}},
+                                    sort_keys=True)
+        key = hashlib.sha256(json.dumps([self.compiler_identity(), standard_input]).encode('utf-8')).hexdigest()
+        contracts = self.load(key)
+        if contracts is None:
+            process = subprocess.run([_solidity.get_compiler_path(), '--standard-json'], input=standard_input,
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+                                     check=True)
+            output = json.loads(process.stdout)
+            errors = [error for error in output.get('errors', []) if error.get('severity') == 'error']
+            if errors:
+                raise ValueError('\n'.join(error.get('formattedMessage', error.get('message', '')) for error in errors))
+            contracts = output.get('contracts', {})
+            self.store(key, contracts)
+        return contracts
+
+    def compile_last_contract(self, filepath, libraries=None, combined='bin,abi', optimize=True, extra_args=None):
+        with open(filepath, 'r') as source_file:
+            names = _solidity.solidity_names(source_file.read())
+        contracts = self.compile_file(filepath, libraries, combined, optimize, extra_args)
+        return _solidity.solidity_get_contract_data(contracts, filepath, names[-1][1])
+
+    def combined(self, code=None, path=None, extra_args=None):
+        # Same result as _solidity.solc_wrapper.combined
+        if code and path:
+            raise ValueError('sourcecode and path are mutually exclusive.')
+        if path:
+            contracts = self.compile_file(path, extra_args=extra_args)
+            with open(path, 'r') as source_file:
+                code = source_file.read()
+        elif code:
+            contracts = self.compile_code(code, extra_args=extra_args)
+        else:
+            raise ValueError('either code or path needs to be supplied.')
+        return [(name[1], _solidity.solidity_get_contract_data(contracts, path, name[1]))
+                for name in _solidity.solidity_names(code)]
@@ -1,15 +1,29 @@
-from web3 import Web3, KeepAliveRPCProvider, IPCProvider
-from ethereum.abi import ContractTranslator
-from ethereum.transactions import Transaction
-from ethereum.utils import privtoaddr
-from ethereum.tools import _solidity
+from ethereum.utils import encode_hex, mk_contract_address
+from eth_codec import codec_for
+from eth_compile_cache import CompilationCache
+from eth_deploy_journal import DeploymentJournal, SENDING, BROADCAST, MINED, instruction_digest
+from eth_fees import FeeEngine, parse_auto
+from eth_nonce import NonceManager
+from eth_pending import PendingTransactions
+from eth_profile import DeploymentProfiler
+from eth_receipts import format_receipt
+from eth_registry import ArtifactRegistry
+from eth_rpc import RPCClient, RPCTransportError, format_transaction
+from eth_signer import KNOWN_TRANSACTION_ERRORS, Broadcaster, TransactionSigner
+from eth_schedule import DeploymentGraph
+from concurrent.futures import ThreadPoolExecutor
 import click
+import collections
 import time
 import json
-import rlp
 import logging
 import os
 
+# Gas limit used when a deployment cannot be estimated
+DEFAULT_GAS = 4000000
+
+# Times a transaction is sent again when the connection to the node failed
+SEND_RETRIES = 3
 
 # create logger
 logger = logging.getLogger('DEPLOY')
@@ -23,12 +37,19 @@ logger.addHandler(ch)
 
 class EthDeploy:
 
-    def __init__(self, protocol, host, port, gas, gas_price, contract_dir, optimize, account, private_key_path):
+    def __init__(self, protocol, host, port, gas, gas_price, contract_dir, optimize, account, private_key_path,
+                 receipt_timeout=600, confirmations=0, replace_after=180, network_id=None):
         # Establish rpc connection
-        self.web3 = Web3(KeepAliveRPCProvider(host=host, port=port))
-        self.solidity = _solidity.solc_wrapper()
+        self.rpc = RPCClient(protocol, host, port)
+        self.solidity = CompilationCache()
+        # Opened by process() once the network is known
+        self.registry = None
         self._from = None
         self.private_key = None
+        self.signer = None
+        self.broadcaster = Broadcaster(self.rpc)
+        # Chain id signed into transactions (EIP-155), replay protection is off without it
+        self.network_id = network_id
 
         # Set sending account
         if account:
@@ -36,9 +57,10 @@ class EthDeploy:
         elif private_key_path:
             with open(private_key_path, 'r') as private_key_file:
                 self.private_key = private_key_file.read().strip()
-            self._from = self.add_0x(privtoaddr(self.private_key.decode('hex')).encode('hex'))
+            self.signer = TransactionSigner(self.private_key, network_id)
+            self._from = self.signer.address
         else:
-            accounts = self.web3.eth.accounts
+            accounts = self.rpc.call('eth_accounts')
             if len(accounts) == 0:
                 raise ValueError('No account unlocked')
             self._from = self.add_0x(accounts[0])
@@ -47,11 +69,26 @@ class EthDeploy:
         if not self.is_address(self._from):
             raise ValueError('Account address is wrong')
 
+        self.nonce_manager = NonceManager(self.rpc, self._from)
+
         # Set deployment configuration
         self.optimize = optimize
         self.contract_dir = contract_dir
-        self.gas = gas
-        self.gas_price = gas_price
+        # Gas and gas price are estimated per transaction unless given
+        self.fee_engine = FeeEngine(self.rpc, gas=gas, gas_price=gas_price)
+
+        # Every sent transaction is journaled, transactions not mined within
+        # replace_after seconds are sent again or replaced at a higher price
+        self.pending = PendingTransactions(os.path.join(os.path.dirname(__file__),
+                                                        'pending_{}.json'.format(self._from.lower())),
+                                           self.rpc,
+                                           self.fee_engine,
+                                           # Resends run with the journal locked, a failed
+                                           # one is tried again by a later poll
+                                           lambda tx: self.submit(tx, retries=0),
+                                           deadline=replace_after,
+                                           timeout=receipt_timeout,
+                                           confirmations=confirmations)
 
         # References dict maps labels to addresses
         self.references = {}
@@ -59,12 +96,23 @@ class EthDeploy:
         # Abis dict maps addresses to abis
         self.abis = {}
 
-        # Total consumed gas
+        # Write-ahead journal of the current run, set by process()
+        self.journal = None
+        self.journal_keys = {}
+
+        # Total consumed gas and Wei spent on it
         self.total_gas = 0
+        self.total_fee = 0
+
+        # Timings and costs of every deployment, written out by process(profile=...)
+        self.profiler = DeploymentProfiler()
+        # Profile row of every deployment transaction that is not mined yet
+        self.profile_keys = {}
 
         self.log('Instructions are sent from address: {}'.format(self._from))
 
-        balance = self.web3.eth.getBalance(self._from)
+    def log_balance(self):
+        balance = int(self.rpc.call('eth_getBalance', [self._from, 'latest']), 16)
 
         self.log('Address balance: {} Ether / {} Wei'.format(balance/10**18, balance))
 
@@ -94,12 +142,13 @@ class EthDeploy:
     def format_reference(self, string):
         return self.add_0x(string) if self.is_address(string) else string
 
-    def write_deployed_abi(self, contract_address, abi):
-      data = {}
-      fn = os.path.join(os.path.dirname(__file__), 'deployed_abis.json')
-      with open(fn, 'w') as f:
-        data[contract_address] = abi
-        json.dump(data, f)
+    def register_deployment(self, contract_address, label, abi, transaction_receipt=None):
+        # The deployment block lets log indexers start where the contract was created
+        self.registry.register(contract_address,
+                               abi,
+                               label,
+                               transaction_receipt['blockNumber'] if transaction_receipt else None,
+                               transaction_receipt['transactionHash'] if transaction_receipt else None)
 
     def log_transaction_receipt(self, transaction_receipt):
         block_number = transaction_receipt['blockNumber']
@@ -110,6 +159,7 @@ class EthDeploy:
         cumulative_gas_used = transaction_receipt['cumulativeGasUsed']
 
         self.total_gas += gas_used
+        self.total_fee += gas_used * (self.pending.gas_price(transaction_hash) or 0)
 
         log_output = """
                         Transaction receipt::
@@ -129,7 +179,8 @@ class EthDeploy:
         self.log(log_output)
 
     def get_transaction_receipt(self, transaction_hash):
-        return self.web3.eth.getTransactionReceipt(transaction_hash)
+        receipt = self.rpc.call('eth_getTransactionReceipt', [transaction_hash])
+        return format_receipt(receipt) if receipt else None
 
     def replace_references(self, a):
         if isinstance(a, list):
@@ -138,8 +189,7 @@ class EthDeploy:
             return self.references[a] if isinstance(a, str) and a in self.references else a
 
     def get_nonce(self):
-        transaction_count = self.json_rpc.eth_getTransactionCount(self._from, default_block='pending')['result']
-        return self.hex2int(self.strip_0x(transaction_count))
+        return int(self.rpc.call('eth_getTransactionCount', [self._from, 'pending']), 16)
 
     def compile_code(self, code=None, path=None):
         # Create list of valid paths
@@ -156,104 +206,378 @@ class EthDeploy:
         abi = combined[-1][1]['abi']
         return bytecode, abi
 
-    def deploy(self, _from, file_path, bytecode, sourcecode, libraries, value, params, label, abi):
+    def get_label(self, instruction):
+        # Mirrors the label prepare_deployment() falls back to when none is given
+        if 'label' in instruction:
+            return instruction['label']
+        if 'file' in instruction:
+            return instruction['file'].split("/")[-1].split(".")[0]
+        return None
+
+    def prepare_deployment(self, file_path, bytecode, sourcecode, libraries, params, label, abi, profile_key=None):
         # Replace library placeholders
         if libraries:
-            for library_name, library_address in libraries.iteritems():
+            for library_name, library_address in libraries.items():
                 self.references[library_name] = self.replace_references(self.strip_0x(library_address))
 
         if file_path:
             if self.contract_dir:
                 file_path = '{}/{}'.format(self.contract_dir, file_path)
-            bytecode, abi = self.compile_code(path=file_path)
-            self.log('Contract ABI: {}'.format(abi))
             if not label:
                 label = file_path.split("/")[-1].split(".")[0]
+        # Profile rows are kept per instruction, labels may repeat or be missing
+        profile_key = label if profile_key is None else profile_key
+        self.profiler.record(profile_key, label=label)
+
+        if file_path:
+            with self.profiler.timer(profile_key, 'compile'):
+                bytecode, abi = self.compile_code(path=file_path)
+            self.log('Contract ABI: {}'.format(abi))
 
         if sourcecode:
             # Compile code
-            bytecode, abi = self.compile_code(code=sourcecode)
+            with self.profiler.timer(profile_key, 'compile'):
+                bytecode, abi = self.compile_code(code=sourcecode)
             # Set up contract creation transaction
             self.log('Contract ABI: {}'.format(abi))
 
         if params:
-            translator = ContractTranslator(abi)
             # Replace constructor placeholders
-            params = [self.replace_references(p) for p in params]
-            bytecode += translator.encode_constructor_arguments(params).hex()
-
+            with self.profiler.timer(profile_key, 'encode'):
+                params = [self.replace_references(p) for p in params]
+                bytecode += codec_for(abi).encode_constructor_arguments(params).hex()
+
+        return label, bytecode, abi
+
+    def send_transaction(self, tx, label=None, nonce=None):
+        # Nonces are assigned locally so several transactions can be in flight at once
+        tx['nonce'] = self.nonce_manager.next() if nonce is None else nonce
+        try:
+            tx_response = self.submit(tx)
+        except Exception:
+            # The nonce was never used, later transactions would wait on the gap
+            self.nonce_manager.reset()
+            raise
+        self.pending.track(tx_response, tx, label=label)
+        self.pending.save()
+        self.log('Transaction hash: {}'.format(tx_response))
+        return tx_response
+
+    def submit(self, tx, retries=SEND_RETRIES):
+        # Sends tx with the nonce it already has. Only transport failures are
+        # retried, with an explicit nonce an error from the node, like "nonce too
+        # low" or "replacement transaction underpriced", will not go away
+        if self.signer:
+            # Broadcasting is idempotent, a retry never sends the transaction twice
+            return self.broadcaster.send(self.signer.sign(tx, tx['nonce']), retries)
+        for attempt in range(retries + 1):
+            try:
+                return self.rpc.call('eth_sendTransaction', [format_transaction(tx)])
+            except RPCTransportError as e:
+                if attempt == retries:
+                    raise
+                self.log('Sending failed with error {}, retrying'.format(e))
+            except ValueError as e:
+                # A copy of a journaled transaction, e.g. sent again after a timeout
+                if any(error in str(e).lower() for error in KNOWN_TRANSACTION_ERRORS) and self.pending.find(tx):
+                    return self.pending.find(tx)
+                raise
+            time.sleep(5 * (attempt + 1))
+
+    def send_deployment(self, label, bytecode, value, nonce=None, profile_key=None):
+        profile_key = label if profile_key is None else profile_key
         # Set up contract creation transaction
         self.log('Deployment transaction for {} sent'.format(label if label else 'unknown'))
-        tx_response = None
-        tx = {'from':self._from, 
+        tx = {'from':self._from,
                   'value':value,
-                  'data':self.add_0x(bytecode), 
-                  'gas':self.gas,
-                  'gasPrice':self.gas_price}
-
-        # Send contract creation transaction
-        if self.private_key:
-            tx = Transaction(tx)
-            nonce = self.web3.eth.getTransactionCount(self._from)
-            tx['nonce'] = nonce
-            tx.sign(self.private_key)
-            raw_tx = rlp.encode(tx)
-            while tx_response is None or 'error' in tx_response:
-                if tx_response and 'error' in tx_response:
-                    self.log('Deploy failed with error {}'.format(tx_response['error']['message']))
-                    time.sleep(5)
-                self.web3.eth.sendRawTransaction(raw_tx)
-                tx_response = self.web3.eth.sendRawTransaction(raw_tx)
-        else:
-            while tx_response is None or 'error' in tx_response:
-                if tx_response and 'error' in tx_response:
-                    self.log('Deploy failed with error {}'.format(tx_response['error']['message']))
-                    time.sleep(5)
-                tx_response = self.web3.eth.sendTransaction(tx)
-        
-        self.log('Transaction hash: {}'.format(tx_response))
-        # Generate transaction receipt
-        # Needs to hold before transaction receipt is registered
-        time.sleep(180)
-        transaction_receipt = self.get_transaction_receipt(tx_response)
+                  'data':self.add_0x(bytecode)}
+        with self.profiler.timer(profile_key, 'fees'):
+            tx['gas'] = self.fee_engine.estimate_gas(tx)
+            tx['gasPrice'] = self.fee_engine.gas_price()
+        self.log('Gas: {} | Gas price: {} Gwei'.format(tx['gas'], tx['gasPrice'] / 10**9))
+        with self.profiler.timer(profile_key, 'broadcast'):
+            transaction_hash = self.send_transaction(tx, label, nonce)
+        self.profiler.record(profile_key, broadcastAt=time.time())
+        self.profile_keys[transaction_hash] = profile_key
+        return transaction_hash
+
+    def profile_deployment(self, profile_key, transaction_hash, transaction_receipt):
+        # The receipt may belong to a replacement of transaction_hash, gas limit
+        # and price are those of the transaction that was mined
+        mined = self.pending.entries.get(transaction_receipt['transactionHash'], {})
+        sent = self.pending.entries.get(transaction_hash, {})
+        broadcast_at = self.profiler.get(profile_key, 'broadcastAt') or sent.get('sentAt')
+        if broadcast_at and mined.get('minedAt'):
+            self.profiler.add(profile_key, 'inclusion', mined['minedAt'] - broadcast_at)
+        gas_price = mined['tx']['gasPrice'] if mined else 0
+        self.profiler.record(profile_key,
+                             status='deployed',
+                             address=transaction_receipt['contractAddress'],
+                             transactionHash=transaction_receipt['transactionHash'],
+                             blockNumber=transaction_receipt['blockNumber'],
+                             replacements=len(self.pending.group(transaction_hash)) - 1 if sent else 0,
+                             gas=mined['tx']['gas'] if mined else None,
+                             gasUsed=transaction_receipt['gasUsed'],
+                             gasPrice=gas_price,
+                             fee=transaction_receipt['gasUsed'] * gas_price)
+
+    def complete_deployment(self, label, abi, transaction_hash):
+        # Block until the transaction, or the one that replaced it, is mined with
+        # the configured number of confirmations
+        transaction_receipt = self.pending.wait(transaction_hash)
 
         contract_address = transaction_receipt['contractAddress']
         self.references[label] = contract_address
         self.abis[contract_address] = abi
-        self.write_deployed_abi(contract_address, abi)
+        self.register_deployment(contract_address, label, abi, transaction_receipt)
         self.log('Contract abi: {}'.format(abi))
         self.log('Contract {} created at address {}'.format(label if label else 'unknown',
                                                             self.add_0x(contract_address)))
 
         self.log_transaction_receipt(transaction_receipt)
+        self.profile_deployment(self.profile_keys.pop(transaction_hash, label), transaction_hash, transaction_receipt)
+        if transaction_hash in self.journal_keys:
+            key, i = self.journal_keys.pop(transaction_hash)
+            self.journal.record(key, i, MINED,
+                                address=contract_address,
+                                blockNumber=transaction_receipt['blockNumber'],
+                                transactionHash=transaction_receipt['transactionHash'])
+
+    def restore_deployment(self, label, abi, contract_address, profile_key=None):
+        # A deployment finished by an earlier run
+        self.references[label] = contract_address
+        self.abis[contract_address] = abi
+        self.register_deployment(contract_address, label, abi)
+        self.profiler.record(label if profile_key is None else profile_key,
+                             label=label, status='restored', address=contract_address)
+        self.log('Contract {} already deployed at address {}'.format(label if label else 'unknown',
+                                                                    self.add_0x(contract_address)))
+
+    def resolve_instruction(self, i):
+        # Addresses the instruction refers to, a journal entry is only reused
+        # while these are unchanged
+        return json.dumps([self.replace_references(i['params'] if 'params' in i else []),
+                           self.replace_references(sorted((i['libraries'] if 'libraries' in i else {}).values()))],
+                          default=str)
+
+    def is_known(self, transaction_hash):
+        return transaction_hash in self.pending.entries or \
+            self.rpc.call('eth_getTransactionByHash', [transaction_hash]) is not None
+
+    def has_code(self, address):
+        return self.rpc.call('eth_getCode', [address, 'latest']) not in ('0x', '0x0')
+
+    def recover_sending(self, key, entry):
+        # The previous run crashed between assigning a nonce and recording the
+        # transaction hash. Returns the contract address if the deployment was
+        # mined, None if it has to be sent again
+        nonce = entry['nonce']
+        contract_address = '0x' + encode_hex(mk_contract_address(self._from, nonce))
+        while True:
+            if self.has_code(contract_address):
+                return contract_address
+            if int(self.rpc.call('eth_getTransactionCount', [self._from, 'latest']), 16) > nonce:
+                self.log('Nonce {} of {} was used without creating the contract, deploying again'.format(nonce, key))
+                return None
+            if int(self.rpc.call('eth_getTransactionCount', [self._from, 'pending']), 16) <= nonce:
+                self.log('Deployment of {} never reached the node, deploying again'.format(key))
+                return None
+            self.log('Deployment of {} with nonce {} is pending, waiting'.format(key, nonce))
+            time.sleep(5)
 
-    def process(self, f):
-        # Read instructions file
-        with open(f, 'r') as instructions_file:
-            instructions = json.load(instructions_file)
+    def deploy(self, _from, file_path, bytecode, sourcecode, libraries, value, params, label, abi):
+        label, bytecode, abi = self.prepare_deployment(file_path, bytecode, sourcecode, libraries, params, label, abi)
+        transaction_hash = self.send_deployment(label, bytecode, value)
+        self.complete_deployment(label, abi, transaction_hash)
+
+    def prepare_instruction(self, i, profile_key=None):
+        return self.prepare_deployment(
+            i['file'] if 'file' in i else None,
+            i['bytecode'] if 'bytecode' in i else None,
+            i['sourcecode'] if 'sourcecode' in i else None,
+            i['libraries'] if 'libraries' in i else None,
+            i['params'] if 'params' in i else (),
+            i['label'] if 'label' in i else None,
+            i['abi'] if 'abi' in i else None,
+            profile_key
+        )
+
+    def deploy_instruction(self, i, profile_key=None):
+        # Returns (label, abi, transaction hash), the hash is None when an earlier
+        # run already completed the deployment. profile_key is the position of
+        # the instruction in the instructions file
+        if self.journal is None:
+            label, bytecode, abi = self.prepare_instruction(i, profile_key)
+            return label, abi, self.send_deployment(label, bytecode, i['value'] if 'value' in i else 0,
+                                                    profile_key=profile_key)
+
+        key = self.get_label(i) or instruction_digest(i)
+        entry = self.journal.get(key, i)
+        resolved = self.resolve_instruction(i)
+        if entry and entry.get('resolved') != resolved:
+            # A dependency was deployed again since, so is this contract
+            entry = None
+        if entry and entry['state'] == BROADCAST and not self.is_known(entry['transactionHash']):
+            # Sent but lost before it reached any block, recover it by its nonce
+            entry = dict(entry, state=SENDING)
+        if entry and entry['state'] == MINED and not self.has_code(entry['address']):
+            # The chain was reset since, a dev chain may keep its network id
+            self.log('No code at {} deployed for {}, deploying again'.format(entry['address'], key))
+            entry = None
+        if entry and entry['state'] == MINED:
+            self.restore_deployment(entry['label'], entry['abi'], entry['address'], profile_key)
+            return entry['label'], entry['abi'], None
+        if entry and entry['state'] == BROADCAST:
+            self.log('Re-attaching to deployment of {}. Transaction hash: {}'.format(key, entry['transactionHash']))
+            self.journal_keys[entry['transactionHash']] = (key, i)
+            if profile_key is not None:
+                self.profiler.record(profile_key, label=entry['label'])
+                self.profile_keys[entry['transactionHash']] = profile_key
+            return entry['label'], entry['abi'], entry['transactionHash']
+
+        label, bytecode, abi = self.prepare_instruction(i, profile_key)
+        if entry and entry['state'] == SENDING:
+            contract_address = self.recover_sending(key, entry)
+            if contract_address:
+                self.journal.record(key, i, MINED, address=contract_address)
+                self.restore_deployment(label, abi, contract_address, profile_key)
+                return label, abi, None
+
+        nonce = self.nonce_manager.next()
+        self.journal.record(key, i, SENDING, label=label, abi=abi, nonce=nonce, resolved=resolved)
+        transaction_hash = self.send_deployment(label, bytecode, i['value'] if 'value' in i else 0, nonce, profile_key)
+        self.journal_keys[transaction_hash] = (key, i)
+        self.journal.record(key, i, BROADCAST, transactionHash=transaction_hash)
+        return label, abi, transaction_hash
+
+    def process_abi(self, i):
+        for address in i['addresses']:
+            self.abis[self.strip_0x(address)] = i['abi']
+
+    def process_sequential(self, instructions):
+        for number, i in enumerate(instructions):
+            if i['type'] == 'abi':
+                self.process_abi(i)
+            if i['type'] == 'deployment':
+                label, abi, transaction_hash = self.deploy_instruction(i, number)
+                if transaction_hash:
+                    self.complete_deployment(label, abi, transaction_hash)
+
+    def process_pipelined(self, instructions, workers):
+        # Deploy the dependency graph round by round. All deployments of a round are
+        # broadcast concurrently and a receipt is only awaited once a later round
+        # needs the address of that deployment
+        graph = DeploymentGraph(instructions, self.get_label)
+        for i in instructions:
+            if i['type'] == 'abi':
+                self.process_abi(i)
+
+        rounds = graph.rounds()
+        self.log('Deploying {} contracts in {} rounds'.format(len(graph.nodes), len(rounds)))
+        self.log('Critical path: {}'.format(' -> '.join(graph.critical_path())))
+
+        pending = collections.OrderedDict()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for round_number, labels in enumerate(rounds):
+                for label in labels:
+                    for dependency in graph.dependencies[label]:
+                        if dependency in pending:
+                            self.complete_deployment(dependency, *pending.pop(dependency))
+
+                self.log('Round {}: {}'.format(round_number + 1, ', '.join(labels)))
+                futures = [executor.submit(self.deploy_instruction, graph.nodes[label],
+                                           instructions.index(graph.nodes[label])) for label in labels]
+                for future in futures:
+                    label, abi, transaction_hash = future.result()
+                    if transaction_hash:
+                        pending[label] = (abi, transaction_hash)
+
+        for label, (abi, transaction_hash) in pending.items():
+            self.complete_deployment(label, abi, transaction_hash)
+
+    def sign_deployments(self, instructions, output_path, start_nonce=None):
+        # Sign every deployment offline with sequential nonces. Contract addresses
+        # follow from sender and nonce, so later deployments can reference earlier
+        # labels before anything is mined. Signed deployments are registered and
+        # journaled as broadcast, a later run re-attaches to them by hash or nonce
+        if not self.signer:
+            raise ValueError('Signing deployments requires --private-key-path')
+        if start_nonce is not None:
+            self.nonce_manager.start(start_nonce)
+        signed = []
+        gas_price = self.fee_engine.gas_price()
         for i in instructions:
             if i['type'] == 'abi':
-                for address in i['addresses']:
-                    self.abis[self.strip_0x(address)] = i['abi']
+                self.process_abi(i)
             if i['type'] == 'deployment':
-                self.deploy(
-                    i['from'] if 'from' in i else None,
-                    i['file'] if 'file' in i else None,
-                    i['bytecode'] if 'bytecode' in i else None,
-                    i['sourcecode'] if 'sourcecode' in i else None,
-                    i['libraries'] if 'libraries' in i else None,
-                    i['value'] if 'value' in i else 0,
-                    i['params'] if 'params' in i else (),
-                    i['label'] if 'label' in i else None,
-                    i['abi'] if 'abi' in i else None
-                )
+                resolved = self.resolve_instruction(i)
+                label, bytecode, abi = self.prepare_instruction(i)
+                tx = {'from': self._from,
+                      'value': i['value'] if 'value' in i else 0,
+                      'data': self.add_0x(bytecode),
+                      'gasPrice': gas_price,
+                      'label': label}
+                try:
+                    tx['gas'] = self.fee_engine.estimate_gas(tx)
+                except ValueError as e:
+                    # Constructors may call contracts that are only deployed by earlier
+                    # signed transactions, so fall back to the former fixed limit
+                    self.log('Gas estimate for {} failed ({}), using {}'.format(label, e, DEFAULT_GAS))
+                    tx['gas'] = DEFAULT_GAS
+                nonce = self.nonce_manager.next()
+                tx = self.signer.sign(tx, nonce)
+                contract_address = '0x' + encode_hex(mk_contract_address(self._from, nonce))
+                tx['contractAddress'] = contract_address
+                self.references[label] = contract_address
+                self.registry.register(contract_address, abi, label, None, tx['hash'])
+                if self.journal:
+                    self.journal.record(self.get_label(i) or instruction_digest(i), i, BROADCAST,
+                                        label=label, abi=abi, nonce=nonce, resolved=resolved,
+                                        transactionHash=tx['hash'])
+                signed.append(tx)
+                self.log('Deployment of {} signed with nonce {}, contract address will be {}'.format(
+                    label, nonce, contract_address))
+
+        TransactionSigner.write(signed, output_path)
+        self.log('{} signed deployments written to {}'.format(len(signed), output_path))
+
+    def process(self, f, pipeline=False, workers=4, sign_only=None, journal=True, profile=None, start_nonce=None):
+        # Read instructions file
+        with open(f, 'r') as instructions_file:
+            instructions = json.load(instructions_file)
+
+        # Signing only needs no node when the network id is given
+        network = str(self.network_id) if self.network_id is not None else self.rpc.call('net_version')
+        self.registry = ArtifactRegistry(network)
+        if journal:
+            # A rerun after a crash resumes from the journal next to the instructions
+            self.journal = DeploymentJournal(DeploymentJournal.default_path(f), network, self._from)
+
+        if sign_only:
+            self.sign_deployments(instructions, sign_only, start_nonce)
+            return
+
+        self.log_balance()
+
+        if pipeline:
+            self.process_pipelined(instructions, workers)
+        else:
+            self.process_sequential(instructions)
+        self.profiler.finish()
 
         self.log('-'*96)
         self.log('Summary: {} gas used, {} Ether / {} Wei spent on gas'.format(self.total_gas,
-                                                                               self.total_gas*self.gas_price/10.0**18,
-                                                                               self.total_gas*self.gas_price))
+                                                                               self.total_fee/10.0**18,
+                                                                               self.total_fee))
         for reference, value in self.references.items():
             self.log('{} references {}'.format(reference, self.add_0x(value) if isinstance(value, str) else value))
+        for line in self.rpc.format_stats():
+            self.log('RPC {}'.format(line))
+        if profile:
+            self.profiler.save(profile)
+            for line in self.profiler.format_table():
+                self.log(line)
+            self.log('Deployment profile written to {}'.format(profile))
         self.log('-' * 96)
 
 
@@ -262,15 +586,28 @@ class EthDeploy:
 @click.option('--protocol', default="http", help='Ethereum node protocol')
 @click.option('--host', default="localhost", help='Ethereum node host')
 @click.option('--port', default='8545', help='Ethereum node port')
-@click.option('--gas', default=4000000, help='Transaction gas')
-@click.option('--gas-price', default=41000000000, help='Transaction gas price')
+@click.option('--gas', default='auto', help='Transaction gas, estimated per transaction by default')
+@click.option('--gas-price', default='auto', help='Transaction gas price, sampled from recent blocks by default')
 @click.option('--contract-dir', default="contracts/", help='Path to contracts directory')
 @click.option('--optimize', is_flag=True, help='Use solidity optimizer to compile code')
 @click.option('--account', help='Default account used as from parameter')
 @click.option('--private-key-path', help='Path to private key')
-def setup(f, protocol, host, port, gas, gas_price, contract_dir, optimize, account, private_key_path):
-    deploy = EthDeploy(protocol, host, port, gas, gas_price, contract_dir, optimize, account, private_key_path)
-    deploy.process(f)
+@click.option('--receipt-timeout', default=600, help='Seconds to wait for a deployment to be mined')
+@click.option('--confirmations', default=0, help='Blocks to wait on top of the deployment block')
+@click.option('--replace-after', default=180, help='Seconds before an unmined deployment is sent again at a higher gas price')
+@click.option('--pipeline', is_flag=True, help='Deploy independent contracts concurrently following label references')
+@click.option('--workers', default=4, help='Concurrent deployments per round in pipeline mode')
+@click.option('--sign-only', help='Write signed deployments to this file instead of sending them')
+@click.option('--start-nonce', type=int, help='First nonce of signed deployments, read from the node by default')
+@click.option('--network-id', type=int, help='Chain id signed into transactions (EIP-155)')
+@click.option('--journal/--no-journal', default=True, help='Resume from the journal of an interrupted run')
+@click.option('--profile', help='Write per deployment timings and costs as JSON to this file')
+def setup(f, protocol, host, port, gas, gas_price, contract_dir, optimize, account, private_key_path,
+          receipt_timeout, confirmations, replace_after, pipeline, workers, sign_only, start_nonce, network_id, journal,
+          profile):
+    deploy = EthDeploy(protocol, host, port, parse_auto(gas), parse_auto(gas_price), contract_dir, optimize, account, private_key_path,
+                       receipt_timeout, confirmations, replace_after, network_id)
+    deploy.process(f, pipeline, workers, sign_only, journal, profile, start_nonce)
 
 if __name__ == '__main__':
     setup()
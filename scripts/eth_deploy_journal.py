@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+SENDING = 'sending'
+BROADCAST = 'broadcast'
+MINED = 'mined'
+
+
+def instruction_digest(instruction):
+    return hashlib.sha256(json.dumps(instruction, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+# Write-ahead journal of a deployment run. Before a deployment is sent its nonce
+# is recorded, after sending its transaction hash, once mined its address. Every
+# state change is flushed to disk before the deployer moves on, so a rerun of
+# the same instructions file skips mined deployments, waits for broadcast ones
+# and only sends what never left the machine. Entries are tied to the digest of
+# their instruction, a changed instruction is deployed again.
+class DeploymentJournal:
+
+    def __init__(self, path, network, _from):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {'network': network, 'from': _from.lower(), 'deployments': {}}
+        if os.path.isfile(path):
+            with open(path, 'r') as journal_file:
+                data = json.load(journal_file)
+            if (data['network'], data['from']) != (network, _from.lower()):
+                raise ValueError('Deployment journal {} belongs to account {} on network {}'.format(
+                    path, data['from'], data['network']))
+            self.data = data
+
+    @staticmethod
+    def default_path(instructions_path):
+        return '{}.journal.json'.format(instructions_path)
+
+    def save(self):
+        # Write to a temporary file first so a crash never leaves a truncated journal
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as journal_file:
+            json.dump(self.data, journal_file, indent=4)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(tmp_path, self.path)
+
+    def get(self, key, instruction):
+        # The entry of an instruction, None when it is unknown or has changed since
+        entry = self.data['deployments'].get(key)
+        if entry is None or entry['digest'] != instruction_digest(instruction):
+            return None
+        return entry
+
+    def record(self, key, instruction, state, **fields):
+        with self.lock:
+            entry = self.data['deployments'].get(key)
+            digest = instruction_digest(instruction)
+            if entry is None or entry['digest'] != digest:
+                entry = self.data['deployments'][key] = {'digest': digest}
+            entry.update(fields, state=state)
+            self.save()
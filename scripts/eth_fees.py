@@ -0,0 +1,113 @@
+import logging
+import math
+import threading
+
+logger = logging.getLogger('DEPLOY')
+
+GWEI = 10**9
+
+
+def parse_auto(value):
+    # CLI values for --gas and --gas-price: a number, or 'auto' for the fee engine
+    return None if value is None or str(value).lower() == 'auto' else int(value)
+
+
+# Picks gas limits and gas prices instead of fixed values. Gas limits come from
+# eth_estimateGas plus a safety margin. Gas prices come from the cheapest
+# transaction in each of the last sample_blocks blocks: if a fraction q of
+# blocks included a price, it is expected in one of the next target_blocks
+# blocks with probability 1 - (1 - q) ** target_blocks, so the cheapest
+# price reaching the requested confidence is used.
+class FeeEngine:
+
+    def __init__(self, rpc, gas=None, gas_price=None, gas_margin=1.2, sample_blocks=20, target_blocks=3,
+                 confidence=0.9, min_gas_price=GWEI, max_gas_price=None, bump=1.125):
+        self.rpc = rpc
+        # Fixed values given on the command line take precedence
+        self.gas = gas
+        self.fixed_gas_price = gas_price
+        self.gas_margin = gas_margin
+        self.sample_blocks = sample_blocks
+        self.target_blocks = target_blocks
+        self.confidence = confidence
+        self.min_gas_price = min_gas_price
+        self.max_gas_price = max_gas_price
+        # Nodes only accept a replacement priced at least 10% above the original
+        self.bump = bump
+        self.lock = threading.Lock()
+        self.block_prices = {}
+        self.gas_limit = None
+
+    @staticmethod
+    def format_tx(tx):
+        formatted = dict((key, tx[key]) for key in ('from', 'to', 'data') if tx.get(key))
+        if tx.get('value'):
+            formatted['value'] = hex(tx['value'])
+        return formatted
+
+    def sample(self):
+        # Only blocks that were not sampled before are fetched
+        head = self.rpc.block_number()
+        numbers = range(max(0, head - self.sample_blocks + 1), head + 1)
+        with self.lock:
+            missing = [n for n in numbers if n not in self.block_prices]
+        blocks = self.rpc.batch([('eth_getBlockByNumber', [hex(n), True]) for n in missing])
+        with self.lock:
+            for number, block in zip(missing, blocks):
+                if block is None:
+                    continue
+                self.gas_limit = int(block['gasLimit'], 16)
+                prices = [int(tx['gasPrice'], 16) for tx in block['transactions'] if int(tx['gasPrice'], 16) > 0]
+                self.block_prices[number] = min(prices) if prices else None
+            for number in [n for n in self.block_prices if n < numbers[0]]:
+                del self.block_prices[number]
+            return [price for price in self.block_prices.values() if price is not None]
+
+    def estimate_gas(self, tx):
+        if self.gas:
+            return self.gas
+        estimate = int(self.rpc.call('eth_estimateGas', [self.format_tx(tx)]), 16)
+        if self.gas_limit is None:
+            self.gas_limit = int(self.rpc.call('eth_getBlockByNumber', ['latest', False])['gasLimit'], 16)
+        return min(int(estimate * self.gas_margin), self.gas_limit)
+
+    def gas_price(self, target_blocks=None, ceiling=None):
+        # ceiling is a contract enforced maximum, e.g. gasLimitInWei during the cap periods
+        if self.fixed_gas_price:
+            price = self.fixed_gas_price
+        else:
+            prices = sorted(self.sample())
+            if prices:
+                fraction = 1 - (1 - self.confidence) ** (1.0 / (target_blocks or self.target_blocks))
+                price = prices[max(0, int(math.ceil(fraction * len(prices))) - 1)]
+            else:
+                # Empty blocks say nothing about competition, ask the node instead
+                price = int(self.rpc.call('eth_gasPrice'), 16)
+            price = max(price, self.min_gas_price)
+            if self.max_gas_price:
+                price = min(price, self.max_gas_price)
+        if ceiling is not None and price > ceiling:
+            logger.info('Gas price {} is above the contract limit, using {}'.format(price, ceiling))
+            price = ceiling
+        return price
+
+    def bump_price(self, price, ceiling=None):
+        bumped = int(price * self.bump) + 1
+        if ceiling is not None and bumped > ceiling:
+            raise ValueError('Cannot replace transaction, bumped gas price {} is above the limit {}'.format(
+                bumped, ceiling))
+        return bumped
+
+    def replacement(self, transaction, ceiling=None):
+        # Same nonce and payload as a pending transaction from eth_getTransactionByHash,
+        # priced high enough for the node to replace it
+        tx = {'from': transaction['from'],
+              'value': int(transaction['value'], 16),
+              'data': transaction['input'],
+              'gas': int(transaction['gas'], 16),
+              'gasPrice': self.bump_price(int(transaction['gasPrice'], 16), ceiling),
+              'nonce': int(transaction['nonce'], 16)}
+        # Contract creations have no recipient
+        if transaction['to']:
+            tx['to'] = transaction['to']
+        return tx
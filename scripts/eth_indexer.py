@@ -0,0 +1,227 @@
+from ethereum.utils import decode_hex
+from eth_codec import codec_for
+from eth_registry import ArtifactRegistry
+from eth_rpc import RPCClient
+import click
+import json
+import logging
+import os
+import sqlite3
+
+# create logger
+logger = logging.getLogger('INDEXER')
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+ZERO_ADDRESS = '0x' + '0' * 40
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS events (
+    block_number INTEGER,
+    transaction_hash TEXT,
+    log_index INTEGER,
+    event TEXT,
+    args TEXT,
+    PRIMARY KEY (transaction_hash, log_index));
+CREATE INDEX IF NOT EXISTS events_block ON events (block_number);
+CREATE TABLE IF NOT EXISTS balances (address TEXT PRIMARY KEY, balance TEXT);
+CREATE TABLE IF NOT EXISTS purchases (address TEXT PRIMARY KEY, tokens TEXT, count INTEGER);
+CREATE TABLE IF NOT EXISTS refunds (address TEXT PRIMARY KEY, wei TEXT, count INTEGER);
+"""
+
+
+# uint256 values are stored as fixed width hex so SQLite orders them numerically
+def to_db(value):
+    return '{:064x}'.format(value)
+
+
+def from_db(value):
+    return int(value, 16) if value else 0
+
+
+def normalize_address(address):
+    if isinstance(address, bytes):
+        address = address.decode()
+    address = address.lower()
+    return address if address.startswith('0x') else '0x' + address
+
+
+# Indexes GMToken events (Transfer, Approval, ClaimGMT, RefundSent) into a local
+# SQLite store. Logs are pulled with eth_getLogs in block ranges that shrink when
+# the node rejects a range and grow again while ranges stay small. Each range is
+# committed together with the last indexed block, so a sync can resume anywhere.
+class EventIndexer:
+
+    def __init__(self, rpc, contract_addr, abi, db_path, start_block=0, confirmations=6,
+                 chunk_size=5000, max_chunk_size=100000, target_logs=2000, on_event=None):
+        self.rpc = rpc
+        self.contract_addr = normalize_address(contract_addr)
+        self.translator = codec_for(abi)
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.target_logs = target_logs
+        # Called with (event, args, block_number) for every newly indexed event
+        self.on_event = on_event
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(SCHEMA)
+
+    def get_meta(self, key, default=None):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def last_block(self):
+        return int(self.get_meta('last_block', self.start_block - 1))
+
+    def get_logs(self, from_block, to_block):
+        return self.rpc.call('eth_getLogs', [{'address': self.contract_addr,
+                                              'fromBlock': hex(from_block),
+                                              'toBlock': hex(to_block)}])
+
+    def decode(self, log):
+        topics = [int(topic, 16) for topic in log['topics']]
+        args = self.translator.decode_event(topics, decode_hex(log['data'][2:]))
+        event = args.pop('_event_type')
+        return event.decode() if isinstance(event, bytes) else event, args
+
+    def add_to(self, table, column, address, amount):
+        row = self.db.execute('SELECT {} FROM {} WHERE address = ?'.format(column, table), (address,)).fetchone()
+        value = (from_db(row[0]) if row else 0) + amount
+        self.db.execute('INSERT OR REPLACE INTO {} (address, {}) VALUES (?, ?)'.format(table, column),
+                        (address, to_db(value)))
+
+    def add_count(self, table, column, address, amount):
+        row = self.db.execute('SELECT {}, count FROM {} WHERE address = ?'.format(column, table),
+                              (address,)).fetchone()
+        value, count = (from_db(row[0]), row[1]) if row else (0, 0)
+        self.db.execute('INSERT OR REPLACE INTO {} (address, {}, count) VALUES (?, ?, ?)'.format(table, column),
+                        (address, to_db(value + amount), count + 1))
+
+    def apply(self, event, args):
+        if event == 'Transfer':
+            sender, receiver = normalize_address(args['from']), normalize_address(args['to'])
+            # Tokens created by claimTokens and finalize are transferred from 0x0
+            if sender != ZERO_ADDRESS:
+                self.add_to('balances', 'balance', sender, -args['value'])
+            self.add_to('balances', 'balance', receiver, args['value'])
+        elif event == 'ClaimGMT':
+            self.add_count('purchases', 'tokens', normalize_address(args['_to']), args['_value'])
+        elif event == 'RefundSent':
+            # refund() burns the whole balance without a Transfer event
+            address = normalize_address(args['_to'])
+            self.db.execute('INSERT OR REPLACE INTO balances (address, balance) VALUES (?, ?)', (address, to_db(0)))
+            self.add_count('refunds', 'wei', address, args['_value'])
+
+    def index_range(self, from_block, to_block, logs):
+        with self.db:
+            for log in logs:
+                event, args = self.decode(log)
+                cursor = self.db.execute('INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?)',
+                                         (int(log['blockNumber'], 16),
+                                          log['transactionHash'],
+                                          int(log['logIndex'], 16),
+                                          event,
+                                          json.dumps(args, default=str)))
+                # Logs that are already indexed are not applied twice
+                if cursor.rowcount:
+                    self.apply(event, args)
+                    if self.on_event:
+                        self.on_event(event, args, int(log['blockNumber'], 16))
+            self.db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('last_block', str(to_block)))
+
+    def sync(self, to_block=None):
+        if to_block is None:
+            to_block = self.rpc.block_number() - self.confirmations
+        from_block = self.last_block() + 1
+        indexed = 0
+        while from_block <= to_block:
+            end_block = min(from_block + self.chunk_size - 1, to_block)
+            try:
+                logs = self.get_logs(from_block, end_block)
+            except (ValueError, OSError) as e:
+                if self.chunk_size == 1:
+                    raise
+                # Too many results or a timeout, retry with a smaller range and
+                # do not grow back to the size that failed
+                self.max_chunk_size = max(1, self.chunk_size - 1)
+                self.chunk_size = max(1, self.chunk_size // 2)
+                logger.info('eth_getLogs failed ({}), reducing range to {} blocks'.format(e, self.chunk_size))
+                continue
+
+            self.index_range(from_block, end_block, logs)
+            indexed += len(logs)
+            if len(logs) < self.target_logs // 2:
+                self.chunk_size = min(self.chunk_size * 2, self.max_chunk_size)
+            from_block = end_block + 1
+        logger.info('Indexed {} events up to block {}'.format(indexed, self.last_block()))
+        return indexed
+
+    def balance_of(self, address):
+        row = self.db.execute('SELECT balance FROM balances WHERE address = ?',
+                              (normalize_address(address),)).fetchone()
+        return from_db(row[0]) if row else 0
+
+    def holders(self, limit=None):
+        query = 'SELECT address, balance FROM balances WHERE balance > ? ORDER BY balance DESC'
+        params = [to_db(0)]
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        return [(address, from_db(balance)) for address, balance in self.db.execute(query, params)]
+
+    def assigned_supply(self):
+        # Every assigned token was transferred from 0x0, refunds burn balances
+        return sum(balance for _, balance in self.holders())
+
+    def purchases(self):
+        return [(address, from_db(tokens), count) for address, tokens, count in
+                self.db.execute('SELECT address, tokens, count FROM purchases ORDER BY tokens DESC')]
+
+    def refunds(self):
+        return [(address, from_db(wei), count) for address, wei, count in
+                self.db.execute('SELECT address, wei, count FROM refunds ORDER BY wei DESC')]
+
+
+def deployment_block(registry, contract_addr):
+    # Deployment blocks are recorded by eth_deploy.py in the artifact registry
+    deployment = registry.get(contract_addr)
+    return deployment['blockNumber'] or 0 if deployment else 0
+
+
+@click.command()
+@click.option('--protocol', default="http", help='Ethereum node protocol')
+@click.option('--host', default="localhost", help='Ethereum node host')
+@click.option('--port', default='8545', help='Ethereum node port')
+@click.option('--contract-addr', help='Address of contract to index')
+@click.option('--db', help='Path to SQLite database')
+@click.option('--start-block', type=int, help='First block to index, defaults to the deployment block')
+@click.option('--confirmations', default=6, help='Blocks to stay behind the head to avoid reorgs')
+@click.option('--top', default=20, help='Number of top holders to report')
+def setup(protocol, host, port, contract_addr, db, start_block, confirmations, top):
+    rpc = RPCClient(protocol, host, port)
+    registry = ArtifactRegistry.for_node(rpc)
+    abi = registry.abi(contract_addr)
+
+    indexer = EventIndexer(rpc,
+                           contract_addr,
+                           abi,
+                           db or os.path.join(os.path.dirname(__file__), 'events_{}.db'.format(contract_addr.lower())),
+                           start_block=deployment_block(registry, contract_addr) if start_block is None else start_block,
+                           confirmations=confirmations)
+    indexer.sync()
+
+    holders = indexer.holders()
+    logger.info('Assigned supply (adjusted for token unit): {}'.format(indexer.assigned_supply() / 10**18))
+    logger.info('Holders: {} | Purchasers: {} | Refunds: {}'.format(
+        len(holders), len(indexer.purchases()), len(indexer.refunds())))
+    for address, balance in holders[:top]:
+        logger.info('Address: {} | Balance: {}'.format(address, balance / 10**18))
+
+if __name__ == '__main__':
+    setup()
@@ -0,0 +1,249 @@
+from eth_batch import ContractBatch
+from eth_indexer import EventIndexer, deployment_block, normalize_address
+from eth_registry import ArtifactRegistry
+from eth_rpc import RPCClient, RPCTransportError
+from eth_view_cache import ViewCache, classes_for
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import click
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+# create logger
+logger = logging.getLogger('MONITOR')
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+CONSTANTS = ['startBlock', 'endBlock', 'firstCapEndingBlock', 'secondCapEndingBlock', 'tokenExchangeRate',
+             'gmtFundAddress', 'minCap', 'totalSupply', 'gmtFund']
+
+
+# Follows the token sale block by block. Sale parameters are read once, then every
+# new block costs one eth_getLogs for the blocks not yet confirmed and one batched
+# eth_call for the fields events cannot express, regardless of sale size. Events
+# are only stored by the indexer once they have the given number of
+# confirmations; events of the newer blocks are read again on every update and
+# added on top, so a reorg among them never leaves its events behind.
+class SaleMonitor:
+
+    def __init__(self, rpc, contract_batch, indexer_factory, poll_interval=1, confirmations=6):
+        self.rpc = rpc
+        self.contract_batch = contract_batch
+        self.poll_interval = poll_interval
+        self.confirmations = confirmations
+        self.lock = threading.Lock()
+        self.status = {}
+
+        self.constants = dict(zip(CONSTANTS, contract_batch.call([(name, ()) for name in CONSTANTS])))
+        self.gmt_fund_address = normalize_address(self.constants['gmtFundAddress'])
+
+        self.indexer = indexer_factory(self.on_event)
+        # Totals are loaded from the store once and then only updated from new events
+        self.participants = set(address for address, _, _ in self.indexer.purchases()
+                                if address != self.gmt_fund_address)
+        self.tokens_sold = sum(tokens for address, tokens, _ in self.indexer.purchases()
+                               if address != self.gmt_fund_address)
+        self.refunded_wei = sum(wei for _, wei, _ in self.indexer.refunds())
+        self.block_events = 0
+
+    def count(self, event, args):
+        # Returns (participant, tokens sold, refunded Wei) of one event
+        if event == 'ClaimGMT':
+            address = normalize_address(args['_to'])
+            # finalize() assigns the remaining supply to the GMT fund
+            if address != self.gmt_fund_address:
+                return address, args['_value'], 0
+        elif event == 'RefundSent':
+            return None, 0, args['_value']
+        return None, 0, 0
+
+    def on_event(self, event, args, block_number):
+        self.block_events += 1
+        participant, tokens, refunded = self.count(event, args)
+        if participant:
+            self.participants.add(participant)
+        self.tokens_sold += tokens
+        self.refunded_wei += refunded
+
+    def unconfirmed(self, from_block, to_block):
+        # (participants, tokens sold, refunded Wei) of blocks that may still be reorganised
+        participants, tokens_sold, refunded_wei = set(), 0, 0
+        if from_block > to_block:
+            return participants, tokens_sold, refunded_wei
+        for log in self.indexer.get_logs(from_block, to_block):
+            self.block_events += 1
+            participant, tokens, refunded = self.count(*self.indexer.decode(log))
+            if participant:
+                participants.add(participant)
+            tokens_sold += tokens
+            refunded_wei += refunded
+        return participants, tokens_sold, refunded_wei
+
+    def cap_period(self, block_number):
+        if block_number < self.constants['startBlock']:
+            return 'not started'
+        if block_number < self.constants['firstCapEndingBlock']:
+            return 'first cap'
+        if block_number < self.constants['secondCapEndingBlock']:
+            return 'second cap'
+        if block_number < self.constants['endBlock']:
+            return 'open'
+        return 'ended'
+
+    def update(self, block_number):
+        started = time.time()
+        self.block_events = 0
+        confirmed_block = max(block_number - self.confirmations, self.indexer.start_block - 1)
+        self.indexer.sync(confirmed_block)
+        participants, tokens_sold, refunded_wei = self.unconfirmed(max(confirmed_block + 1, self.indexer.start_block),
+                                                                   block_number)
+        # Only the unconfirmed participants are looked at, the confirmed set is never copied
+        participant_count = len(self.participants) + sum(1 for participant in participants
+                                                         if participant not in self.participants)
+        tokens_sold += self.tokens_sold
+        refunded_wei += self.refunded_wei
+        assigned_supply, is_stopped, is_finalized = self.contract_batch.call(
+            [('assignedSupply', ()), ('isStopped', ()), ('isFinalized', ())], block=block_number)
+
+        status = {
+            'blockNumber': block_number,
+            'confirmedBlock': confirmed_block,
+            'assignedSupply': assigned_supply,
+            'participants': participant_count,
+            'tokensSold': tokens_sold,
+            'ethRaisedWei': tokens_sold // self.constants['tokenExchangeRate'] - refunded_wei,
+            'refundedWei': refunded_wei,
+            'capPeriod': self.cap_period(block_number),
+            'firstCapEndingBlock': self.constants['firstCapEndingBlock'],
+            'secondCapEndingBlock': self.constants['secondCapEndingBlock'],
+            'endBlock': self.constants['endBlock'],
+            'minCapReached': assigned_supply >= self.constants['minCap'],
+            'isStopped': is_stopped,
+            'isFinalized': is_finalized,
+            'blockEvents': self.block_events,
+            'updateSeconds': round(time.time() - started, 3),
+        }
+        with self.lock:
+            self.status = status
+        logger.info('Block {} | {} | Assigned supply: {} | Participants: {} | ETH raised: {} | Events: {}'.format(
+            block_number, status['capPeriod'], assigned_supply / 10**18, status['participants'],
+            status['ethRaisedWei'] / 10**18, status['blockEvents']))
+
+    def new_blocks(self):
+        # Prefers a block filter and falls back to polling eth_blockNumber. An
+        # expired filter is created again, a node that cannot create one is
+        # polled from then on
+        last = self.indexer.last_block()
+        filter_id = None
+        use_filter = True
+        while True:
+            changed = True
+            if use_filter:
+                try:
+                    if filter_id is None:
+                        filter_id = self.rpc.call('eth_newBlockFilter')
+                    else:
+                        changed = bool(self.rpc.call('eth_getFilterChanges', [filter_id]))
+                except RPCTransportError as e:
+                    # Says nothing about filter support, the block number is polled this time
+                    logger.info('Reading block filter failed ({})'.format(e))
+                except ValueError as e:
+                    if filter_id is None:
+                        logger.info('Block filter unavailable ({}), polling block number'.format(e))
+                        use_filter = False
+                    else:
+                        logger.info('Block filter {} expired ({}), creating a new one'.format(filter_id, e))
+                        filter_id = None
+
+            if changed:
+                head = self.rpc.block_number()
+                if head > last:
+                    last = head
+                    yield head
+            time.sleep(self.poll_interval)
+
+    def run(self):
+        for block_number in self.new_blocks():
+            self.update(block_number)
+
+    def get_status(self):
+        with self.lock:
+            return dict(self.status)
+
+    def metrics(self):
+        lines = []
+        for key, value in sorted(self.get_status().items()):
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                lines.append('gmt_sale_{} {}'.format(re.sub(r'([A-Z])', r'_\1', key).lower(), value))
+        lines.append('gmt_sale_cap_period{{period="{}"}} 1'.format(self.get_status().get('capPeriod')))
+        return '\n'.join(lines) + '\n'
+
+
+def serve(monitor, host, port):
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = monitor.metrics(), 'text/plain; version=0.0.4'
+            else:
+                body, content_type = json.dumps(monitor.get_status(), indent=4), 'application/json'
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.end_headers()
+            self.wfile.write(body.encode('utf-8'))
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    logger.info('Serving sale status on http://{}:{}/ and /metrics'.format(host, port))
+    return server
+
+
+@click.command()
+@click.option('--protocol', default="http", help='Ethereum node protocol')
+@click.option('--host', default="localhost", help='Ethereum node host')
+@click.option('--port', default='8545', help='Ethereum node port')
+@click.option('--contract-addr', help='Address of GMToken contract to monitor')
+@click.option('--db', help='Path to SQLite event store')
+@click.option('--listen-host', default='127.0.0.1', help='Host of the status endpoint')
+@click.option('--listen-port', default=9545, help='Port of the status endpoint')
+@click.option('--poll-interval', default=1.0, help='Seconds between new block checks')
+@click.option('--confirmations', default=6, help='Blocks after which events are stored, newer ones are read again')
+def setup(protocol, host, port, contract_addr, db, listen_host, listen_port, poll_interval, confirmations):
+    rpc = RPCClient(protocol, host, port)
+    registry = ArtifactRegistry.for_node(rpc)
+    abi = registry.abi(contract_addr)
+    # Sale parameters are read from the view cache, so restarts need no calls for them
+    contract_batch = ViewCache(ContractBatch(rpc, contract_addr, abi),
+                               classes_for(abi),
+                               path=os.path.join(os.path.dirname(__file__),
+                                                 'view_cache_{}.json'.format(contract_addr.lower())))
+    # The monitor may confirm events after fewer blocks, so its store is kept
+    # apart from the store of eth_indexer.py
+    db = db or os.path.join(os.path.dirname(__file__), 'events_monitor_{}.db'.format(contract_addr.lower()))
+    monitor = SaleMonitor(rpc,
+                          contract_batch,
+                          lambda on_event: EventIndexer(rpc, contract_addr, abi, db,
+                                                        start_block=deployment_block(registry, contract_addr),
+                                                        confirmations=confirmations,
+                                                        on_event=on_event),
+                          poll_interval=poll_interval,
+                          confirmations=confirmations)
+    serve(monitor, listen_host, listen_port)
+    monitor.run()
+
+if __name__ == '__main__':
+    setup()
@@ -0,0 +1,33 @@
+import threading
+
+
+# Hands out sequential nonces for a sending account without asking the node for
+# every transaction. The starting nonce is read once from the pending state.
+class NonceManager:
+
+    def __init__(self, rpc, address):
+        self.rpc = rpc
+        self.address = address
+        self.lock = threading.Lock()
+        self.nonce = None
+
+    def fetch(self):
+        return int(self.rpc.call('eth_getTransactionCount', [self.address, 'pending']), 16)
+
+    def next(self):
+        with self.lock:
+            if self.nonce is None:
+                self.nonce = self.fetch()
+            nonce = self.nonce
+            self.nonce += 1
+            return nonce
+
+    def start(self, nonce):
+        # Continue from a given nonce, e.g. when signing for a later broadcast
+        with self.lock:
+            self.nonce = nonce
+
+    def reset(self):
+        # Resynchronise with the node, e.g. after a transaction was rejected
+        with self.lock:
+            self.nonce = None
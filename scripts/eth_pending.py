@@ -0,0 +1,347 @@
+from contextlib import contextmanager
+from eth_receipts import format_receipt
+import collections
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger('DEPLOY')
+
+PENDING = 'pending'
+MINED = 'mined'
+REPLACED = 'replaced'
+DROPPED = 'dropped'
+
+
+def tx_from_rpc(transaction):
+    # Transaction fields from eth_getTransactionByHash in the form used for sending
+    tx = {'from': transaction['from'],
+          'value': int(transaction['value'], 16),
+          'data': transaction['input'],
+          'gas': int(transaction['gas'], 16),
+          'gasPrice': int(transaction['gasPrice'], 16),
+          'nonce': int(transaction['nonce'], 16)}
+    if transaction['to']:
+        tx['to'] = transaction['to']
+    return tx
+
+
+# Journal of every transaction the scripts send, saved to path so it survives
+# restarts. Receipts of all pending transactions are polled in one batch. A
+# transaction that is not mined within deadline seconds is sent again when the
+# node dropped it, or replaced with the same nonce at a higher gas price when it
+# is stuck. Waiting on a hash follows its replacements. The journal is written
+# once per poll and once per round of sends, under a file lock so the deploy and
+# transaction scripts can share it, and nonces settled for prune_after blocks
+# are dropped from it.
+class PendingTransactions:
+
+    def __init__(self, path, rpc, fee_engine, send, deadline=180, timeout=1800, poll_interval=0.1,
+                 max_poll_interval=5, backoff=1.5, confirmations=0, ceiling=None, prune_after=100):
+        self.path = path
+        self.rpc = rpc
+        self.fee_engine = fee_engine
+        # send(tx) broadcasts a transaction with tx['nonce'] and returns its hash. It
+        # is called with the journal locked and must not wait, the next poll retries
+        self.send = send
+        self.deadline = deadline
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self.confirmations = confirmations
+        # ceiling(tx) returns the highest gas price the contract accepts for tx, or None
+        self.ceiling = ceiling
+        # Never prune a nonce that callers may still be waiting to confirm
+        self.prune_after = max(prune_after, confirmations + 1)
+        self.lock = threading.RLock()
+        self.entries = {}
+        self.receipts = {}
+        # Hashes sent with the same sender and nonce, in the order they were tracked
+        self.groups = collections.defaultdict(list)
+        # Pruned hashes still to be removed from the file
+        self.removed = set()
+        # Hashes callers are waiting on are never pruned
+        self.waiting = collections.Counter()
+        self.dirty = False
+        with self.file_lock():
+            self.entries = self.read()
+        for transaction_hash, entry in self.entries.items():
+            self.groups[self.nonce_key(entry)].append(transaction_hash)
+
+    @contextmanager
+    def file_lock(self):
+        with open('{}.lock'.format(self.path), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read(self):
+        if not os.path.isfile(self.path):
+            return {}
+        with open(self.path, 'r') as journal_file:
+            return json.load(journal_file)
+
+    def save(self):
+        # Entries written by other processes since are kept, ours replace theirs
+        with self.lock:
+            if not self.dirty:
+                return
+            with self.file_lock():
+                entries = self.read()
+                for transaction_hash in self.removed:
+                    entries.pop(transaction_hash, None)
+                entries.update(self.entries)
+                # Write to a temporary file first so a crash never leaves a truncated journal
+                directory = os.path.dirname(os.path.abspath(self.path))
+                fd, tmp_path = tempfile.mkstemp(dir=directory)
+                with os.fdopen(fd, 'w') as journal_file:
+                    json.dump(entries, journal_file, indent=4)
+                os.replace(tmp_path, self.path)
+            self.removed.clear()
+            self.dirty = False
+
+    def track(self, transaction_hash, tx=None, label=None, raw=None):
+        # Without tx the sent transaction is read back from the node. The entry is
+        # written by the next save(), callers save once per round of sends
+        if tx is None:
+            transaction = self.rpc.call('eth_getTransactionByHash', [transaction_hash])
+            if transaction is None:
+                raise ValueError('Transaction {} is unknown to the node'.format(transaction_hash))
+            tx = tx_from_rpc(transaction)
+        with self.lock:
+            self.entries[transaction_hash] = {'tx': dict((k, v) for k, v in tx.items() if k != 'label'),
+                                              'label': label or tx.get('label'),
+                                              'raw': raw,
+                                              'sentAt': time.time(),
+                                              'status': PENDING,
+                                              'replacedBy': None,
+                                              'blockNumber': None}
+            key = self.nonce_key(self.entries[transaction_hash])
+            if transaction_hash not in self.groups[key]:
+                self.groups[key].append(transaction_hash)
+            self.dirty = True
+        return transaction_hash
+
+    def track_signed(self, signed, transaction_hash=None):
+        # Signed transactions keep their raw form, a dropped one is sent again unchanged
+        tx = dict((key, signed[key]) for key in ('from', 'value', 'data', 'gas', 'gasPrice', 'nonce'))
+        if signed['to']:
+            tx['to'] = signed['to']
+        return self.track(transaction_hash or signed['hash'], tx, label=signed.get('label'), raw=signed['raw'])
+
+    @staticmethod
+    def nonce_key(entry):
+        return entry['tx']['from'].lower(), entry['tx']['nonce']
+
+    def find(self, tx):
+        # Hash of the tracked transaction tx was sent as, if any. A node signing
+        # for an unlocked account reports a second copy of a transaction without its hash
+        with self.lock:
+            for transaction_hash in self.groups.get((tx['from'].lower(), tx['nonce']), []):
+                sent = self.entries[transaction_hash]['tx']
+                if all(sent.get(key) == tx.get(key) for key in ('to', 'value', 'data', 'gas', 'gasPrice')):
+                    return transaction_hash
+        return None
+
+    def group(self, transaction_hash):
+        # Every tracked transaction sharing the sender and nonce of transaction_hash
+        return list(self.groups[self.nonce_key(self.entries[transaction_hash])])
+
+    def pending(self):
+        # Transactions that can still be mined: neither dropped nor beaten to their nonce
+        hashes = []
+        for group in self.groups.values():
+            statuses = [self.entries[h]['status'] for h in group]
+            if MINED not in statuses and DROPPED not in statuses:
+                hashes += [h for h, status in zip(group, statuses) if status in (PENDING, REPLACED)]
+        return hashes
+
+    @staticmethod
+    def settled_block(entry):
+        return entry['blockNumber'] if entry['status'] == MINED else entry.get('droppedBlock')
+
+    def prune(self, head):
+        # Nonces mined or dropped prune_after blocks ago are not looked at again
+        for key, group in list(self.groups.items()):
+            blocks = [self.settled_block(self.entries[h]) for h in group]
+            blocks = [block for block in blocks if block is not None]
+            if blocks and head - max(blocks) >= self.prune_after and not any(self.waiting[h] for h in group):
+                for transaction_hash in group:
+                    del self.entries[transaction_hash]
+                    self.receipts.pop(transaction_hash, None)
+                    self.removed.add(transaction_hash)
+                del self.groups[key]
+                self.dirty = True
+
+    def record_receipts(self, hashes, receipts):
+        for transaction_hash, receipt in zip(hashes, receipts):
+            if receipt is None or receipt['blockNumber'] is None:
+                continue
+            receipt = format_receipt(receipt)
+            self.receipts[transaction_hash] = receipt
+            # Whatever else was sent with this nonce can no longer be mined
+            for other in self.group(transaction_hash):
+                if self.entries[other]['status'] == PENDING:
+                    self.entries[other]['status'] = REPLACED
+            self.entries[transaction_hash]['status'] = MINED
+            self.entries[transaction_hash]['blockNumber'] = receipt['blockNumber']
+            # When the receipt was first seen, bounded by the polling interval
+            self.entries[transaction_hash]['minedAt'] = time.time()
+            self.dirty = True
+
+    def poll(self):
+        with self.lock:
+            hashes = self.pending()
+            if not hashes:
+                self.save()
+                return
+            senders = sorted(set(self.entries[h]['tx']['from'].lower() for h in hashes))
+            results = self.rpc.batch([('eth_getTransactionReceipt', [h]) for h in hashes] +
+                                     [('eth_getTransactionCount', [sender, 'latest']) for sender in senders] +
+                                     [('eth_blockNumber', [])])
+            receipts, nonces = results[:len(hashes)], dict(zip(senders, results[len(hashes):-1]))
+            head = int(results[-1], 16)
+
+            self.record_receipts(hashes, receipts)
+
+            # A nonce the account has used without any of our transactions being
+            # mined. Receipts are read again in case a block arrived in between
+            used = [h for h in self.pending()
+                    if int(nonces[self.entries[h]['tx']['from'].lower()], 16) > self.entries[h]['tx']['nonce']]
+            if used:
+                self.record_receipts(used, self.rpc.batch([('eth_getTransactionReceipt', [h]) for h in used]))
+                for transaction_hash in self.pending():
+                    if transaction_hash in used:
+                        self.entries[transaction_hash]['status'] = DROPPED
+                        self.entries[transaction_hash]['droppedBlock'] = head
+                        self.dirty = True
+                        logger.info('Nonce {} of {} was used by another transaction'.format(
+                            self.entries[transaction_hash]['tx']['nonce'], transaction_hash))
+
+            stale = [h for h in self.pending()
+                     if not self.entries[h]['replacedBy'] and time.time() - self.entries[h]['sentAt'] > self.deadline]
+            if stale:
+                known = self.rpc.batch([('eth_getTransactionByHash', [h]) for h in stale])
+                for transaction_hash, transaction in zip(stale, known):
+                    self.unstick(transaction_hash, transaction)
+            self.prune(head)
+            self.save()
+
+    def unstick(self, transaction_hash, transaction):
+        entry = self.entries[transaction_hash]
+        self.dirty = True
+        if transaction is None:
+            # The node dropped it, a signed transaction is sent again as is
+            logger.info('Transaction {} was dropped, sending it again'.format(transaction_hash))
+            try:
+                if entry['raw']:
+                    self.rpc.call('eth_sendRawTransaction', [entry['raw']])
+                else:
+                    resent_hash = self.send(dict(entry['tx']))
+                    if resent_hash != transaction_hash:
+                        entry['replacedBy'] = resent_hash
+                        entry['status'] = REPLACED
+                        self.track(resent_hash, entry['tx'], label=entry['label'])
+            except ValueError as e:
+                logger.info('Sending {} again failed: {}'.format(transaction_hash, e))
+            entry['sentAt'] = time.time()
+            return
+
+        tx = tx_from_rpc(transaction)
+        try:
+            replacement = self.fee_engine.replacement(transaction, self.ceiling(tx) if self.ceiling else None)
+        except ValueError as e:
+            logger.info('Transaction {} is stuck: {}'.format(transaction_hash, e))
+            entry['sentAt'] = time.time()
+            return
+        try:
+            replacement_hash = self.send(dict(replacement))
+        except ValueError as e:
+            logger.info('Replacing {} failed: {}'.format(transaction_hash, e))
+            entry['sentAt'] = time.time()
+            return
+        logger.info('Transaction {} not mined within {} seconds, replaced with nonce {} at gas price {}. '
+                    'Transaction hash: {}'.format(transaction_hash, self.deadline, replacement['nonce'],
+                                                  replacement['gasPrice'], replacement_hash))
+        entry['replacedBy'] = replacement_hash
+        entry['status'] = REPLACED
+        self.track(replacement_hash, replacement, label=entry['label'])
+
+    def get_receipt(self, transaction_hash):
+        with self.lock:
+            if transaction_hash not in self.entries:
+                # Pruned from the journal, the node still has the receipt
+                receipt = self.rpc.call('eth_getTransactionReceipt', [transaction_hash])
+                return format_receipt(receipt) if receipt and receipt['blockNumber'] is not None else None
+            for other in self.group(transaction_hash):
+                if self.entries[other]['status'] == MINED:
+                    if other not in self.receipts:
+                        self.receipts[other] = format_receipt(
+                            self.rpc.call('eth_getTransactionReceipt', [other]))
+                    return self.receipts[other]
+        return None
+
+    def dropped(self, transaction_hash):
+        # Neither the transaction nor anything replacing it can be mined any more
+        with self.lock:
+            return transaction_hash in self.entries and \
+                all(self.entries[h]['status'] == DROPPED for h in self.group(transaction_hash))
+
+    def is_confirmed(self, receipt):
+        if self.confirmations == 0:
+            return True
+        return self.rpc.block_number() - receipt['blockNumber'] >= self.confirmations
+
+    def wait_all(self, transaction_hashes):
+        # Receipts are returned in the same order as the given hashes, a replaced
+        # transaction returns the receipt of the transaction that replaced it
+        with self.lock:
+            for transaction_hash in transaction_hashes:
+                if transaction_hash not in self.entries:
+                    self.track(transaction_hash)
+            self.waiting.update(transaction_hashes)
+        try:
+            return self.poll_receipts(transaction_hashes)
+        finally:
+            with self.lock:
+                self.waiting.subtract(transaction_hashes)
+                self.waiting += collections.Counter()
+
+    def poll_receipts(self, transaction_hashes):
+        started = time.time()
+        interval = self.poll_interval
+        while True:
+            self.poll()
+            receipts = [self.get_receipt(transaction_hash) for transaction_hash in transaction_hashes]
+            for transaction_hash, receipt in zip(transaction_hashes, receipts):
+                if receipt is None and self.dropped(transaction_hash):
+                    raise ValueError('Transaction {} was dropped'.format(transaction_hash))
+            if all(receipt is not None and self.is_confirmed(receipt) for receipt in receipts):
+                return receipts
+
+            if time.time() + interval > started + self.timeout:
+                raise TimeoutError('{} transactions not mined with {} confirmations within {} seconds'.format(
+                    sum(1 for receipt in receipts if receipt is None), self.confirmations, self.timeout))
+
+            time.sleep(interval)
+            interval = min(interval * self.backoff, self.max_poll_interval)
+
+    def wait(self, transaction_hash):
+        return self.wait_all([transaction_hash])[0]
+
+    def gas_price(self, transaction_hash):
+        entry = self.entries.get(transaction_hash)
+        return entry['tx']['gasPrice'] if entry else None
+
+    def summary(self):
+        counts = {}
+        for entry in self.entries.values():
+            counts[entry['status']] = counts.get(entry['status'], 0) + 1
+        return counts
@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+import collections
+import json
+import os
+import tempfile
+import threading
+import time
+
+PHASES = ('compile', 'encode', 'fees', 'broadcast', 'inclusion')
+
+
+# Per deployment timings and costs of a deployment run. Phases are measured
+# where EthDeploy does the work: compile (solc or the compilation cache),
+# encode (constructor arguments), fees (gas estimate and gas price), broadcast
+# (until the node returned the hash) and inclusion (from broadcast until the
+# receipt was first seen, so bounded below by the receipt polling interval).
+# Deployments may run on several threads, every update takes the lock.
+class DeploymentProfiler:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.finished = None
+        self.deployments = collections.OrderedDict()
+
+    def entry(self, key):
+        # One row per deployment instruction, keyed by its position in the
+        # instructions file; the label is a field as labels may repeat or be missing
+        if key not in self.deployments:
+            self.deployments[key] = {'instruction': key, 'label': None, 'phases': {}}
+        return self.deployments[key]
+
+    def add(self, key, phase, seconds):
+        with self.lock:
+            phases = self.entry(key)['phases']
+            phases[phase] = phases.get(phase, 0) + seconds
+
+    @contextmanager
+    def timer(self, key, phase):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.add(key, phase, time.time() - started)
+
+    def record(self, key, **fields):
+        with self.lock:
+            self.entry(key).update(fields)
+
+    def get(self, key, field):
+        with self.lock:
+            return self.deployments.get(key, {}).get(field)
+
+    def finish(self):
+        self.finished = time.time()
+
+    def report(self):
+        with self.lock:
+            deployments = [dict(d, phases=dict(d['phases'])) for d in self.deployments.values()]
+        elapsed = (self.finished or time.time()) - self.started
+        sent = [d for d in deployments if 'gasUsed' in d]
+        gas_used = sum(d['gasUsed'] for d in sent)
+        return {'elapsed': elapsed,
+                'deployments': deployments,
+                'totals': {'deployments': len(sent),
+                           'restored': len(deployments) - len(sent),
+                           'gasUsed': gas_used,
+                           'fee': sum(d['fee'] for d in sent),
+                           'phases': dict((phase, sum(d['phases'].get(phase, 0) for d in deployments))
+                                          for phase in PHASES),
+                           'deploymentsPerMinute': len(sent) * 60 / elapsed if elapsed else 0,
+                           'gasPerSecond': gas_used / elapsed if elapsed else 0}}
+
+    def save(self, path):
+        # Write to a temporary file first so a crash never leaves a truncated report
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+        with os.fdopen(fd, 'w') as profile_file:
+            json.dump(self.report(), profile_file, indent=4)
+        os.replace(tmp_path, path)
+
+    def format_table(self):
+        report = self.report()
+        columns = '{:>4} {:<24} {:>8} {:>8} {:>8} {:>9} {:>9} {:>10} {:>10} {:>7} {:>9}'
+        lines = [columns.format('#', 'label', 'compile', 'encode', 'fees', 'broadcast', 'inclusion',
+                                'gas used', 'gas limit', 'used', 'gwei')]
+        for d in report['deployments']:
+            phases = ['{:.2f}s'.format(d['phases'][phase]) if phase in d['phases'] else '-' for phase in PHASES]
+            if 'gasUsed' in d:
+                cost = [d['gasUsed'], d['gas'] or '-', '{:.0%}'.format(d['gasUsed'] / float(d['gas'])) if d['gas'] else '-',
+                        '{:.2f}'.format(d['gasPrice'] / 10.0**9)]
+            else:
+                cost = ['restored', '-', '-', '-']
+            instruction = d['instruction'] if isinstance(d['instruction'], int) else '-'
+            lines.append(columns.format(instruction, (d['label'] or 'unknown')[:24], *(phases + cost)))
+        totals = report['totals']
+        lines.append(columns.format('', 'total', *(['{:.2f}s'.format(totals['phases'][phase]) for phase in PHASES] +
+                                               [totals['gasUsed'], '', '', ''])))
+        lines.append('{} deployments in {:.1f}s ({:.1f} per minute, {:.0f} gas/s), {} Ether spent on gas'.format(
+            totals['deployments'], report['elapsed'], totals['deploymentsPerMinute'], totals['gasPerSecond'],
+            totals['fee'] / 10.0**18))
+        return lines
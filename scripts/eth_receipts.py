@@ -0,0 +1,12 @@
+# Receipt fields the scripts use as integers
+RECEIPT_INT_FIELDS = ('blockNumber', 'gasUsed', 'cumulativeGasUsed', 'status', 'transactionIndex')
+
+
+def format_receipt(receipt):
+    # Raw JSON-RPC receipts carry hex quantities
+    receipt = dict(receipt)
+    for field in RECEIPT_INT_FIELDS:
+        if isinstance(receipt.get(field), str):
+            receipt[field] = int(receipt[field], 16)
+    return receipt
+
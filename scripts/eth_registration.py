@@ -0,0 +1,353 @@
+from eth_rpc import format_transaction
+from concurrent.futures import ThreadPoolExecutor
+import collections
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+
+logger = logging.getLogger('DEPLOY')
+
+ADDRESS_RE = re.compile(r'^(0x)?[0-9a-fA-F]{40}$')
+
+
+def read_addresses(path):
+    # Accepts a JSON array of addresses or one address per line. Line based files
+    # are streamed so arbitrarily large KYC lists never have to fit in memory
+    with open(path, 'r') as addresses_file:
+        first = addresses_file.read(1)
+        while first and first.isspace():
+            first = addresses_file.read(1)
+        if first == '[':
+            addresses_file.seek(0)
+            for address in json.load(addresses_file):
+                yield address
+            return
+        addresses_file.seek(0)
+        for line in addresses_file:
+            address = line.strip().strip(',').strip('"')
+            if address and not address.startswith('#'):
+                yield address
+
+
+def is_valid_address(address):
+    return isinstance(address, str) and ADDRESS_RE.match(address) is not None
+
+
+def sample_addresses(count):
+    # Addresses nobody holds a key for, so they are never registered
+    return ['0x' + hashlib.sha256('registration sample {}'.format(i).encode('utf-8')).hexdigest()[:40]
+            for i in range(count)]
+
+
+def chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Checks GMToken.registered for large address lists. Addresses are read in
+# batches of eth_calls pinned to one block and several batches are in flight
+# over the connection pool at once.
+class RegistrationChecker:
+
+    def __init__(self, contract_batch, batch_size=100, workers=8, log_every=10000):
+        self.contract_batch = contract_batch
+        self.batch_size = batch_size
+        self.workers = workers
+        self.log_every = log_every
+
+    def check_batch(self, addresses, block):
+        results = self.contract_batch.call_many('registered', [(address,) for address in addresses], block=block)
+        return [(address, 'registered' if registered else 'not registered')
+                for address, registered in zip(addresses, results)]
+
+    def check(self, addresses, block):
+        # Yields (address, status) in input order while keeping at most two
+        # batches per worker in flight
+        in_flight = collections.deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for chunk in chunks(addresses, self.batch_size):
+                valid = [address for address in chunk if is_valid_address(address)]
+                future = executor.submit(self.check_batch, valid, block) if valid else None
+                in_flight.append((chunk, future))
+                while len(in_flight) >= self.workers * 2:
+                    for result in self.collect(*in_flight.popleft()):
+                        yield result
+            while in_flight:
+                for result in self.collect(*in_flight.popleft()):
+                    yield result
+
+    @staticmethod
+    def collect(chunk, future):
+        statuses = dict(future.result()) if future else {}
+        return [(address, statuses.get(address, 'invalid')) for address in chunk]
+
+    def check_file(self, path, output_path, block):
+        counts = collections.Counter()
+        started = time.time()
+        with open(output_path, 'w') as output_file:
+            output_file.write('address,status\n')
+            for address, status in self.check(read_addresses(path), block):
+                output_file.write('{},{}\n'.format(address, status))
+                counts[status] += 1
+                total = sum(counts.values())
+                if total % self.log_every == 0:
+                    logger.info('Checked {} addresses ({:.0f} addresses/s)'.format(
+                        total, total / (time.time() - started)))
+
+        elapsed = time.time() - started
+        total = sum(counts.values())
+        logger.info("""
+                    Registration check at block {}::
+                    Registered: {}
+                    Not registered: {}
+                    Invalid: {}
+                    Checked {} addresses in {:.2f}s ({:.0f} addresses/s)
+                    Results written to {}""".format(
+                    block,
+                    counts['registered'],
+                    counts['not registered'],
+                    counts['invalid'],
+                    total,
+                    elapsed,
+                    total / elapsed if elapsed else 0,
+                    output_path))
+        return counts
+
+
+# Registers large address lists through changeRegistrationStatuses. The gas cost
+# per address is estimated with estimateGas, addresses are packed into chunks
+# that fit the gas budget, all chunks are broadcast at once with locally
+# assigned nonces. Chunks that could not be sent, were dropped or reverted are
+# sent again, chunks still pending are waited for.
+class RegistrationSubmitter:
+
+    def __init__(self, rpc, translator, contract_addr, _from, nonce_manager, pending, gas_price,
+                 gas_budget=None, gas_margin=1.2, sample_size=20, max_retries=3, workers=8,
+                 signer=None, broadcaster=None):
+        self.rpc = rpc
+        self.translator = translator
+        self.contract_addr = contract_addr
+        self._from = _from
+        self.nonce_manager = nonce_manager
+        # Journal of sent transactions, replaces chunks that get stuck
+        self.pending = pending
+        self.gas_price = gas_price
+        self.gas_budget = gas_budget
+        self.gas_margin = gas_margin
+        self.sample_size = sample_size
+        self.max_retries = max_retries
+        self.workers = workers
+        # Transactions are signed locally when a signer is given, otherwise the
+        # node signs with the unlocked account
+        self.signer = signer
+        self.broadcaster = broadcaster
+
+    def encode(self, addresses, status):
+        return '0x' + self.translator.encode_function_call('changeRegistrationStatuses', [addresses, status]).hex()
+
+    def estimate_gas(self, addresses, status):
+        return int(self.rpc.call('eth_estimateGas', [{'from': self._from,
+                                                      'to': self.contract_addr,
+                                                      'data': self.encode(addresses, status)}]), 16)
+
+    def estimate_cost(self, addresses, status):
+        # Returns (base gas, gas per address). Real addresses may already have the
+        # status and only cost a storage update, so the estimate uses addresses
+        # that are certainly unregistered and pays for setting a fresh slot
+        if len(addresses) == 1:
+            return self.estimate_gas(addresses, status), 0
+        sample = sample_addresses(min(self.sample_size, len(addresses)))
+        single = self.estimate_gas(sample[:1], status)
+        per_address = max(0, (self.estimate_gas(sample, status) - single) // (len(sample) - 1))
+        return single - per_address, per_address
+
+    def chunk_size(self, base, per_address):
+        gas_budget = self.gas_budget
+        if not gas_budget:
+            gas_budget = int(self.rpc.call('eth_getBlockByNumber', ['latest', False])['gasLimit'], 16) // 2
+        if not per_address:
+            return None
+        size = int((gas_budget / self.gas_margin - base) // per_address)
+        if size < 1:
+            raise ValueError('Gas budget {} is too small for a single address'.format(gas_budget))
+        return size
+
+    def send(self, addresses, status, gas, nonce):
+        tx = {'from': self._from,
+              'to': self.contract_addr,
+              'data': self.encode(addresses, status),
+              'gas': gas,
+              'gasPrice': self.gas_price,
+              'nonce': nonce}
+        if self.signer:
+            transaction_hash = self.broadcaster.send(self.signer.sign(tx, tx['nonce']))
+        else:
+            transaction_hash = self.rpc.call('eth_sendTransaction', [format_transaction(tx)])
+        return self.pending.track(transaction_hash, tx, label='changeRegistrationStatuses')
+
+    @staticmethod
+    def succeeded(receipt, gas):
+        status = receipt.get('status')
+        if status is not None:
+            return (int(status, 16) if isinstance(status, str) else status) == 1
+        # Pre-Byzantium receipts have no status, an exhausted gas limit means a throw
+        return receipt['gasUsed'] < gas
+
+    def submit_chunks(self, unsent, in_flight, status, base, per_address):
+        # unsent is a list of (chunk, nonce), the nonce of a chunk whose send
+        # failed is reused so no gap is left behind. in_flight is a list of
+        # (chunk, gas, transaction hash) sent in an earlier round. Broadcasts the
+        # unsent chunks, then waits for all of them. Returns the receipts of
+        # successful chunks, the chunks to send again and those still pending
+        sent = list(in_flight)
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = []
+            for chunk, nonce in unsent:
+                gas = int((base + per_address * len(chunk)) * self.gas_margin)
+                # Nonces are taken in chunk order before any send starts
+                nonce = self.nonce_manager.next() if nonce is None else nonce
+                futures.append((chunk, gas, nonce, executor.submit(self.send, chunk, status, gas, nonce)))
+            for chunk, gas, nonce, future in futures:
+                try:
+                    transaction_hash = future.result()
+                except (ValueError, OSError) as e:
+                    logger.info('Sending a registration chunk of {} addresses with nonce {} failed: {}'.format(
+                        len(chunk), nonce, e))
+                    failed.append((chunk, nonce))
+                    continue
+                logger.info('Registration chunk of {} addresses sent. Transaction hash: {}'.format(
+                    len(chunk), transaction_hash))
+                sent.append((chunk, gas, transaction_hash))
+        # One journal write for the whole round
+        self.pending.save()
+
+        try:
+            # All receipts are polled together instead of one chunk at a time
+            all_receipts = self.pending.wait_all([transaction_hash for _, _, transaction_hash in sent])
+        except (TimeoutError, ValueError):
+            # Timed out or dropped, whatever was mined is kept
+            all_receipts = [self.pending.get_receipt(transaction_hash) for _, _, transaction_hash in sent]
+
+        receipts, pending = [], []
+        for (chunk, gas, transaction_hash), receipt in zip(sent, all_receipts):
+            if receipt is None and self.pending.dropped(transaction_hash):
+                # Its nonce went to another transaction, the chunk needs a new one
+                logger.info('Transaction {} was dropped'.format(transaction_hash))
+                failed.append((chunk, None))
+            elif receipt is None:
+                # Still pending, the journal replaces it at the same nonce when it
+                # is stuck. Sending the chunk again could register it twice
+                logger.info('Transaction {} not mined in time'.format(transaction_hash))
+                pending.append((chunk, gas, transaction_hash))
+            elif self.succeeded(receipt, gas):
+                receipts.append(receipt)
+            else:
+                logger.info('Transaction {} failed'.format(transaction_hash))
+                failed.append((chunk, None))
+        return receipts, failed, pending
+
+    def submit(self, addresses, status):
+        if not addresses:
+            return []
+        base, per_address = self.estimate_cost(addresses, status)
+        size = self.chunk_size(base, per_address) or len(addresses)
+        chunks = [addresses[i:i + size] for i in range(0, len(addresses), size)]
+        logger.info('Registering {} addresses in {} chunks of up to {} addresses ({} + {} gas per address)'.format(
+            len(addresses), len(chunks), size, base, per_address))
+
+        receipts = []
+        unsent, in_flight = [(chunk, None) for chunk in chunks], []
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                logger.info('Retrying {} failed chunks and waiting for {} pending ones (attempt {})'.format(
+                    len(unsent), len(in_flight), attempt))
+            chunk_receipts, unsent, in_flight = self.submit_chunks(unsent, in_flight, status, base, per_address)
+            receipts += chunk_receipts
+            if not unsent and not in_flight:
+                break
+
+        if unsent or in_flight:
+            raise ValueError('{} chunks ({} addresses) could not be registered, {} chunks are still pending'.format(
+                len(unsent), sum(len(chunk) for chunk, _ in unsent), len(in_flight)))
+
+        blocks = [receipt['blockNumber'] for receipt in receipts]
+        logger.info('Registered {} addresses in {} transactions between blocks {} and {}, {} gas used'.format(
+            len(addresses), len(receipts), min(blocks), max(blocks), sum(r['gasUsed'] for r in receipts)))
+        return receipts
+
+
+# Local record of the registration status last seen or set on-chain per address,
+# so repeated syncs only have to look at addresses that are new or changed.
+class RegistrationIndex:
+
+    def __init__(self, path, contract_addr):
+        self.path = path
+        self.contract_addr = contract_addr.lower()
+        self.statuses = {}
+        if os.path.isfile(path):
+            with open(path, 'r') as index_file:
+                data = json.load(index_file)
+            if data['contract'] != self.contract_addr:
+                raise ValueError('Registration index {} belongs to contract {}'.format(path, data['contract']))
+            self.statuses = data['statuses']
+
+    @staticmethod
+    def normalize(address):
+        address = address.lower()
+        return address if address.startswith('0x') else '0x' + address
+
+    def get(self, address):
+        return self.statuses.get(self.normalize(address))
+
+    def update(self, address, status):
+        self.statuses[self.normalize(address)] = status
+
+    def save(self):
+        # Write to a temporary file first so a crash never leaves a truncated index
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as index_file:
+            json.dump({'contract': self.contract_addr, 'statuses': self.statuses}, index_file)
+        os.replace(tmp_path, self.path)
+
+
+# Brings the on-chain registration status of a desired address list in line by
+# only reading addresses missing from the index and only submitting the delta.
+class RegistrationSync:
+
+    def __init__(self, checker, submitter, index):
+        self.checker = checker
+        self.submitter = submitter
+        self.index = index
+
+    def sync(self, addresses, status, block, verify=False):
+        addresses = list(collections.OrderedDict.fromkeys(
+            self.index.normalize(address) for address in addresses if is_valid_address(address)))
+
+        # Read the on-chain status of addresses the index has not seen yet, or of
+        # every address when the index may be stale
+        unknown = [address for address in addresses if verify or self.index.get(address) is None]
+        for address, current in self.checker.check(unknown, block):
+            self.index.update(address, current == 'registered')
+        self.index.save()
+
+        delta = [address for address in addresses if self.index.get(address) != status]
+        logger.info('{} addresses: {} read on-chain, {} already up to date, {} to submit'.format(
+            len(addresses), len(unknown), len(addresses) - len(delta), len(delta)))
+
+        receipts = self.submitter.submit(delta, status)
+        for address in delta:
+            self.index.update(address, status)
+        self.index.save()
+        return receipts
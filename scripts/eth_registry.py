@@ -0,0 +1,137 @@
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'deployed')
+LEGACY_ABIS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'deployed_abis.json')
+
+
+def normalize_address(address):
+    address = address.lower()
+    return address if address.startswith('0x') else '0x' + address
+
+
+def write_json(path, data, **kwargs):
+    # Write to a temporary file first so a crash never leaves a truncated file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w') as json_file:
+        json.dump(data, json_file, **kwargs)
+    # mkstemp creates the file readable by its owner only
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+# Registry of deployed contracts. index.json holds one section per network id,
+# mapping addresses to their label, deployment block and ABI digest and labels
+# to the address they were last deployed at, so a label deployed on a dev chain
+# never hides the same label on mainnet. ABIs live in abis/<sha256>.json so
+# contracts built from the same source share one file and a lookup only reads
+# the ABI it needs. Every change is appended to history.jsonl. Writers hold an
+# exclusive lock on the registry, so concurrent deployments merge instead of
+# overwriting each other.
+class ArtifactRegistry:
+
+    def __init__(self, network, root=DEFAULT_ROOT):
+        self.network = str(network)
+        self.root = root
+        self.index_path = os.path.join(root, 'index.json')
+        self.abis_dir = os.path.join(root, 'abis')
+        self.thread_lock = threading.Lock()
+        if not os.path.isdir(self.abis_dir):
+            os.makedirs(self.abis_dir)
+        if self.network not in self.read_index()['networks']:
+            self.migrate(LEGACY_ABIS)
+
+    @classmethod
+    def for_node(cls, rpc, root=DEFAULT_ROOT):
+        # The registry section of the network the node is on
+        return cls(rpc.call('net_version'), root)
+
+    @contextmanager
+    def lock(self):
+        with self.thread_lock, open(os.path.join(self.root, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_index(self):
+        if not os.path.isfile(self.index_path):
+            return {'networks': {}}
+        with open(self.index_path, 'r') as index_file:
+            return json.load(index_file)
+
+    def section(self, index):
+        return index['networks'].get(self.network, {'contracts': {}, 'labels': {}})
+
+    def store_abi(self, abi):
+        encoded = json.dumps(abi, sort_keys=True)
+        digest = hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+        path = os.path.join(self.abis_dir, '{}.json'.format(digest))
+        if not os.path.isfile(path):
+            write_json(path, abi)
+        return digest
+
+    def register(self, address, abi, label=None, block_number=None, transaction_hash=None):
+        address = normalize_address(address)
+        with self.lock():
+            index = self.read_index()
+            section = index['networks'].setdefault(self.network, {'contracts': {}, 'labels': {}})
+            entry = section['contracts'].get(address, {})
+            entry['abi'] = self.store_abi(abi)
+            # Fields that are not known now keep the value recorded before
+            for key, value in (('label', label), ('blockNumber', block_number), ('transactionHash', transaction_hash)):
+                if value is not None or key not in entry:
+                    entry[key] = value
+            section['contracts'][address] = entry
+            if label:
+                section['labels'][label] = address
+            write_json(self.index_path, index, indent=4, sort_keys=True)
+            with open(os.path.join(self.root, 'history.jsonl'), 'a') as history_file:
+                history_file.write(json.dumps(dict(entry, address=address, network=self.network,
+                                                   time=int(time.time()))) + '\n')
+        return entry
+
+    def resolve(self, address_or_label, section=None):
+        section = section or self.section(self.read_index())
+        if address_or_label in section['labels']:
+            return section['labels'][address_or_label]
+        address = normalize_address(address_or_label)
+        return address if address in section['contracts'] else None
+
+    def get(self, address_or_label):
+        section = self.section(self.read_index())
+        address = self.resolve(address_or_label, section)
+        if address is None:
+            return None
+        return dict(section['contracts'][address], address=address)
+
+    def abi(self, address_or_label):
+        entry = self.get(address_or_label)
+        if entry is None:
+            raise ValueError('No deployed contract {} on network {} in {}'.format(address_or_label, self.network,
+                                                                                  self.root))
+        with open(os.path.join(self.abis_dir, '{}.json'.format(entry['abi'])), 'r') as abi_file:
+            return json.load(abi_file)
+
+    def migrate(self, abis_path):
+        # Imports deployed_abis.json written by earlier versions into a new
+        # network section. The file does not say which network its contracts are
+        # on, its entries carry no label so they never shadow a deployment
+        abis = {}
+        if os.path.isfile(abis_path):
+            with open(abis_path, 'r') as abis_file:
+                abis = json.load(abis_file)
+        for address, abi in abis.items():
+            self.register(address, abi)
+        with self.lock():
+            index = self.read_index()
+            if self.network not in index['networks']:
+                index['networks'][self.network] = {'contracts': {}, 'labels': {}}
+                write_json(self.index_path, index, indent=4, sort_keys=True)
@@ -0,0 +1,350 @@
+import asyncio
+import bisect
+import collections
+import itertools
+import json
+import socket
+import ssl
+import threading
+import time
+from urllib.parse import urlparse
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+# Seconds to wait per method, anything else uses the client timeout
+METHOD_TIMEOUTS = {
+    'eth_blockNumber': 10,
+    'eth_getTransactionReceipt': 10,
+    'eth_getTransactionCount': 10,
+    'eth_estimateGas': 60,
+    'eth_getLogs': 120,
+}
+
+# Times a request is sent again when its connection broke before it was answered
+CONNECTION_RETRIES = 1
+
+# Methods that may be sent twice without harm. Anything else, like
+# eth_sendTransaction or eth_getFilterChanges, is never sent again once it may
+# have reached the node. Raw sends are safe, a node answers a second copy of a
+# transaction with a "known transaction" error that Broadcaster.send handles.
+IDEMPOTENT_METHODS = frozenset([
+    'eth_accounts',
+    'eth_blockNumber',
+    'eth_call',
+    'eth_chainId',
+    'eth_estimateGas',
+    'eth_gasPrice',
+    'eth_getBalance',
+    'eth_getBlockByHash',
+    'eth_getBlockByNumber',
+    'eth_getCode',
+    'eth_getLogs',
+    'eth_getStorageAt',
+    'eth_getTransactionByHash',
+    'eth_getTransactionCount',
+    'eth_getTransactionReceipt',
+    'eth_sendRawTransaction',
+    'net_version',
+])
+
+
+# Every failure of a request, from the node or from the transport, is raised as
+# an RPCError. It is a ValueError so callers handling node errors also survive
+# timeouts and dropped connections.
+class RPCError(ValueError):
+    pass
+
+
+# The request or its answer was lost, the node may or may not have handled it
+class RPCTransportError(RPCError):
+    pass
+
+
+class RPCTimeout(RPCTransportError):
+    pass
+
+
+def format_transaction(tx):
+    # Transaction in the form eth_sendTransaction takes, quantities as hex
+    formatted = dict((key, tx[key]) for key in ('from', 'to', 'data') if tx.get(key))
+    for key in ('value', 'gas', 'gasPrice', 'nonce'):
+        if tx.get(key) is not None:
+            formatted[key] = hex(tx[key])
+    return formatted
+
+
+class LatencyHistogram:
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the given fraction of requests
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return LATENCY_BUCKETS[-1]
+
+    def summary(self):
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else 0,
+                'p50': self.percentile(0.5),
+                'p90': self.percentile(0.9),
+                'p99': self.percentile(0.99)}
+
+
+# One keep-alive HTTP/1.1 connection. Requests are pipelined: several requests
+# are written before their responses arrive, and a reader task hands responses
+# back in order.
+class HTTPConnection:
+
+    def __init__(self, reader, writer, host, path):
+        self.reader = reader
+        self.writer = writer
+        self.host = host
+        self.path = path
+        self.pending = collections.deque()
+        self.write_lock = asyncio.Lock()
+        self.closed = False
+        self.reader_task = asyncio.ensure_future(self.read_loop())
+
+    @classmethod
+    async def open(cls, url):
+        use_ssl = url.scheme == 'https'
+        port = url.port or (443 if use_ssl else 80)
+        reader, writer = await asyncio.open_connection(url.hostname, port,
+                                                       ssl=ssl.create_default_context() if use_ssl else None)
+        # Requests are small, do not let Nagle hold them back
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(reader, writer, url.netloc, url.path or '/')
+
+    @property
+    def in_flight(self):
+        return len(self.pending)
+
+    async def request(self, body):
+        future = asyncio.get_event_loop().create_future()
+        async with self.write_lock:
+            if self.closed:
+                raise ConnectionError('Connection closed')
+            self.pending.append(future)
+            self.writer.write(('POST {} HTTP/1.1\r\n'
+                               'Host: {}\r\n'
+                               'Content-Type: application/json\r\n'
+                               'Content-Length: {}\r\n'
+                               'Connection: keep-alive\r\n\r\n').format(self.path, self.host, len(body)).encode() + body)
+            await self.writer.drain()
+        return await future
+
+    async def read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Connection closed by node')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = (await self.reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                body += await self.reader.readexactly(size)
+                await self.reader.readline()
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self.reader.read()
+            headers['connection'] = 'close'
+        return status, headers, body
+
+    async def read_loop(self):
+        try:
+            while True:
+                status, headers, body = await self.read_response()
+                future = self.pending.popleft()
+                if future.done():
+                    # Timed out already, the response is read only to keep the pipeline in order
+                    pass
+                elif status != 200:
+                    future.set_exception(RPCError('HTTP error {}: {}'.format(status, body[:200])))
+                else:
+                    future.set_result(body)
+                if headers.get('connection', '').lower() == 'close':
+                    raise ConnectionError('Connection closed by node')
+        except (ConnectionError, OSError, ValueError, IndexError, asyncio.IncompleteReadError) as e:
+            self.close(e)
+
+    def close(self, error=None):
+        self.closed = True
+        self.writer.close()
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError('Connection closed: {}'.format(error)))
+
+
+# asyncio JSON-RPC client. Requests are spread over a bounded pool of pipelined
+# keep-alive connections, every method can have its own timeout and latencies
+# are recorded per method.
+class AsyncRPCClient:
+
+    def __init__(self, url, pool_size=10, pipeline_depth=4, timeout=30, method_timeouts=None):
+        self.url = urlparse(url)
+        self.pool_size = pool_size
+        self.pipeline_depth = pipeline_depth
+        self.timeout = timeout
+        self.method_timeouts = METHOD_TIMEOUTS if method_timeouts is None else method_timeouts
+        self.connections = []
+        self.slots = None
+        self.connect_lock = None
+        self.ids = itertools.count(1)
+        self.histograms = collections.defaultdict(LatencyHistogram)
+
+    async def connection(self):
+        # Least loaded open connection, a new one while the pool is not full
+        self.connections = [c for c in self.connections if not c.closed]
+        idle = min(self.connections, key=lambda c: c.in_flight) if self.connections else None
+        if idle is not None and (idle.in_flight == 0 or len(self.connections) >= self.pool_size):
+            return idle
+        async with self.connect_lock:
+            if len([c for c in self.connections if not c.closed]) < self.pool_size:
+                self.connections.append(await HTTPConnection.open(self.url))
+                return self.connections[-1]
+        return min(self.connections, key=lambda c: c.in_flight)
+
+    async def post(self, payload, timeout):
+        if self.slots is None:
+            # Created lazily so they bind to the loop that runs the client
+            self.slots = asyncio.Semaphore(self.pool_size * self.pipeline_depth)
+            self.connect_lock = asyncio.Lock()
+        body = json.dumps(payload).encode()
+        # A batch is sent again only when every request in it may be
+        methods = [p['method'] for p in payload] if isinstance(payload, list) else [payload['method']]
+        retries = CONNECTION_RETRIES if all(method in IDEMPOTENT_METHODS for method in methods) else 0
+        for attempt in range(retries + 1):
+            async with self.slots:
+                try:
+                    connection = await self.connection()
+                except OSError as e:
+                    # Nothing was written yet, so any request can be sent again
+                    if attempt == retries:
+                        raise RPCTransportError('RPC connection failed: {}'.format(e))
+                    continue
+                try:
+                    response = await asyncio.wait_for(connection.request(body), timeout)
+                    break
+                except asyncio.TimeoutError:
+                    # A pipelined connection cannot skip a response, so drop it.
+                    # The idempotent requests queued behind this one are sent
+                    # again on a fresh connection
+                    connection.close('timeout')
+                    raise RPCTimeout('RPC request timed out after {} seconds'.format(timeout))
+                except (OSError, asyncio.IncompleteReadError) as e:
+                    if attempt == retries:
+                        raise RPCTransportError('RPC connection failed: {}'.format(e))
+        return json.loads(response.decode())
+
+    def payload(self, method, params):
+        return {'jsonrpc': '2.0', 'id': next(self.ids), 'method': method, 'params': list(params or [])}
+
+    @staticmethod
+    def result(response):
+        if 'error' in response:
+            error = response['error']
+            raise RPCError('RPC error: {}'.format(error.get('message', error) if isinstance(error, dict) else error))
+        return response['result']
+
+    async def call(self, method, params=None):
+        started = time.time()
+        try:
+            return self.result(await self.post(self.payload(method, params),
+                                               self.method_timeouts.get(method, self.timeout)))
+        finally:
+            self.histograms[method].record(time.time() - started)
+
+    async def batch(self, calls):
+        # calls is a list of (method, params); results are returned in the same order
+        if not calls:
+            return []
+        payloads = [self.payload(method, params) for method, params in calls]
+        timeout = max(self.method_timeouts.get(method, self.timeout) for method, _ in calls)
+        started = time.time()
+        try:
+            responses = await self.post(payloads, timeout)
+        finally:
+            self.histograms['batch'].record(time.time() - started)
+        if isinstance(responses, dict):
+            # The node rejected the batch as a whole
+            return self.result(responses)
+        # Nodes may answer a batch in any order
+        by_id = dict((response['id'], response) for response in responses)
+        return [self.result(by_id[payload['id']]) for payload in payloads]
+
+    async def map(self, calls):
+        # Sends every (method, params) as its own request, concurrently
+        return await asyncio.gather(*[self.call(method, params) for method, params in calls])
+
+    def stats(self):
+        return dict((method, histogram.summary()) for method, histogram in sorted(self.histograms.items()))
+
+    def format_stats(self):
+        return ['{}: {} requests | mean {:.1f}ms | p50 < {:g}ms | p90 < {:g}ms | p99 < {:g}ms'.format(
+            method, s['count'], s['mean'] * 1000, s['p50'] * 1000, s['p90'] * 1000, s['p99'] * 1000)
+            for method, s in sorted(self.stats().items())]
+
+
+# Blocking facade over AsyncRPCClient for the scripts. The event loop runs in a
+# background thread, so the client can be shared by worker threads and all
+# their requests are multiplexed over the same connection pool.
+class RPCClient:
+
+    def __init__(self, protocol, host, port, timeout=30, pool_size=10, pipeline_depth=4, method_timeouts=None):
+        self.client = AsyncRPCClient('{}://{}:{}'.format(protocol, host, port),
+                                     pool_size=pool_size,
+                                     pipeline_depth=pipeline_depth,
+                                     timeout=timeout,
+                                     method_timeouts=method_timeouts)
+        self.loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self.loop.run_forever)
+        thread.daemon = True
+        thread.start()
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def call(self, method, params=None):
+        return self.run(self.client.call(method, params))
+
+    def batch(self, calls):
+        return self.run(self.client.batch(calls))
+
+    def map(self, calls):
+        return self.run(self.client.map(calls))
+
+    def block_number(self):
+        return int(self.call('eth_blockNumber'), 16)
+
+    def stats(self):
+        return self.client.stats()
+
+    def format_stats(self):
+        return self.client.format_stats()
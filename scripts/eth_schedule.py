@@ -0,0 +1,74 @@
+import collections
+
+
+# Dependency graph of the deployment instructions in an instructions file.
+# Dependencies are the labels of other deployments referenced from params or
+# libraries, i.e. the same placeholders EthDeploy.replace_references resolves.
+class DeploymentGraph:
+
+    def __init__(self, instructions, get_label):
+        self.nodes = collections.OrderedDict()
+        for i in instructions:
+            if i['type'] != 'deployment':
+                continue
+            label = get_label(i)
+            if label is None:
+                raise ValueError('Deployments scheduled as a graph need a label or file')
+            if label in self.nodes:
+                raise ValueError('Duplicate deployment label {}'.format(label))
+            self.nodes[label] = i
+
+        self.dependencies = collections.OrderedDict(
+            (label, self.find_references(i)) for label, i in self.nodes.items())
+        self.levels = self.compute_levels()
+
+    def find_references(self, instruction):
+        references = []
+
+        def collect(a):
+            if isinstance(a, list):
+                for i in a:
+                    collect(i)
+            elif isinstance(a, str) and a in self.nodes and a not in references:
+                references.append(a)
+
+        collect(list(instruction.get('params', ())))
+        collect(list(instruction.get('libraries', {}).values()))
+        return references
+
+    def compute_levels(self):
+        # Level of a node is the length of the longest dependency chain below it
+        levels = {}
+        visiting = set()
+
+        def visit(label):
+            if label in levels:
+                return levels[label]
+            if label in visiting:
+                raise ValueError('Circular reference involving {}'.format(label))
+            visiting.add(label)
+            levels[label] = 1 + max([visit(d) for d in self.dependencies[label]] or [-1])
+            visiting.remove(label)
+            return levels[label]
+
+        for label in self.nodes:
+            visit(label)
+        return levels
+
+    def rounds(self):
+        # Nodes of a round only depend on nodes of earlier rounds
+        rounds = [[] for _ in range(max(self.levels.values()) + 1)] if self.levels else []
+        for label in self.nodes:
+            rounds[self.levels[label]].append(label)
+        return rounds
+
+    def critical_path(self):
+        # Walk back from the deepest node through its deepest dependency
+        if not self.levels:
+            return []
+        label = max(self.nodes, key=lambda l: self.levels[l])
+        path = [label]
+        while self.dependencies[label]:
+            label = max(self.dependencies[label], key=lambda l: self.levels[l])
+            path.append(label)
+        return list(reversed(path))
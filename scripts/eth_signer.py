@@ -0,0 +1,160 @@
+from ethereum.transactions import Transaction
+from ethereum.utils import decode_hex, encode_hex, normalize_key, privtoaddr
+from eth_rpc import RPCClient, RPCTransportError
+from concurrent.futures import ThreadPoolExecutor
+import click
+import collections
+import json
+import logging
+import rlp
+import time
+
+# create logger
+logger = logging.getLogger('SIGNER')
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# Errors meaning the node already has this exact transaction
+KNOWN_TRANSACTION_ERRORS = ('already known', 'known transaction', 'already imported')
+
+
+def strip_0x(string):
+    if string.startswith('0x'):
+        return string[2:]
+    return string
+
+
+# Signs transactions offline. A batch gets sequential nonces and can be written
+# to a file of raw transactions to be broadcast later.
+class TransactionSigner:
+
+    def __init__(self, private_key, network_id=None):
+        self.key = normalize_key(private_key)
+        self.address = '0x' + encode_hex(privtoaddr(self.key))
+        self.network_id = network_id
+
+    def sign(self, tx, nonce):
+        # tx uses the same fields as web3 transactions: to, value, data, gas, gasPrice
+        to = decode_hex(strip_0x(tx['to'])) if tx.get('to') else b''
+        transaction = Transaction(nonce,
+                                  tx['gasPrice'],
+                                  tx['gas'],
+                                  to,
+                                  tx.get('value', 0),
+                                  decode_hex(strip_0x(tx.get('data', ''))))
+        transaction.sign(self.key, self.network_id)
+        return {'nonce': nonce,
+                'hash': '0x' + encode_hex(transaction.hash),
+                'raw': '0x' + encode_hex(rlp.encode(transaction)),
+                'from': self.address,
+                'to': tx.get('to'),
+                'value': tx.get('value', 0),
+                'data': '0x' + strip_0x(tx.get('data', '')),
+                'gas': tx['gas'],
+                'gasPrice': tx['gasPrice'],
+                'label': tx.get('label')}
+
+    def sign_batch(self, txs, start_nonce):
+        return [self.sign(tx, start_nonce + i) for i, tx in enumerate(txs)]
+
+    @staticmethod
+    def write(signed, path):
+        # One signed transaction per line, in nonce order
+        with open(path, 'w') as signed_file:
+            for tx in signed:
+                signed_file.write(json.dumps(tx) + '\n')
+
+    @staticmethod
+    def read(path):
+        with open(path, 'r') as signed_file:
+            for line in signed_file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+# Streams signed transactions to the node concurrently. Sends are idempotent: a
+# node that already knows a transaction counts as success, so a file can simply
+# be broadcast again after a failure. Only transport failures are retried, an
+# error from the node is raised.
+class Broadcaster:
+
+    def __init__(self, rpc, workers=8, max_retries=5, retry_delay=1):
+        self.rpc = rpc
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def is_mined_or_pending(self, transaction_hash):
+        return self.rpc.call('eth_getTransactionByHash', [transaction_hash]) is not None
+
+    def send(self, signed, retries=None):
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                return self.rpc.call('eth_sendRawTransaction', [signed['raw']])
+            except (RPCTransportError, OSError) as e:
+                if attempt == retries:
+                    raise
+                logger.info('Sending {} failed with error {}, retrying'.format(signed['hash'], e))
+            except ValueError as e:
+                message = str(e).lower()
+                if any(error in message for error in KNOWN_TRANSACTION_ERRORS):
+                    return signed['hash']
+                # The nonce is used, either by this very transaction or by another one
+                if 'nonce too low' in message and self.is_mined_or_pending(signed['hash']):
+                    return signed['hash']
+                raise
+            time.sleep(self.retry_delay * (attempt + 1))
+
+    def broadcast(self, signed_transactions):
+        # Keeps at most two sends per worker in flight so nonce gaps seen by the
+        # node stay small, which keeps transactions out of the future queue limits
+        in_flight = collections.deque()
+        sent, failed = [], []
+        started = time.time()
+
+        def collect(signed, future):
+            try:
+                sent.append((signed, future.result()))
+            except (ValueError, OSError) as e:
+                logger.info('Transaction {} with nonce {} failed: {}'.format(signed['hash'], signed['nonce'], e))
+                failed.append((signed, str(e)))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for signed in signed_transactions:
+                in_flight.append((signed, executor.submit(self.send, signed)))
+                while len(in_flight) >= self.workers * 2:
+                    collect(*in_flight.popleft())
+            while in_flight:
+                collect(*in_flight.popleft())
+
+        elapsed = time.time() - started
+        logger.info('Broadcast {} transactions in {:.2f}s ({:.0f} tx/s), {} failed'.format(
+            len(sent), elapsed, len(sent) / elapsed if elapsed else 0, len(failed)))
+        return sent, failed
+
+    def broadcast_file(self, path):
+        return self.broadcast(TransactionSigner.read(path))
+
+
+@click.command()
+@click.option('--f', help='File with signed transactions')
+@click.option('--protocol', default="http", help='Ethereum node protocol')
+@click.option('--host', default="localhost", help='Ethereum node host')
+@click.option('--port', default='8545', help='Ethereum node port')
+@click.option('--workers', default=8, help='Concurrent sends')
+def setup(f, protocol, host, port, workers):
+    broadcaster = Broadcaster(RPCClient(protocol, host, port, pool_size=workers), workers=workers)
+    sent, failed = broadcaster.broadcast_file(f)
+    for signed, transaction_hash in sent:
+        logger.info('{} nonce {} | Transaction hash: {}'.format(signed.get('label') or '', signed['nonce'],
+                                                                transaction_hash))
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    setup()
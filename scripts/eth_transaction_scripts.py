@@ -1,11 +1,20 @@
-from web3 import Web3, KeepAliveRPCProvider, IPCProvider
-from ethereum.abi import ContractTranslator
 from ethereum.transactions import Transaction
-from ethereum.utils import privtoaddr
+from ethereum.abi import encode_abi
 from ethereum.tools import _solidity
+from eth_batch import ContractBatch
+from eth_fees import FeeEngine, parse_auto
+from eth_indexer import EventIndexer, deployment_block
+from eth_nonce import NonceManager
+from eth_pending import PendingTransactions, tx_from_rpc
+from eth_receipts import format_receipt
+from eth_registration import RegistrationChecker, RegistrationIndex, RegistrationSubmitter, RegistrationSync, \
+    read_addresses, is_valid_address
+from eth_registry import ArtifactRegistry
+from eth_rpc import RPCClient, format_transaction
+from eth_signer import Broadcaster, TransactionSigner
+from eth_view_cache import ViewCache, classes_for
 import click
 import time
-import json
 import rlp
 import logging
 import os
@@ -22,21 +31,33 @@ logger.addHandler(ch)
 
 class Transactions_Handler:
 
-    def __init__(self, protocol, host, port, gas, gas_price, contract_addr, account, private_key_path):
-        # Establish rpc connection
-        self.web3 = Web3(KeepAliveRPCProvider(host=host, port=port))
+    def __init__(self, protocol, host, port, gas, gas_price, contract_addr, account, private_key_path, network_id=None):
         self.solidity = _solidity.solc_wrapper()
         self._from = None
         self.private_key = None
+        self.signer = None
         self.abi = None
         self.contract_addr = contract_addr
 
-        fn = os.path.join(os.path.dirname(__file__), 'deployed_abis.json')
-        with open(fn, 'r') as instructions_file:
-            instructions = json.load(instructions_file)
-            self.abi = instructions[self.contract_addr]
-
-        self.contract = self.web3.eth.contract(address=self.contract_addr, abi=self.abi)
+        # Establish rpc connection. Reads, transactions and receipt polling share
+        # one pooled JSON-RPC client
+        self.rpc = RPCClient(protocol, host, port, pool_size=16)
+
+        # Only the ABI of this contract is read from the registry, in the
+        # section of the network the node is on
+        self.registry = ArtifactRegistry.for_node(self.rpc)
+        self.abi = self.registry.abi(self.contract_addr)
+        self.contract_batch = ContractBatch(self.rpc, self.contract_addr, self.abi)
+        self.codec = self.contract_batch.codec
+        self.broadcaster = Broadcaster(self.rpc)
+
+        # View calls go through a cache that keeps constant and constructor set
+        # fields across runs and block dependent fields per block. Fields are
+        # classified from the source of the contract whose ABI this is
+        self.view_cache = ViewCache(self.contract_batch,
+                                    classes_for(self.abi),
+                                    path=os.path.join(os.path.dirname(__file__),
+                                                      'view_cache_{}.json'.format(self.contract_addr.lower())))
         
         # Set sending account
         if account:
@@ -44,9 +65,11 @@ class Transactions_Handler:
         elif private_key_path:
             with open(private_key_path, 'r') as private_key_file:
                 self.private_key = private_key_file.read().strip()
-            self._from = self.add_0x(privtoaddr(self.private_key.decode('hex')).encode('hex'))
+            # Transactions are signed for network_id (EIP-155) when it is given
+            self.signer = TransactionSigner(self.private_key, network_id)
+            self._from = self.signer.address
         else:
-            accounts = self.web3.eth.accounts
+            accounts = self.rpc.call('eth_accounts')
             if len(accounts) == 0:
                 raise ValueError('No account unlocked')
             self._from = self.add_0x(accounts[0])
@@ -55,8 +78,21 @@ class Transactions_Handler:
         if not self.is_address(self._from):
             raise ValueError('Account address is wrong')
 
-        self.gas = gas
-        self.gas_price = gas_price
+        # Gas and gas price are estimated per transaction unless given
+        self.fee_engine = FeeEngine(self.rpc, gas=gas, gas_price=gas_price)
+
+        self.nonce_manager = NonceManager(self.rpc, self._from)
+
+        # Every sent transaction is journaled, transactions not mined within
+        # three minutes are sent again or replaced at a higher price
+        self.pending = PendingTransactions(os.path.join(os.path.dirname(__file__),
+                                                        'pending_{}.json'.format(self._from.lower())),
+                                           self.rpc,
+                                           self.fee_engine,
+                                           # Resends run with the journal locked, a failed
+                                           # one is tried again by a later poll
+                                           lambda tx: self.submit(tx, retries=0),
+                                           ceiling=self.purchase_ceiling)
 
         # Total consumed gas
         self.total_gas = 0
@@ -64,7 +100,7 @@ class Transactions_Handler:
 
         self.log('Instructions are sent from address: {}'.format(self._from))
 
-        balance = self.web3.eth.getBalance(self._from)
+        balance = self.get_balance(self._from)
 
         self.log('Address balance: {} Ether / {} Wei'.format(balance/10**18, balance))
 
@@ -95,99 +131,253 @@ class Transactions_Handler:
         return self.add_0x(string) if self.is_address(string) else string
     
     def encode_parameters(self, typesArray, parameters):
-        return self.web3.eth.abi.encodeParameters(typesArray, parameters)
+        return '0x' + encode_abi(typesArray, parameters).hex()
     
     def get_code(self):
-        if contract_addr:
-          return self.web3.eth.getCode(self.contract_addr)
-        else:
-          default_address = list(self.abis.keys())[0]
-          return self.web3.eth.getCode(self.abis[default_address]) if default_address else None
+        return self.rpc.call('eth_getCode', [self.contract_addr, 'latest'])
+
+    def get_balance(self, address):
+        return int(self.rpc.call('eth_getBalance', [self.add_0x(address), 'latest']), 16)
     
+    def view(self, function_name, *args):
+        return self.view_cache.call([(function_name, args)], _from=self._from)[0]
+
+    def gas_price_ceiling(self):
+        # claimTokens rejects gas prices above gasLimitInWei until the second cap period ends
+        if self.rpc.block_number() < self.view('secondCapEndingBlock'):
+            return self.view('gasLimitInWei')
+        return None
+
+    def transact_params(self, function_name, *args, value=0):
+        tx = {'from': self._from,
+              'to': self.contract_addr,
+              'value': value,
+              'data': '0x' + self.codec.encode_function_call(function_name, list(args)).hex()}
+        ceiling = self.gas_price_ceiling() if function_name == 'claimTokens' else None
+        tx['gas'] = self.fee_engine.estimate_gas(tx)
+        tx['gasPrice'] = self.fee_engine.gas_price(ceiling=ceiling)
+        return tx
+
+    def purchase_ceiling(self, tx):
+        # Purchases are plain transfers of value or claimTokens calls to the token
+        if (tx.get('to') or '').lower() == self.contract_addr.lower() and tx.get('value'):
+            return self.gas_price_ceiling()
+        return None
+
+    def transact(self, function_name, *args, value=0):
+        # Nonces come from the nonce manager, so transactions sent here never
+        # collide with bulk or replacement transactions of the same account
+        tx = self.transact_params(function_name, *args, value=value)
+        tx['nonce'] = self.nonce_manager.next()
+        try:
+            transaction_hash = self.submit(tx)
+        except Exception:
+            # The nonce was never used, later transactions would wait on the gap
+            self.nonce_manager.reset()
+            raise
+        self.pending.track(transaction_hash, tx, label=function_name)
+        self.pending.save()
+        return transaction_hash
+
+    def submit(self, tx, retries=None):
+        # Sends tx with the nonce it already has
+        if self.signer:
+            return self.broadcaster.send(self.signer.sign(tx, tx['nonce']), retries)
+        return self.rpc.call('eth_sendTransaction', [format_transaction(tx)])
+
+    def check_pending_transactions(self):
+        # Polls every journaled transaction, sending again or replacing stuck ones
+        self.pending.poll()
+        for status, count in sorted(self.pending.summary().items()):
+            self.log('{} transactions {}'.format(count, status))
+
+    def replace_transaction(self, transaction_hash):
+        # Resends a pending transaction with the same nonce at a higher gas price
+        transaction = self.rpc.call('eth_getTransactionByHash', [transaction_hash])
+        if transaction is None:
+            raise ValueError('Transaction {} is unknown to the node'.format(transaction_hash))
+        if transaction['blockNumber'] is not None:
+            self.log('Transaction {} is already mined'.format(transaction_hash))
+            return transaction_hash
+        if transaction_hash not in self.pending.entries:
+            self.pending.track(transaction_hash, tx_from_rpc(transaction))
+        tx = self.fee_engine.replacement(transaction, self.purchase_ceiling(tx_from_rpc(transaction)))
+        replacement_hash = self.submit(tx)
+        self.pending.entries[transaction_hash]['replacedBy'] = replacement_hash
+        self.pending.track(replacement_hash, tx, label=self.pending.entries[transaction_hash]['label'])
+        self.pending.save()
+        self.log('Transaction {} replaced with nonce {} at gas price {}. Transaction hash: {}'.format(
+            transaction_hash, tx['nonce'], tx['gasPrice'], replacement_hash))
+        return replacement_hash
+
+    def get_cache_stats(self):
+        for line in self.view_cache.format_stats():
+            self.log('View cache {}'.format(line))
+
     def get_owner(self):
-        owner = self.contract.call({ 'from': self._from }).owner()
+        owner = self.view('owner')
         self.log('Contract owner: {}'.format(owner))
 
     def get_start_block(self):
-        start_block = self.contract.call({ 'from': self._from }).startBlock()
+        start_block = self.view('startBlock')
         self.log('Start block: {}'.format(start_block))
       
     def get_end_block(self):
-        end_block = self.contract.call({ 'from': self._from }).endBlock()
+        end_block = self.view('endBlock')
         self.log('End block: {}'.format(end_block))
 
     def get_assigned_supply(self):
-        assigned_supply = self.contract.call({ 'from': self._from }).assignedSupply() / 10**18
+        assigned_supply = self.view('assignedSupply') / 10**18
         self.log('Assigned supply (adjusted for token unit): {}'.format(assigned_supply))
     
     def get_total_supply(self):
-        total_supply = self.contract.call({ 'from': self._from }).totalSupply()
+        total_supply = self.view('totalSupply')
         self.log('Total supply: {}'.format(total_supply))
 
     def get_gmt_balance_of(self, address):
-        balance = self.contract.call({ 'from': self._from }).balanceOf(address) / 10**18
+        balance = self.view('balanceOf', address) / 10**18
         self.log('Address: {} | Balance: {}'.format(address, balance))
 
+    def event_indexer(self, db_path=None):
+        # Brings the local event store up to date, later queries need no RPC calls
+        db_path = db_path or os.path.join(os.path.dirname(__file__), 'events_{}.db'.format(self.contract_addr.lower()))
+        indexer = EventIndexer(self.rpc, self.contract_addr, self.abi, db_path,
+                               start_block=deployment_block(self.registry, self.contract_addr))
+        indexer.sync()
+        return indexer
+
+    def get_holders(self, limit=None):
+        for address, balance in self.event_indexer().holders(limit):
+            self.log('Address: {} | Balance: {}'.format(address, balance / 10**18))
+
     def get_eth_balance_of(self, address):
-        balance = self.web3.eth.getBalance(self._from)
+        balance = self.get_balance(address)
         self.log("Balance for address {} is {} Ether / {} Wei".format(address, balance/10**18, balance))
     
     def change_owner(self, address):
-        change_owner_hash = self.contract.transact({ 'from': self._from }).changeOwner(address)
+        change_owner_hash = self.transact('changeOwner', address)
         self.log("Owner for contract changed from {} to {}".format(self._from, address))
         self.log("Transaction hash: {}".format(change_owner_hash))
 
     def change_registration_status(self, address, status):
-        change_registration_status_transaction_hash = self.contract.transact({ 'from': self._from }).changeRegistrationStatus(address, status)
+        change_registration_status_transaction_hash = self.transact('changeRegistrationStatus', address, status)
         self.log("Transaction hash: {}".format(change_registration_status_transaction_hash))
     
     def change_registration_statuses(self, addressesArray, status):
-        change_registration_status_transaction_hash = self.contract.transact({ 'from': self._from }).changeRegistrationStatuses(addressesArray, status)
+        change_registration_status_transaction_hash = self.transact('changeRegistrationStatuses', addressesArray, status)
         self.log("chaging registration status")
         self.log("Transaction hash: {}".format(change_registration_status_transaction_hash))
 
+    def registration_submitter(self, gas_budget=None):
+        return RegistrationSubmitter(self.rpc,
+                                     self.codec,
+                                     self.contract_addr,
+                                     self._from,
+                                     self.nonce_manager,
+                                     self.pending,
+                                     self.fee_engine.gas_price(),
+                                     gas_budget=gas_budget,
+                                     signer=self.signer,
+                                     broadcaster=self.broadcaster)
+
+    def change_registration_statuses_bulk(self, addresses, status, gas_budget=None):
+        # Splits the addresses into transactions that fit gas_budget (half the
+        # block gas limit by default) and sends them concurrently
+        receipts = self.registration_submitter(gas_budget).submit(addresses, status)
+        for receipt in receipts:
+            self.total_gas += receipt['gasUsed']
+        return receipts
+
+    def change_registration_statuses_from_file(self, path, status, gas_budget=None):
+        addresses = []
+        for address in read_addresses(path):
+            if is_valid_address(address):
+                addresses.append(self.add_0x(address))
+            else:
+                self.log('Skipping invalid address {}'.format(address))
+        return self.change_registration_statuses_bulk(addresses, status, gas_budget)
+
+    def sync_registration_statuses_from_file(self, path, status, index_path=None, verify=False, gas_budget=None):
+        # Only addresses whose on-chain status differs from the desired one are sent.
+        # The local index remembers known statuses between runs, pass verify=True
+        # to re-read every address from the chain
+        index_path = index_path or os.path.join(os.path.dirname(__file__),
+                                                'registration_state_{}.json'.format(self.contract_addr.lower()))
+        sync = RegistrationSync(RegistrationChecker(self.contract_batch),
+                                self.registration_submitter(gas_budget),
+                                RegistrationIndex(index_path, self.contract_addr))
+        receipts = sync.sync(read_addresses(path), status, self.rpc.block_number(), verify)
+        for receipt in receipts:
+            self.total_gas += receipt['gasUsed']
+        return receipts
+
+    def sign_transactions(self, calls, output_path, start_nonce=None):
+        # Signs contract calls, e.g. [('changeRegistrationStatuses', [addresses, True]), ('finalize', [])],
+        # with sequential nonces and writes them to output_path for broadcast_signed_transactions
+        if not self.signer:
+            raise ValueError('Signing transactions requires --private-key-path')
+        gas_price = self.fee_engine.gas_price()
+        txs = [{'from': self._from,
+                'to': self.contract_addr,
+                'data': '0x' + self.codec.encode_function_call(function_name, args).hex(),
+                'gasPrice': gas_price,
+                'label': function_name} for function_name, args in calls]
+        for tx in txs:
+            tx['gas'] = self.fee_engine.estimate_gas(tx)
+        start_nonce = self.nonce_manager.next() if start_nonce is None else start_nonce
+        signed = self.signer.sign_batch(txs, start_nonce)
+        TransactionSigner.write(signed, output_path)
+        self.log('{} signed transactions with nonces {} to {} written to {}'.format(
+            len(signed), start_nonce, start_nonce + len(signed) - 1, output_path))
+        return signed
+
+    def broadcast_signed_transactions(self, path):
+        sent, failed = self.broadcaster.broadcast_file(path)
+        for signed, transaction_hash in sent:
+            self.pending.track_signed(signed, transaction_hash)
+            self.log('{} nonce {} | Transaction hash: {}'.format(signed['label'], signed['nonce'], transaction_hash))
+        self.pending.save()
+        return sent, failed
+
     def is_registered(self, address):
-        registered = self.contract.call({ 'from': self._from }).registered(address)
+        registered = self.view('registered', address)
         self.log('Is {} Registered: {}'.format(address, registered))
 
-    def is_registered_from_file(self):
-        fn = os.path.join(os.path.dirname(__file__), 'accepted_10232017_1105/accepted_128.json')
-        with open(fn, 'r') as instructions_file:
-            addresses = json.load(instructions_file)
-
-        for x in addresses:
-            self.log("Address {} is registered: {}".format(x, self.contract.call({ 'from': self._from }).registered(x)))
+    def is_registered_from_file(self, path, output_path=None, batch_size=100, workers=8):
+        # Writes address,status rows (registered / not registered / invalid) to output_path
+        checker = RegistrationChecker(self.contract_batch, batch_size=batch_size, workers=workers)
+        return checker.check_file(path, output_path or '{}.registered.csv'.format(path), self.rpc.block_number())
 
     def check_valid_address(self, addresses):
         for x in addresses:
-            self.log("Address {} is address {}".format(x, self.web3.isAddress(x)))
+            self.log("Address {} is address {}".format(x, is_valid_address(x)))
 
 
     def restart_sale(self):
-        restart_sale_transaction_hash = self.contract.transact({ 'from': self._from }).restartSale()
+        restart_sale_transaction_hash = self.transact('restartSale')
         self.log("""
                     Sale restarted. Transaction in progress. 
                     Transaction hash: {}""".format(restart_sale_transaction_hash))
       
     def stop_sale(self):
-        stop_sale_transaction_hash = self.contract.transact({ 'from': self._from }).stopSale()
+        stop_sale_transaction_hash = self.transact('stopSale')
         self.log("""
                     Sale stopped. Transaction in progress. 
                     Transaction hash: {}""".format(stop_sale_transaction_hash))
 
     def is_stopped(self):
-        is_stopped = self.contract.call({ 'from': self._from }).isStopped()
+        is_stopped = self.view('isStopped')
         self.log("""
                     Sale stopped: {}""".format(is_stopped))
 
     def is_finalized(self):
-        is_finalized = self.contract.call({ 'from': self._from }).isFinalized()
+        is_finalized = self.view('isFinalized')
         self.log("""
                     Sale finalized: {}""".format(is_finalized))
 
     def claim_tokens(self, value):
-        claim_tokens_transaction_hash = self.contract.transact({ 'from': self._from, 'value': value }).claimTokens()
-        balance = self.contract.call({ 'from': self._from }).balanceOf(self._from) / 10**18
+        claim_tokens_transaction_hash = self.transact('claimTokens', value=value)
+        balance = self.view('balanceOf', self._from) / 10**18
         self.log("""
                     Created tokens for {}. Transaction in progress. 
                     Transaction hash: {}
@@ -197,27 +387,43 @@ class Transactions_Handler:
                     balance))
     
     def finalize(self):
-        finalize_transaction_hash = self.contract.transact({ 'from': self._from }).finalize()
+        finalize_transaction_hash = self.transact('finalize')
         self.log("""
                     Sale finalized. Transaction in progress. 
                     Transaction hash: {}""".format(finalize_transaction_hash))
     
     def get_metadata(self):
-        name = self.contract.call({ 'from': self._from }).name()
-        symbol = self.contract.call({ 'from': self._from }).symbol()
-        decimals = self.contract.call({ 'from': self._from }).decimals()
-        owner = self.contract.call({ 'from': self._from }).owner()
-        start_block = self.contract.call({ 'from': self._from }).startBlock()
-        end_block = self.contract.call({ 'from': self._from }).endBlock()
-        assigned_supply = self.contract.call({ 'from': self._from }).assignedSupply()
-        total_supply = self.contract.call({ 'from': self._from }).totalSupply()
-        gmt_fund_address = self.contract.call({ 'from': self._from }).gmtFundAddress()
-        eth_fund_address = self.contract.call({ 'from': self._from }).ethFundAddress()
-        exchange_rate = self.contract.call({ 'from': self._from }).tokenExchangeRate()
-        baseTokenCapPerAddress = self.contract.call({ 'from': self._from }).baseTokenCapPerAddress()
+        # Read every field in one batch request pinned to the current block,
+        # so the snapshot is consistent
+        block_number = self.rpc.block_number()
+        (name,
+         symbol,
+         decimals,
+         owner,
+         start_block,
+         end_block,
+         assigned_supply,
+         total_supply,
+         gmt_fund_address,
+         eth_fund_address,
+         exchange_rate,
+         baseTokenCapPerAddress) = self.view_cache.call([
+            ('name', ()),
+            ('symbol', ()),
+            ('decimals', ()),
+            ('owner', ()),
+            ('startBlock', ()),
+            ('endBlock', ()),
+            ('assignedSupply', ()),
+            ('totalSupply', ()),
+            ('gmtFundAddress', ()),
+            ('ethFundAddress', ()),
+            ('tokenExchangeRate', ()),
+            ('baseTokenCapPerAddress', ())], _from=self._from, block=block_number)
 
         log_output = """
                           METADATA::
+                          Block number: {}
                           Name: {}
                           Symbol: {}
                           Decimals: {}
@@ -230,6 +436,7 @@ class Transactions_Handler:
                           ETH fund address: {} 
                           Exchange rate: {}
                           Base token cap per address: {}""".format(
+                          block_number,
                           name,
                           symbol,
                           decimals,
@@ -273,12 +480,16 @@ class Transactions_Handler:
         self.log(log_output)
 
     def get_transaction_receipt(self, transaction_hash):
-        receipt = self.web3.eth.getTransactionReceipt(transaction_hash)
+        receipt = self.rpc.call('eth_getTransactionReceipt', [transaction_hash])
+        receipt = format_receipt(receipt) if receipt else None
         self.log("Transaction Receipt: {}".format(receipt))
         return receipt
     
     def estimate_gas(self):
-        gas_estimate = self.contract.estimateGas().changeRegistrationStatuses(['TBU'], True)
+        tx = {'from': self._from,
+              'to': self.contract_addr,
+              'data': '0x' + self.codec.encode_function_call('changeRegistrationStatuses', [['TBU'], True]).hex()}
+        gas_estimate = int(self.rpc.call('eth_estimateGas', [FeeEngine.format_tx(tx)]), 16)
         self.log("Gas estimate: {}".format(gas_estimate))
         return gas_estimate
 
@@ -289,7 +500,7 @@ class Transactions_Handler:
             return self.references[a] if isinstance(a, str) and a in self.references else a
 
     def get_nonce(self):
-        transaction_count = self.web3.eth.getTransactionCount(self._from)
+        transaction_count = int(self.rpc.call('eth_getTransactionCount', [self._from, 'latest']), 16)
         self.log("Nonce: {}".format(transaction_count))
         return transaction_count
 
@@ -298,14 +509,21 @@ class Transactions_Handler:
 @click.option('--protocol', default="http", help='Ethereum node protocol')
 @click.option('--host', default="localhost", help='Ethereum node host')
 @click.option('--port', default='8545', help='Ethereum node port')
-@click.option('--gas', default=4000000, help='Transaction gas')
-@click.option('--gas-price', default=41000000000, help='Transaction gas price')
+@click.option('--gas', default='auto', help='Transaction gas, estimated per transaction by default')
+@click.option('--gas-price', default='auto', help='Transaction gas price, sampled from recent blocks by default')
 @click.option('--contract-addr', help='Address of contract to interact with')
 @click.option('--account', help='Default account used as from parameter')
 @click.option('--private-key-path', help='Path to private key')
-def setup(protocol, host, port, gas, gas_price, contract_addr, account, private_key_path):
-    transactions_handler = Transactions_Handler(protocol, host, port, gas, gas_price, contract_addr, account, private_key_path)
+@click.option('--network-id', type=int, help='Chain id signed into transactions (EIP-155)')
+@click.option('--registration-file', help='File of addresses whose registration status is changed in gas-sized chunks')
+@click.option('--register/--unregister', default=True, help='Registration status set for --registration-file')
+@click.option('--gas-budget', type=int, help='Gas per registration transaction, half the block gas limit by default')
+def setup(protocol, host, port, gas, gas_price, contract_addr, account, private_key_path, network_id,
+          registration_file, register, gas_budget):
+    transactions_handler = Transactions_Handler(protocol, host, port, parse_auto(gas), parse_auto(gas_price), contract_addr, account, private_key_path,
+                                                network_id)
     # transactions_handler.get_metadata()
+    # transactions_handler.get_cache_stats()
     # transactions_handler.restart_sale()
     # transactions_handler.stop_sale()
     # transactions_handler.is_stopped()
@@ -313,6 +531,7 @@ def setup(protocol, host, port, gas, gas_price, contract_addr, account, private_
     # transactions_handler.get_assigned_supply()
     # transactions_handler.change_owner('NEW ADDRESS')
     # transactions_handler.get_transaction_receipt('TRANSACTION_HASH')
+    # transactions_handler.replace_transaction('TRANSACTION_HASH')
     # transactions_handler.get_nonce()
     # transactions_handler.estimate_gas()
     # transactions_handler.is_registered("")
@@ -321,12 +540,19 @@ def setup(protocol, host, port, gas, gas_price, contract_addr, account, private_
 
     # transactions_handler.change_owner("")
     # transactions_handler.get_owner()
-    # transactions_handler.is_registered_from_file()
+    # transactions_handler.is_registered_from_file(os.path.join(os.path.dirname(__file__), 'accepted_10232017_1105/accepted_128.json'))
     # transactions_handler.check_valid_address(addresses_1)
-    transactions_handler.change_registration_statuses(addresses_1, True)
+    if registration_file:
+        transactions_handler.change_registration_statuses_from_file(registration_file, register, gas_budget)
+    else:
+        transactions_handler.change_registration_statuses(addresses_1, True)
+    # transactions_handler.sync_registration_statuses_from_file('ACCEPTED_ADDRESSES_FILE', True)
     # transactions_handler.claim_tokens(1100000000000000000)
     # transactions_handler.get_gmt_balance_of("")
+    # transactions_handler.get_holders()
     # transactions_handler.finalize()
+    # transactions_handler.sign_transactions([('changeRegistrationStatuses', [addresses_1, True])], 'signed.jsonl')
+    # transactions_handler.broadcast_signed_transactions('signed.jsonl')
 
 if __name__ == '__main__':
   setup()
@@ -0,0 +1,222 @@
+from ethereum.utils import encode_hex, sha3
+import collections
+import glob
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+CONSTANT = 'constant'
+IMMUTABLE = 'immutable'
+BLOCK = 'block'
+
+COMMENT_RE = re.compile(r'//[^\n]*|/\*.*?\*/', re.S)
+CONTRACT_RE = re.compile(r'\b(?:contract|library)\s+(\w+)')
+STATE_VAR_RE = re.compile(r'^\s*(?:mapping\s*\(.*?\)|[\w\[\]]+)\s+((?:\w+\s+)*?)(\w+)\s*(?:=[^;]*)?;', re.M)
+
+
+def strip_bodies(source, names):
+    # Removes the bodies of the given functions, i.e. the constructors
+    for name in names:
+        match = re.search(r'\b(?:function\s+{}|constructor)\s*\('.format(name), source)
+        if not match:
+            continue
+        start = source.index('{', match.end())
+        depth = 0
+        for end in range(start, len(source)):
+            depth += {'{': 1, '}': -1}.get(source[end], 0)
+            if depth == 0:
+                source = source[:start] + source[end + 1:]
+                break
+    return source
+
+
+def classify(abi, source=None):
+    # Maps every view function of the ABI to CONSTANT (a constant state
+    # variable), IMMUTABLE (a public state variable only written by the
+    # constructor) or BLOCK (anything else, may change with every block).
+    # Without the source every view function is treated as BLOCK.
+    constants, immutables = set(), set()
+    if source:
+        source = COMMENT_RE.sub('', source)
+        outside_constructors = strip_bodies(source, CONTRACT_RE.findall(source))
+        for modifiers, name in STATE_VAR_RE.findall(source):
+            modifiers = modifiers.split()
+            if 'public' not in modifiers:
+                continue
+            if 'constant' in modifiers:
+                constants.add(name)
+            elif not re.search(r'(?:\+\+|--|\bdelete\s+){0}\b|\b{0}\s*(?:\[[^\]]*\]\s*)*(?:[-+*/]?=(?!=)|\+\+|--)'
+                               .format(name), outside_constructors):
+                immutables.add(name)
+
+    classes = {}
+    for description in abi:
+        if description.get('type') != 'function' or not description.get('constant'):
+            continue
+        name = description['name']
+        classes[name] = CONSTANT if name in constants else IMMUTABLE if name in immutables else BLOCK
+    return classes
+
+
+def signatures(abi):
+    # Compared instead of the ABI itself, compiler versions differ in the other fields
+    return sorted((description.get('type'), description.get('name', ''),
+                   [i['type'] for i in description.get('inputs', [])],
+                   [o['type'] for o in description.get('outputs', [])]) for description in abi)
+
+
+def source_path_for(abi):
+    # Source of the contract in this repository with the given ABI, None when it
+    # is none of them. The ABIs in abi/ are keyed by source unit; the flattened
+    # file is preferred as it holds the state variables of every base contract
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    wanted = signatures(abi)
+    for abi_path in sorted(glob.glob(os.path.join(root, 'abi', '*.json'))):
+        with open(abi_path, 'r') as abi_file:
+            units = json.load(abi_file)
+        for unit, output in sorted(units.items()):
+            if signatures(output['abi']) != wanted:
+                continue
+            source_path = unit.rsplit(':', 1)[0]
+            flattened = os.path.join(root, '{}Flattened.sol'.format(source_path[:-len('.sol')]))
+            return flattened if os.path.isfile(flattened) else os.path.join(root, source_path)
+    return None
+
+
+def classes_for(abi):
+    # View call classes of a contract, every call goes uncached when its source is unknown
+    source_path = source_path_for(abi)
+    if source_path is None:
+        return {}
+    with open(source_path, 'r') as source_file:
+        return classify(abi, source_file.read())
+
+
+# Read-through cache in front of a ContractBatch with the same call interface.
+# Constant and immutable values are kept for the lifetime of the contract (and
+# saved to path when given, so later runs start warm), block dependent values
+# are kept per block in an LRU. Raw eth_call results are cached and decoded on
+# every read, so cached values can be stored as JSON. Only results that decode
+# are cached. A saved cache is only used for the chain and contract code it was
+# written for, a chain reset can deploy other code at the same address.
+class ViewCache:
+
+    def __init__(self, contract_batch, classes, path=None, max_entries=4096, head_ttl=1):
+        self.contract_batch = contract_batch
+        self.classes = classes
+        self.path = path
+        self.max_entries = max_entries
+        # 'latest' is resolved to a block number that is reused for head_ttl seconds
+        self.head_ttl = head_ttl
+        self.head = None
+        self.head_time = 0
+        self.lock = threading.Lock()
+        self.permanent = {}
+        self.per_block = collections.OrderedDict()
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+        self.identity = None
+
+        if path:
+            self.identity = self.contract_identity()
+            if os.path.isfile(path):
+                with open(path, 'r') as cache_file:
+                    data = json.load(cache_file)
+                if data['contract'] == contract_batch.address.lower() and data.get('identity') == self.identity:
+                    self.permanent = data['values']
+
+    def contract_identity(self):
+        # Chain id and code hash of the contract the cache is kept for
+        network_id, code = self.contract_batch.rpc.batch([('net_version', []),
+                                                          ('eth_getCode', [self.contract_batch.address, 'latest'])])
+        return {'chainId': str(network_id), 'codeHash': '0x' + encode_hex(sha3(bytes.fromhex(code[2:])))}
+
+    def resolve_block(self, block):
+        if isinstance(block, int):
+            return block
+        if block != 'latest':
+            raise ValueError('Cannot cache calls at block {}'.format(block))
+        if self.head is None or time.time() - self.head_time > self.head_ttl:
+            self.head = self.contract_batch.rpc.block_number()
+            self.head_time = time.time()
+        return self.head
+
+    def key(self, function_name, args, _from, block):
+        kind = self.classes.get(function_name)
+        key = json.dumps([function_name, list(args)], default=str)
+        if kind in (CONSTANT, IMMUTABLE):
+            return kind, self.permanent, key
+        if kind == BLOCK:
+            return kind, self.per_block, json.dumps([key, _from, self.resolve_block(block)])
+        return None, None, None
+
+    def call(self, calls, _from=None, block='latest'):
+        # calls is a list of (function_name, args); results are returned in the same order
+        results = [None] * len(calls)
+        missing = []
+        if any(self.classes.get(function_name) == BLOCK for function_name, _ in calls):
+            # Cached values and the calls sent for the misses must refer to the
+            # same block, so 'latest' is resolved once for the batch. Outside
+            # the lock, a slow node must not hold up readers served from the cache
+            block = self.resolve_block(block)
+        with self.lock:
+            for i, (function_name, args) in enumerate(calls):
+                kind, store, key = self.key(function_name, args, _from, block)
+                if store is not None and key in store:
+                    if store is self.per_block:
+                        store.move_to_end(key)
+                    results[i] = store[key]
+                    self.hits[kind] += 1
+                else:
+                    missing.append((i, kind, store, key))
+                    self.misses[kind] += 1
+
+        values = {}
+        if missing:
+            fetched = self.contract_batch.rpc.batch([
+                self.contract_batch.eth_call(calls[i][0], calls[i][1], _from, block) for i, _, _, _ in missing])
+            # Decoded before anything is stored, an empty result ('0x', e.g. no
+            # code at the address yet) or one that does not decode is never cached
+            for (i, _, _, _), result in zip(missing, fetched):
+                values[i] = self.contract_batch.decode(calls[i][0], result)
+            save = False
+            with self.lock:
+                for (i, kind, store, key), result in zip(missing, fetched):
+                    if store is None or result == '0x':
+                        continue
+                    store[key] = result
+                    save = save or store is self.permanent
+                    while len(self.per_block) > self.max_entries:
+                        self.per_block.popitem(last=False)
+                if save and self.path:
+                    self.save()
+
+        return [values[i] if i in values else self.contract_batch.decode(function_name, result)
+                for i, ((function_name, _), result) in enumerate(zip(calls, results))]
+
+    def save(self):
+        # Write to a temporary file first so a crash never leaves a truncated cache
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as cache_file:
+            json.dump({'contract': self.contract_batch.address.lower(),
+                       'identity': self.identity,
+                       'values': self.permanent}, cache_file)
+        os.replace(tmp_path, self.path)
+
+    def stats(self):
+        stats = {}
+        for kind in (CONSTANT, IMMUTABLE, BLOCK, None):
+            total = self.hits[kind] + self.misses[kind]
+            if total:
+                stats[kind or 'uncached'] = {'hits': self.hits[kind],
+                                             'misses': self.misses[kind],
+                                             'hitRate': self.hits[kind] / total}
+        return stats
+
+    def format_stats(self):
+        return ['{}: {} hits / {} misses ({:.0%} hit rate)'.format(kind, s['hits'], s['misses'], s['hitRate'])
+                for kind, s in sorted(self.stats().items())]
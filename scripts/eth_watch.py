@@ -0,0 +1,146 @@
+from eth_abi_creator import EthABI
+from subprocess import CalledProcessError
+import click
+import logging
+import os
+import subprocess
+import time
+
+# Create logger
+logger = logging.getLogger('WATCH')
+logger.setLevel(logging.INFO)
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+FLATTENED_SUFFIX = 'Flattened.sol'
+
+
+# Polls the contracts directory and keeps abi/ and the flattened contracts in
+# sync with the sources. A changed file only rebuilds the contracts that import
+# it, directly or not: X.sol is flattened again into XFlattened.sol when that
+# file exists, then the ABIs of every affected contract are recompiled in one
+# solc run. Only the standard library is used, changes are found by comparing
+# modification times and sizes every interval seconds.
+class ContractWatcher:
+
+    def __init__(self, eth_abi, interval=0.2, settle=0.1, flattener='solidity_flattener'):
+        self.eth_abi = eth_abi
+        self.interval = interval
+        # Editors often write a file in several steps, changes are collected
+        # until the tree is quiet for settle seconds
+        self.settle = settle
+        self.flattener = flattener
+        self.snapshot = {}
+
+    @staticmethod
+    def log(string):
+        logger.info(string)
+
+    def scan(self):
+        files = {}
+        for file_path in self.eth_abi.source_files():
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            files[self.eth_abi.unit_name(file_path)] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def changed(self, files):
+        return set(unit for unit in set(files) | set(self.snapshot) if files.get(unit) != self.snapshot.get(unit))
+
+    def import_graph(self):
+        # Maps every unit to the units it imports, directly or not
+        remappings = self.eth_abi.remappings()
+        sources = {}
+        for unit in self.snapshot:
+            with open(self.eth_abi.unit_path(unit), 'r') as source_file:
+                sources[unit] = source_file.read()
+        return dict((unit, set(self.eth_abi.imported_units(unit, sources, remappings))) for unit in sources)
+
+    @staticmethod
+    def flattened(unit):
+        if unit.endswith(FLATTENED_SUFFIX):
+            return None
+        return unit[:-len('.sol')] + FLATTENED_SUFFIX
+
+    def flatten(self, unit):
+        target = self.flattened(unit)
+        contracts_dir = self.eth_abi.absolute_path
+        started = time.time()
+        try:
+            subprocess.run([self.flattener,
+                            '--solc-paths={}={}'.format(os.path.basename(contracts_dir), contracts_dir),
+                            '--output', self.eth_abi.unit_path(target),
+                            self.eth_abi.unit_path(unit)],
+                           check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        except (OSError, CalledProcessError) as e:
+            logger.error('Error: {} not flattened. {}'.format(unit, getattr(e, 'stderr', None) or e))
+            return None
+        self.log('Flattened {} into {} in {:.2f}s'.format(unit, target, time.time() - started))
+        return target
+
+    def rebuild(self, changed):
+        started = time.time()
+        graph = self.import_graph()
+        affected = set(unit for unit, imports in graph.items() if imports & changed)
+
+        # Flattened files are derived from their source and never edited by hand
+        for unit in sorted(affected):
+            target = self.flattened(unit)
+            if target in graph and self.flatten(unit):
+                affected.add(target)
+        # The flattened files written above are not changes to react to
+        self.snapshot = self.scan()
+
+        if affected:
+            file_paths = [self.eth_abi.unit_path(unit) for unit in sorted(affected)]
+            written = self.eth_abi.build(file_paths)
+            self.log('{} changed, {} contracts rebuilt and {} ABIs written in {:.2f}s'.format(
+                ', '.join(sorted(changed)), len(affected), written, time.time() - started))
+
+    def stale(self):
+        # Flattened files older than their source or anything it imports
+        graph = self.import_graph()
+        return set(unit for unit, imports in graph.items()
+                   if self.flattened(unit) in graph and
+                   max(self.snapshot[i][0] for i in imports) > self.snapshot[self.flattened(unit)][0])
+
+    def watch(self):
+        self.snapshot = self.scan()
+        stale = self.stale()
+        if stale:
+            self.log('Flattened contracts are out of date: {}'.format(', '.join(sorted(stale))))
+            self.rebuild(stale)
+        self.log('Watching {} contracts in {}'.format(len(self.snapshot), self.eth_abi.contract_dir))
+        while True:
+            time.sleep(self.interval)
+            changed = set()
+            files = self.scan()
+            while self.changed(files):
+                changed |= self.changed(files)
+                self.snapshot = files
+                time.sleep(self.settle)
+                files = self.scan()
+            # Deleted files have nothing left to rebuild from
+            changed &= set(files)
+            if changed:
+                self.rebuild(changed)
+
+
+@click.command()
+@click.option('--contract-dir', default="contracts", help='Path to contracts directory')
+@click.option('--abi-dir', default="abi", help='Path to abi directory')
+@click.option('--interval', default=0.2, help='Seconds between checks for changed files')
+def setup(contract_dir, abi_dir, interval):
+    watcher = ContractWatcher(EthABI(None, contract_dir, abi_dir), interval=interval)
+    try:
+        watcher.watch()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    setup()
@@ -2,25 +2,49 @@
 from unittest import TestCase
 import os
 import string
+import sys
 # ethereum package
 from ethereum.tools import tester
 from ethereum.tools.tester import keys, accounts, TransactionFailed, ABIContract
 import ethereum.utils as utils
-from ethereum.tools import _solidity
 from ethereum.state import State
-from ethereum.abi import ContractTranslator
 
 OWN_DIR = os.path.dirname(os.path.realpath(__file__))
 
+# Share the compilation cache used by the deployment and ABI scripts
+sys.path.insert(0, os.path.realpath(os.path.join(OWN_DIR, '..', 'scripts')))
+from eth_codec import codec_for
+from eth_compile_cache import CompilationCache
+
+compilation_cache = CompilationCache()
+
+# Compiled contracts by path, shared by every test class in the process
+compiled_contracts = {}
+
 class AbstractTestContracts(TestCase):
+    """
+    Contracts are compiled once per process and deployed once per test class in
+    deploy_contracts. Every test then starts from a snapshot of that chain state.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(AbstractTestContracts, cls).setUpClass()
+        cls.t = tester
+        cls.c = cls.t.Chain()
+        cls.c.head_state.gas_limit = 10999999
+        cls.c.head_state.block_number = 4097900
+        cls.deploy_contracts()
+        cls.base_snapshot = cls.c.snapshot()
 
-    def __init__(self, *args, **kwargs):
-        super(AbstractTestContracts, self).__init__(*args, **kwargs)
-        self.t = tester
-        self.c = self.t.Chain()
-        self.s = self.t.Chain()
-        self.c.head_state.gas_limit = 10999999
-        self.c.head_state.block_number = 4097900
+    @classmethod
+    def deploy_contracts(cls):
+        pass
+
+    def setUp(self):
+        super(AbstractTestContracts, self).setUp()
+        # Restores balances, storage, block number and timestamp changed by the previous test
+        self.c.revert(self.base_snapshot)
 
     @staticmethod
     def is_hex(s):
@@ -35,12 +59,22 @@ class AbstractTestContracts(TestCase):
 
     def create_abi(self, path):
         path, extra_args = self.get_dirs(path)
-        abi = _solidity.compile_last_contract(path, combined='abi', extra_args=extra_args)['abi']
-        return ContractTranslator(abi)
-
-    def create_contract(self, path, args=[]):
-        contract_path = os.path.realpath(os.path.join(OWN_DIR, '..', 'contracts', path))
-        contract_code = open(contract_path).read()
-        contract = self.c.contract(contract_code, args=args, language='solidity')
-        self.s.mine()
-        return contract
\ No newline at end of file
+        abi = compilation_cache.compile_last_contract(path, combined='abi', extra_args=extra_args)['abi']
+        return codec_for(abi)
+
+    @classmethod
+    def compile_contract(cls, path):
+        if path not in compiled_contracts:
+            contract_path = os.path.realpath(os.path.join(OWN_DIR, '..', 'contracts', path))
+            contract_code = open(contract_path).read()
+            compiled = compilation_cache.combined(code=contract_code)[-1][1]
+            compiled_contracts[path] = (codec_for(compiled['abi']), compiled['bin'])
+        return compiled_contracts[path]
+
+    @classmethod
+    def create_contract(cls, path, args=[]):
+        # Same as Chain.contract, with the compiler output served from the cache
+        translator, bytecode = cls.compile_contract(path)
+        code = bytecode + (translator.encode_constructor_arguments(args) if args else b'')
+        address = cls.c.tx(to=b'', data=code)
+        return ABIContract(cls.c, translator, address)
\ No newline at end of file
@@ -0,0 +1,226 @@
+# standard libraries
+import json
+import os
+import sys
+import time
+# third party
+import click
+# ethereum package
+from ..abstract_test import AbstractTestContracts, accounts, keys
+
+OWN_DIR = os.path.dirname(os.path.realpath(__file__))
+
+DEFAULT_BASELINE = os.path.join(OWN_DIR, 'gas_baseline.json')
+
+# Large enough for changeRegistrationStatuses with 1000 addresses
+STARTGAS = 50000000
+
+
+class GasBenchmark(AbstractTestContracts):
+    """
+    Scenarios run on the tester chain, each from the snapshot taken after
+    deploy_contracts. A scenario prepares the chain state it needs and passes
+    the transaction to measure to self.measure, which records the gas it used
+    and its wall time.
+    """
+
+    @classmethod
+    def deploy_contracts(cls):
+        cls.c.head_state.gas_limit = STARTGAS * 2
+        cls.gmt_wallet_address = accounts[1]
+        cls.eth_wallet_address = accounts[2]
+        cls.startBlock = 4097906
+        cls.exchangeRate = 5000
+        cls.saleDuration = round((30*60*60*24)/18)
+        cls.endBlock = cls.startBlock + cls.saleDuration
+        cls.lockedPeriod = 6 * 30 * 60 * 60 * 24 # 180 days
+        cls.deployments = {}
+
+        gas_used = cls.c.head_state.gas_used
+        cls.gmt_token = cls.create_contract('Tokens/GMTokenFlattened.sol',
+                                           args=(cls.eth_wallet_address,
+                                                 cls.gmt_wallet_address,
+                                                 cls.startBlock,
+                                                 cls.endBlock,
+                                                 cls.exchangeRate))
+        cls.deployments['GMToken'] = cls.deployment('Tokens/GMTokenFlattened.sol', gas_used)
+
+        gas_used = cls.c.head_state.gas_used
+        cls.gmt_safe = cls.create_contract('Safe/GMTSafeFlattened.sol', args=[cls.gmt_token.address])
+        cls.deployments['GMTSafe'] = cls.deployment('Safe/GMTSafeFlattened.sol', gas_used)
+
+        cls.firstCapEndingBlock = cls.gmt_token.firstCapEndingBlock()
+        cls.secondCapEndingBlock = cls.gmt_token.secondCapEndingBlock()
+
+    @classmethod
+    def deployment(cls, path, gas_used):
+        _, bytecode = cls.compile_contract(path)
+        return {'gas': cls.c.head_state.gas_used - gas_used, 'bytes': len(bytecode)}
+
+    def setUp(self):
+        super(GasBenchmark, self).setUp()
+        self.c.head_state.gas_limit = STARTGAS * 2
+        self.result = None
+
+    def measure(self, function, *args, **kwargs):
+        gas_used = self.c.head_state.gas_used
+        started = time.time()
+        function(*args, startgas=STARTGAS, **kwargs)
+        self.result = {'gas': self.c.head_state.gas_used - gas_used, 'time': time.time() - started}
+
+    def buy(self, buyer, value):
+        self.gmt_token.changeRegistrationStatus(accounts[buyer], True)
+        self.c.head_state.set_balance(accounts[buyer], value * 2)
+        self.gmt_token.claimTokens(value=value, sender=keys[buyer])
+
+    def claim_tokens(self, block_number):
+        self.c.head_state.block_number = block_number
+        self.gmt_token.changeRegistrationStatus(accounts[3], True)
+        self.c.head_state.set_balance(accounts[3], 2 * 10**18)
+        self.measure(self.gmt_token.claimTokens, value=1 * 10**18, sender=keys[3])
+
+    def bench_claim_tokens_first_cap_period(self):
+        self.claim_tokens(self.startBlock + 10)
+
+    def bench_claim_tokens_second_cap_period(self):
+        self.claim_tokens(self.firstCapEndingBlock + 10)
+
+    def bench_claim_tokens_after_cap_periods(self):
+        self.claim_tokens(self.secondCapEndingBlock + 10)
+
+    def bench_claim_tokens_again(self):
+        # Balance and purchases of the buyer are no longer zero
+        self.c.head_state.block_number = self.startBlock + 10
+        self.buy(3, 1 * 10**18)
+        self.measure(self.gmt_token.claimTokens, value=1 * 10**18, sender=keys[3])
+
+    def bench_transfer(self):
+        self.c.head_state.block_number = self.secondCapEndingBlock + 10
+        self.buy(3, 1 * 10**18)
+        self.measure(self.gmt_token.transfer, accounts[4], 1000 * 10**18, sender=keys[3])
+
+    def bench_transfer_from(self):
+        self.c.head_state.block_number = self.secondCapEndingBlock + 10
+        self.buy(3, 1 * 10**18)
+        self.gmt_token.approve(accounts[4], 1000 * 10**18, sender=keys[3])
+        self.measure(self.gmt_token.transferFrom, accounts[3], accounts[5], 1000 * 10**18, sender=keys[4])
+
+    def change_registration_statuses(self, count):
+        targets = [(0x1000 + i).to_bytes(20, 'big') for i in range(count)]
+        self.measure(self.gmt_token.changeRegistrationStatuses, targets, True)
+
+    def bench_change_registration_statuses_10(self):
+        self.change_registration_statuses(10)
+
+    def bench_change_registration_statuses_100(self):
+        self.change_registration_statuses(100)
+
+    def bench_change_registration_statuses_1000(self):
+        self.change_registration_statuses(1000)
+
+    def bench_finalize(self):
+        # 20k Ether buys the 100M GMT min cap
+        self.c.head_state.block_number = self.secondCapEndingBlock + 10
+        self.buy(3, 20000 * 10**18)
+        self.c.head_state.block_number = self.endBlock + 1
+        self.measure(self.gmt_token.finalize)
+
+    def bench_refund(self):
+        self.c.head_state.block_number = self.secondCapEndingBlock + 10
+        self.buy(3, 1 * 10**18)
+        self.c.head_state.block_number = self.endBlock + 1
+        self.measure(self.gmt_token.refund, sender=keys[3])
+
+    def bench_safe_unlock(self):
+        self.c.head_state.block_number = self.secondCapEndingBlock + 1
+        self.buy(4, 39200 * 10**18)
+        self.c.head_state.block_number = self.endBlock + 1
+        self.gmt_token.finalize()
+        self.gmt_token.transfer(self.gmt_safe.address, 10000000 * 10**18, sender=keys[1])
+        self.c.head_state.timestamp = self.c.head_state.timestamp + self.lockedPeriod + 100
+        self.measure(self.gmt_safe.unlock, sender=keys[5])
+
+
+def run_benchmarks(names, repeat):
+    # Gas is deterministic, wall time is the fastest of repeat runs
+    GasBenchmark.setUpClass()
+    results = {}
+    for name in names:
+        runs = []
+        for _ in range(repeat):
+            benchmark = GasBenchmark(name)
+            benchmark.setUp()
+            getattr(benchmark, name)()
+            runs.append(benchmark.result)
+        results[name[len('bench_'):]] = {'gas': runs[-1]['gas'], 'time': min(run['time'] for run in runs)}
+    return {'deployments': GasBenchmark.deployments, 'scenarios': results}
+
+
+def compare(baseline, results, threshold):
+    # Returns report lines and the names of scenarios whose gas grew beyond threshold
+    lines, regressions = [], []
+    rows = [('deploy ' + name, value) for name, value in sorted(results['deployments'].items())] + \
+        sorted(results['scenarios'].items())
+    old_rows = dict([('deploy ' + name, value) for name, value in baseline.get('deployments', {}).items()] +
+                    list(baseline.get('scenarios', {}).items()))
+    lines.append('{:<40} {:>10} {:>10} {:>8} {:>10}'.format('scenario', 'gas', 'baseline', 'change', 'time'))
+    for name, value in rows:
+        old = old_rows.get(name)
+        if old is None:
+            change = 'new'
+        else:
+            ratio = (value['gas'] - old['gas']) / float(old['gas']) if old['gas'] else 0
+            change = '{:+.2%}'.format(ratio)
+            if ratio > threshold:
+                regressions.append(name)
+                change += ' !'
+        lines.append('{:<40} {:>10} {:>10} {:>8} {:>10}'.format(
+            name, value['gas'], old['gas'] if old else '-', change,
+            '{:.3f}s'.format(value['time']) if 'time' in value else '{} bytes'.format(value['bytes'])))
+    return lines, regressions
+
+
+@click.command()
+@click.option('--baseline', default=DEFAULT_BASELINE, help='Path to the baseline file')
+@click.option('--threshold', default=0.01, help='Fraction of gas growth over the baseline that fails the run')
+@click.option('--repeat', default=3, help='Runs per scenario, the fastest wall time is reported')
+@click.option('--update-baseline', '--write-baseline', 'update_baseline', is_flag=True,
+              help='Store the results as the new baseline')
+@click.argument('scenarios', nargs=-1)
+def setup(baseline, threshold, repeat, update_baseline, scenarios):
+    """
+    run benchmarks with python -m tests.benchmarks.gas_benchmark [--update-baseline] [SCENARIOS]
+    """
+    # Without a baseline there is nothing to compare against, a run that
+    # silently wrote one would pass whatever the contracts cost
+    if not update_baseline and not os.path.isfile(baseline):
+        raise click.UsageError('Baseline {} not found, create it with --write-baseline '
+                               '(make bench-baseline)'.format(baseline))
+    names = ['bench_' + name for name in scenarios] or \
+        sorted(name for name in dir(GasBenchmark) if name.startswith('bench_'))
+    results = run_benchmarks(names, repeat)
+
+    stored = {}
+    if os.path.isfile(baseline):
+        with open(baseline, 'r') as baseline_file:
+            stored = json.load(baseline_file)
+    lines, regressions = compare(stored, results, threshold)
+    print('\n'.join(lines))
+
+    if update_baseline:
+        # Wall times depend on the machine, only gas and bytecode size are kept
+        stored.setdefault('deployments', {}).update(results['deployments'])
+        stored.setdefault('scenarios', {}).update(
+            (name, {'gas': value['gas']}) for name, value in results['scenarios'].items())
+        with open(baseline, 'w') as baseline_file:
+            json.dump(stored, baseline_file, indent=4, sort_keys=True)
+        print('Baseline written to {}'.format(baseline))
+    elif regressions:
+        print('FAILED: gas grew more than {:.2%} in {}'.format(threshold, ', '.join(regressions)))
+        sys.exit(1)
+    else:
+        print('OK')
+
+
+if __name__ == '__main__':
+    setup()
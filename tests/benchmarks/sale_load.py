@@ -0,0 +1,270 @@
+# standard libraries
+import collections
+import heapq
+import json
+import random
+import time
+# third party
+import click
+# ethereum package
+from ethereum.messages import apply_transaction
+from ethereum.transactions import Transaction
+from ..abstract_test import AbstractTestContracts, accounts
+
+BLOCK_TIME = 15
+CLAIM_GAS = 200000
+REGISTRATION_CHUNK = 200
+PERIODS = ('first', 'second', 'open')
+REASONS = ('cap', 'gas price', 'supply', 'closed', 'other')
+DEFAULT_WAVES = ('first:1.0:1-10', 'second:0.5:5-40', 'open:0.5:50-5000')
+
+
+def parse_wave(spec):
+    # PERIOD:FRACTION:MIN-MAX, e.g. first:1.0:1-10 lets every buyer spend 1 to 10 Ether in the first cap period
+    period, fraction, values = spec.split(':')
+    if period not in PERIODS:
+        raise click.BadParameter('Unknown period {}, expected one of {}'.format(period, ', '.join(PERIODS)))
+    low, high = values.split('-')
+    return {'period': period, 'fraction': float(fraction), 'min': float(low), 'max': float(high)}
+
+
+class SaleSimulation(AbstractTestContracts):
+    """
+    Replays purchase waves of synthetic buyers against GMToken on the tester
+    chain. Buyers are plain addresses: transactions get their sender set
+    instead of a signature, so tens of thousands of buyers cost no key
+    generation or signature recovery. Blocks are sealed by the simulation:
+    pending purchases are ordered by gas price and a block takes them while
+    their gas limits fit the block gas limit, as a miner does.
+    """
+
+    block_gas_limit = 6700000
+
+    @classmethod
+    def deploy_contracts(cls):
+        cls.gmt_wallet_address = accounts[1]
+        cls.eth_wallet_address = accounts[2]
+        cls.startBlock = cls.c.head_state.block_number + 10
+        cls.exchangeRate = 5000
+        cls.saleDuration = round((30*60*60*24)/18)
+        cls.endBlock = cls.startBlock + cls.saleDuration
+        cls.gmt_token = cls.create_contract('Tokens/GMTokenFlattened.sol',
+                                           args=(cls.eth_wallet_address,
+                                                 cls.gmt_wallet_address,
+                                                 cls.startBlock,
+                                                 cls.endBlock,
+                                                 cls.exchangeRate))
+        cls.codec = cls.compile_contract('Tokens/GMTokenFlattened.sol')[0]
+        cls.firstCapEndingBlock = cls.gmt_token.firstCapEndingBlock()
+        cls.secondCapEndingBlock = cls.gmt_token.secondCapEndingBlock()
+        cls.baseTokenCapPerAddress = cls.gmt_token.baseTokenCapPerAddress()
+        cls.gasLimitInWei = cls.gmt_token.gasLimitInWei()
+        cls.saleSupply = cls.gmt_token.totalSupply() - cls.gmt_token.gmtFund()
+
+    def __init__(self, buyers, waves, overpriced=0.05, seed=0):
+        super(SaleSimulation, self).__init__()
+        self.state = self.c.head_state
+        self.random = random.Random(seed)
+        self.buyers = [(0x100000 + i).to_bytes(20, 'big') for i in range(buyers)]
+        self.waves = waves
+        self.overpriced = overpriced
+        self.claim_data = self.codec.encode_function_call('claimTokens', [])
+        self.nonces = collections.Counter()
+        self.purchases = collections.Counter()
+        self.assigned = 0
+        self.supply_exhausted = None
+        self.blocks = []
+        self.registration = {}
+
+    def send(self, sender, value, data, gas, gas_price):
+        # Returns (success, gas used), the sender is set instead of signing
+        transaction = Transaction(self.nonces[sender] or self.state.get_nonce(sender), gas_price, gas,
+                                  self.gmt_token.address, value, data)
+        transaction.sender = sender
+        gas_used = self.state.gas_used
+        success, _ = apply_transaction(self.state, transaction)
+        self.nonces[sender] = transaction.nonce + 1
+        return success, self.state.gas_used - gas_used
+
+    def seal_block(self):
+        self.state.block_number += 1
+        self.state.timestamp += BLOCK_TIME
+        self.state.gas_used = 0
+
+    def register_buyers(self):
+        # Registration happens before the sale and is not limited by the block gas limit
+        self.state.gas_limit = 10**12
+        started, transactions, gas = time.time(), 0, 0
+        for i in range(0, len(self.buyers), REGISTRATION_CHUNK):
+            data = self.codec.encode_function_call(
+                'changeRegistrationStatuses', [self.buyers[i:i + REGISTRATION_CHUNK], True])
+            success, gas_used = self.send(accounts[0], 0, data, 10**8, 0)
+            if not success:
+                raise ValueError('Registering buyers {} to {} failed'.format(i, i + REGISTRATION_CHUNK))
+            transactions += 1
+            gas += gas_used
+        self.state.gas_limit = self.block_gas_limit
+        self.state.gas_used = 0
+        for buyer in self.buyers:
+            self.state.set_balance(buyer, 10**30)
+        self.registration = {'transactions': transactions,
+                             'gas': gas,
+                             'blocks': -(-gas // self.block_gas_limit),
+                             'time': time.time() - started}
+
+    def period_start(self, period):
+        return {'first': self.startBlock, 'second': self.firstCapEndingBlock, 'open': self.secondCapEndingBlock}[period]
+
+    def gas_price(self):
+        if self.random.random() < self.overpriced:
+            return self.gasLimitInWei + 9 * 10**9
+        return self.random.randint(1, self.gasLimitInWei // 10**9) * 10**9
+
+    def purchases_of(self, wave_number, wave):
+        participants = self.random.sample(self.buyers, int(len(self.buyers) * wave['fraction']))
+        return [(wave_number, buyer, int(self.random.uniform(wave['min'], wave['max']) * 10**18), self.gas_price())
+                for buyer in participants]
+
+    def rejection(self, buyer, value, gas_price):
+        # Why claimTokens rejects a purchase, following the checks of the contract
+        block = self.state.block_number
+        tokens = value * self.exchangeRate
+        if not self.startBlock <= block < self.endBlock:
+            return 'closed'
+        if block < self.secondCapEndingBlock:
+            if gas_price > self.gasLimitInWei:
+                return 'gas price'
+            cap = self.baseTokenCapPerAddress if block < self.firstCapEndingBlock else self.baseTokenCapPerAddress * 4
+            if self.purchases[buyer] + tokens > cap:
+                return 'cap'
+        if self.assigned + tokens > self.saleSupply:
+            return 'supply'
+        return None
+
+    def run(self):
+        self.register_buyers()
+        waves = sorted(enumerate(self.waves), key=lambda w: self.period_start(w[1]['period']))
+        stats = [dict(wave, sent=0, succeeded=0, gas=0, ether=0, firstBlock=None, lastBlock=None,
+                      rejected=dict((reason, 0) for reason in REASONS)) for wave in self.waves]
+        pool, sequence = [], 0
+        self.state.block_number = self.startBlock
+
+        while pool or waves:
+            # Waves whose period started join the pool, an idle chain skips ahead to the next wave
+            if not pool and self.state.block_number < self.period_start(waves[0][1]['period']):
+                self.state.block_number = self.period_start(waves[0][1]['period'])
+            while waves and self.period_start(waves[0][1]['period']) <= self.state.block_number:
+                wave_number, wave = waves.pop(0)
+                for purchase in self.purchases_of(wave_number, wave):
+                    heapq.heappush(pool, (-purchase[3], sequence, purchase))
+                    sequence += 1
+
+            block = {'number': self.state.block_number, 'transactions': 0, 'succeeded': 0, 'gas': 0}
+            while pool and self.state.gas_used + CLAIM_GAS <= self.state.gas_limit:
+                wave_number, buyer, value, gas_price = heapq.heappop(pool)[2]
+                wave = stats[wave_number]
+                reason = self.rejection(buyer, value, gas_price)
+                success, gas_used = self.send(buyer, value, self.claim_data, CLAIM_GAS, gas_price)
+                wave['sent'] += 1
+                wave['gas'] += gas_used
+                wave['firstBlock'] = wave['firstBlock'] or self.state.block_number
+                wave['lastBlock'] = self.state.block_number
+                block['transactions'] += 1
+                block['gas'] += gas_used
+                if success:
+                    self.purchases[buyer] += value * self.exchangeRate
+                    self.assigned += value * self.exchangeRate
+                    wave['succeeded'] += 1
+                    wave['ether'] += value
+                    block['succeeded'] += 1
+                else:
+                    wave['rejected'][reason or 'other'] += 1
+                    if reason == 'supply' and self.supply_exhausted is None:
+                        self.supply_exhausted = {'block': self.state.block_number,
+                                                 'blocksAfterStart': self.state.block_number - self.startBlock,
+                                                 'secondsAfterStart': (self.state.block_number - self.startBlock) *
+                                                 BLOCK_TIME,
+                                                 'remainingSupply': self.saleSupply - self.assigned}
+            if pool and not block['transactions']:
+                # An empty block would be sealed again and again
+                raise ValueError('Block gas limit {} does not fit a single purchase of {} gas'.format(
+                    self.state.gas_limit, CLAIM_GAS))
+            self.blocks.append(block)
+            self.seal_block()
+        return stats
+
+    def report(self, stats, elapsed):
+        sent = sum(wave['sent'] for wave in stats)
+        return {'buyers': len(self.buyers),
+                'blockGasLimit': self.block_gas_limit,
+                'registration': self.registration,
+                'waves': stats,
+                'supplyExhausted': self.supply_exhausted,
+                'assignedSupply': self.assigned,
+                'blocks': self.blocks,
+                'transactions': sent,
+                'elapsed': elapsed,
+                'transactionsPerSecond': sent / elapsed if elapsed else 0}
+
+
+def format_report(report):
+    lines = ['{} buyers registered in {} transactions using {} gas ({} blocks at a {} block gas limit)'.format(
+        report['buyers'], report['registration']['transactions'], report['registration']['gas'],
+        report['registration']['blocks'], report['blockGasLimit'])]
+    columns = '{:<24} {:>7} {:>7} {:>7} {:>9} {:>7} {:>7} {:>7} {:>7} {:>9} {:>9}'
+    lines.append(columns.format('wave', 'sent', 'ok', 'cap', 'gas price', 'supply', 'closed', 'other', 'blocks',
+                                'tx/block', 'ether'))
+    for wave in report['waves']:
+        blocks = wave['lastBlock'] - wave['firstBlock'] + 1 if wave['firstBlock'] else 0
+        lines.append(columns.format(
+            '{} {}-{} ETH'.format(wave['period'], wave['min'], wave['max']), wave['sent'], wave['succeeded'],
+            *([wave['rejected'][reason] for reason in REASONS] +
+              [blocks, '{:.1f}'.format(wave['sent'] / float(blocks)) if blocks else '-',
+               '{:.0f}'.format(wave['ether'] / 10.0**18)])))
+    busy = [block for block in report['blocks'] if block['transactions']]
+    if busy:
+        lines.append('Transactions per block: {:.1f} mean, {} max over {} blocks, {:.0f} gas per block'.format(
+            sum(b['transactions'] for b in busy) / float(len(busy)), max(b['transactions'] for b in busy), len(busy),
+            sum(b['gas'] for b in busy) / float(len(busy))))
+    exhausted = report['supplyExhausted']
+    if exhausted:
+        lines.append('Supply exhausted at block {}, {} blocks (~{}s) after the sale started, {} GMT left'.format(
+            exhausted['block'], exhausted['blocksAfterStart'], exhausted['secondsAfterStart'],
+            exhausted['remainingSupply'] / 10.0**18))
+    else:
+        lines.append('Supply not exhausted, {} GMT sold'.format(report['assignedSupply'] / 10.0**18))
+    lines.append('Simulated {} purchases in {:.1f}s ({:.0f} transactions/s)'.format(
+        report['transactions'], report['elapsed'], report['transactionsPerSecond']))
+    return lines
+
+
+@click.command()
+@click.option('--buyers', '-n', default=10000, help='Number of synthetic registered buyers')
+@click.option('--wave', 'waves', multiple=True, help='Purchase wave as PERIOD:FRACTION:MIN-MAX Ether, '
+                                                     'PERIOD is one of first, second or open')
+@click.option('--overpriced', default=0.05, help='Fraction of purchases priced above gasLimitInWei')
+@click.option('--block-gas-limit', default=SaleSimulation.block_gas_limit, help='Gas limit of simulated blocks')
+@click.option('--seed', default=0, help='Seed of the random purchase values and gas prices')
+@click.option('--output', help='Write the full report, including every block, as JSON to this file')
+def setup(buyers, waves, overpriced, block_gas_limit, seed, output):
+    """
+    run the sale simulation with python -m tests.benchmarks.sale_load [-n BUYERS] [--wave PERIOD:FRACTION:MIN-MAX]
+    """
+    if block_gas_limit < CLAIM_GAS:
+        raise click.BadParameter('must be at least the {} gas of a purchase'.format(CLAIM_GAS),
+                                 param_hint='--block-gas-limit')
+    SaleSimulation.block_gas_limit = block_gas_limit
+    SaleSimulation.setUpClass()
+    simulation = SaleSimulation(buyers, [parse_wave(wave) for wave in waves or DEFAULT_WAVES], overpriced, seed)
+
+    started = time.time()
+    report = simulation.report(simulation.run(), time.time() - started)
+    print('\n'.join(format_report(report)))
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(report, output_file, indent=4)
+        print('Report written to {}'.format(output))
+
+
+if __name__ == '__main__':
+    setup()
@@ -0,0 +1,133 @@
+# standard libraries
+import multiprocessing
+import sys
+import time
+import unittest
+# third party
+import click
+
+DEFAULT_MODULES = ['tests.tokens.test_gmt_token', 'tests.safe.test_gmt_safe',
+                   'tests.scripts.test_eth_codec', 'tests.scripts.test_eth_schedule',
+                   'tests.scripts.test_eth_view_cache', 'tests.scripts.test_eth_pending',
+                   'tests.scripts.test_eth_deploy_journal']
+
+
+class TimingResult(unittest.TestResult):
+    """
+    Records outcome and wall time of every test as plain tuples so results can
+    be sent back from a worker process.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TimingResult, self).__init__(*args, **kwargs)
+        self.records = []
+        self.started = None
+
+    def startTest(self, test):
+        super(TimingResult, self).startTest(test)
+        self.started = time.time()
+
+    def record(self, test, outcome, details=''):
+        self.records.append((test.id(), outcome, time.time() - (self.started or time.time()), details))
+
+    def addSuccess(self, test):
+        super(TimingResult, self).addSuccess(test)
+        self.record(test, 'ok')
+
+    def addFailure(self, test, err):
+        super(TimingResult, self).addFailure(test, err)
+        self.record(test, 'FAIL', self._exc_info_to_string(err, test))
+
+    def addError(self, test, err):
+        super(TimingResult, self).addError(test, err)
+        # Errors in setUpClass are reported against a placeholder, not a test
+        if isinstance(test, unittest.TestCase):
+            self.record(test, 'ERROR', self._exc_info_to_string(err, test))
+        else:
+            self.records.append((str(test), 'ERROR', 0, self._exc_info_to_string(err, test)))
+
+    def addSkip(self, test, reason):
+        super(TimingResult, self).addSkip(test, reason)
+        self.record(test, 'skip', reason)
+
+
+def list_tests(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for t in list_tests(test):
+                yield t
+        else:
+            yield test.id()
+
+
+def shard_tests(test_ids, shards):
+    # Round robin keeps the tests of a class contiguous inside each shard, so
+    # every worker deploys each test class only once
+    return [test_ids[i::shards] for i in range(shards) if test_ids[i::shards]]
+
+
+def run_shard(test_ids):
+    # The worker is timed as a whole, loading and every setUpClass compile and
+    # deploy included, not just the sum of its tests
+    started = time.time()
+    suite = unittest.TestLoader().loadTestsFromNames(test_ids)
+    result = TimingResult()
+    suite.run(result)
+    return result.records, time.time() - started
+
+
+def run_shards(shards):
+    started = time.time()
+    pool = multiprocessing.Pool(processes=len(shards) or 1)
+    try:
+        results = pool.map(run_shard, shards)
+    finally:
+        pool.close()
+        pool.join()
+    return [record for records, _ in results for record in records], [seconds for _, seconds in results], \
+        time.time() - started
+
+
+@click.command()
+@click.option('--workers', '-j', default=multiprocessing.cpu_count(), help='Number of worker processes')
+@click.option('--slowest', default=10, help='Number of slowest tests to report')
+@click.option('--serial/--no-serial', default=False,
+              help='Also run the tests in a single worker first and report the speedup over it')
+@click.argument('modules', nargs=-1)
+def setup(workers, slowest, serial, modules):
+    """
+    run tests in parallel with python -m tests.runner [-j WORKERS] [--serial] [MODULES]
+    """
+    suite = unittest.TestLoader().loadTestsFromNames(list(modules) or DEFAULT_MODULES)
+    test_ids = list(list_tests(suite))
+    shards = shard_tests(test_ids, workers)
+
+    # Every worker compiles and deploys the classes it runs, so summed worker
+    # times overstate what a serial run costs. The speedup is only reported
+    # against a measured serial run
+    serial_time = run_shards([test_ids])[2] if serial and test_ids else None
+    records, worker_times, wall_time = run_shards(shards)
+
+    failed = [r for r in records if r[1] in ('FAIL', 'ERROR')]
+    for test_id, outcome, _, details in failed:
+        print('=' * 70)
+        print('{}: {}'.format(outcome, test_id))
+        print('-' * 70)
+        print(details)
+
+    print('Slowest tests:')
+    for test_id, outcome, duration, _ in sorted(records, key=lambda r: r[2], reverse=True)[:slowest]:
+        print('  {:8.3f}s {} {}'.format(duration, outcome, test_id))
+
+    print('-' * 70)
+    print('Ran {} tests in {:.3f}s on {} workers (slowest worker {:.3f}s)'.format(
+        len(records), wall_time, len(shards), max(worker_times or [0])))
+    if serial_time is not None:
+        print('Serial run took {:.3f}s, {:.1f}x speedup'.format(
+            serial_time, serial_time / wall_time if wall_time else 0))
+    print('FAILED (failures={})'.format(len(failed)) if failed else 'OK')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    setup()
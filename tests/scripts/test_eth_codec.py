@@ -0,0 +1,113 @@
+# standard libraries
+from unittest import TestCase
+import json
+import os
+import sys
+# ethereum package
+from ethereum.abi import ContractTranslator, EncodingError, encode_abi
+
+OWN_DIR = os.path.dirname(os.path.realpath(__file__))
+
+sys.path.insert(0, os.path.realpath(os.path.join(OWN_DIR, '..', '..', 'scripts')))
+from eth_codec import ContractCodec
+
+ABI_DIR = os.path.realpath(os.path.join(OWN_DIR, '..', '..', 'abi'))
+
+ADDRESSES = ['0x' + '00' * 20,
+             '0x' + 'ff' * 20,
+             '0xB3bD49E28f8F832b8d1E246106991e546c323502',
+             'b3bd49e28f8f832b8d1e246106991e546c323502',
+             bytes(range(20))]
+
+
+def boundary_values(type_string):
+    # Smallest, largest and a few typical values of an ABI type
+    if type_string.endswith('[]'):
+        element = boundary_values(type_string[:-2])
+        return [[], element[:1], element]
+    if type_string.startswith('uint'):
+        bits = int(type_string[4:] or 256)
+        return [0, 1, 2 ** (bits - 1), 2 ** bits - 1]
+    if type_string.startswith('int'):
+        bits = int(type_string[3:] or 256)
+        return [-2 ** (bits - 1), -1, 0, 1, 2 ** (bits - 1) - 1]
+    if type_string == 'address':
+        return ADDRESSES
+    if type_string == 'bool':
+        return [False, True]
+    if type_string == 'string':
+        return ['', 'Global Messaging Token']
+    if type_string == 'bytes':
+        return [b'', b'\x01' * 33]
+    if type_string.startswith('bytes'):
+        size = int(type_string[5:])
+        return [b'', b'\x01', b'\xff' * size]
+    raise ValueError('No boundary values for {}'.format(type_string))
+
+
+def argument_lists(types):
+    # Every boundary value of every argument appears in at least one list
+    values = [boundary_values(t) for t in types]
+    count = max([len(v) for v in values] or [1])
+    return [[v[i % len(v)] for v in values] for i in range(count)]
+
+
+def typed(values):
+    return [(type(value), typed(value) if isinstance(value, list) else value) for value in values]
+
+
+def contract_abi(file_name, contract_name):
+    with open(os.path.join(ABI_DIR, file_name), 'r') as abi_file:
+        units = json.load(abi_file)
+    return [output['abi'] for unit, output in units.items() if unit.endswith(':' + contract_name)][0]
+
+
+class TestContractCodec(TestCase):
+    """
+    run test with python -m unittest tests.scripts.test_eth_codec
+    """
+
+    def assert_same_codec(self, abi):
+        codec = ContractCodec(abi)
+        translator = ContractTranslator(abi)
+        for name, description in translator.function_data.items():
+            for args in argument_lists(description['encode_types']):
+                self.assertEqual(codec.encode_function_call(name, args),
+                                 translator.encode_function_call(name, args),
+                                 '{}({})'.format(name, args))
+            for result in argument_lists(description['decode_types']):
+                data = encode_abi(description['decode_types'], result)
+                # Types are compared too, 1 == True would hide a bool decoded as int
+                self.assertEqual(typed(codec.decode_function_result(name, data)),
+                                 typed(translator.decode_function_result(name, data)),
+                                 '{} -> {}'.format(name, result))
+        if translator.constructor_data:
+            for args in argument_lists(translator.constructor_data['encode_types']):
+                self.assertEqual(codec.encode_constructor_arguments(args),
+                                 translator.encode_constructor_arguments(args))
+
+    def test_gmt_token(self):
+        self.assert_same_codec(contract_abi('GMToken.json', 'GMToken'))
+
+    def test_gmt_safe(self):
+        self.assert_same_codec(contract_abi('GMTSafe.json', 'GMTSafe'))
+
+    def test_encode_calls(self):
+        abi = contract_abi('GMToken.json', 'GMToken')
+        codec = ContractCodec(abi)
+        translator = ContractTranslator(abi)
+        args_list = [[address] for address in ADDRESSES]
+        self.assertEqual(codec.encode_calls('registered', args_list),
+                         ['0x' + translator.encode_function_call('registered', args).hex() for args in args_list])
+
+    def test_out_of_bounds(self):
+        codec = ContractCodec(contract_abi('GMToken.json', 'GMToken'))
+        for args in ([ADDRESSES[0], -1], [ADDRESSES[0], 2 ** 256]):
+            with self.assertRaises(EncodingError):
+                codec.encode_function_call('transfer', args)
+
+    def test_malformed_address(self):
+        codec = ContractCodec(contract_abi('GMToken.json', 'GMToken'))
+        for address in ['1x' + 'ab' * 20, '0x' + 'zz' * 20, '0x' + ' a' * 20, 'ab' * 19 + ' a']:
+            with self.assertRaises(EncodingError):
+                codec.encode_function_call('registered', [address])
@@ -0,0 +1,54 @@
+# standard libraries
+from unittest import TestCase
+import os
+import shutil
+import sys
+import tempfile
+
+OWN_DIR = os.path.dirname(os.path.realpath(__file__))
+
+sys.path.insert(0, os.path.realpath(os.path.join(OWN_DIR, '..', '..', 'scripts')))
+from eth_deploy_journal import BROADCAST, MINED, SENDING, DeploymentJournal
+
+SENDER = '0x' + 'AB' * 20
+
+
+class TestDeploymentJournal(TestCase):
+    """
+    run test with python -m unittest tests.scripts.test_eth_deploy_journal
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'instructions.json.journal.json')
+        self.instruction = {'type': 'deployment', 'label': 'Token', 'params': [1, 2]}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_states_survive_restarts(self):
+        journal = DeploymentJournal(self.path, '1', SENDER)
+        journal.record('Token', self.instruction, SENDING, nonce=3)
+        journal.record('Token', self.instruction, BROADCAST, transactionHash='0x01')
+        self.assertEqual(DeploymentJournal(self.path, '1', SENDER.lower()).get('Token', self.instruction),
+                         {'digest': journal.data['deployments']['Token']['digest'],
+                          'state': BROADCAST, 'nonce': 3, 'transactionHash': '0x01'})
+
+    def test_changed_instruction(self):
+        journal = DeploymentJournal(self.path, '1', SENDER)
+        journal.record('Token', self.instruction, MINED, address='0x02')
+        changed = dict(self.instruction, params=[1, 3])
+        self.assertIsNone(journal.get('Token', changed))
+        self.assertIsNone(journal.get('Safe', self.instruction))
+
+        # Deploying the changed instruction starts a new entry
+        journal.record('Token', changed, SENDING, nonce=4)
+        self.assertEqual(journal.get('Token', changed)['state'], SENDING)
+        self.assertNotIn('address', journal.get('Token', changed))
+
+    def test_other_network_or_account(self):
+        DeploymentJournal(self.path, '1', SENDER).record('Token', self.instruction, SENDING, nonce=0)
+        with self.assertRaisesRegex(ValueError, 'belongs to account'):
+            DeploymentJournal(self.path, '3', SENDER)
+        with self.assertRaisesRegex(ValueError, 'belongs to account'):
+            DeploymentJournal(self.path, '1', '0x' + 'cd' * 20)
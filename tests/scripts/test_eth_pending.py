@@ -0,0 +1,88 @@
+# standard libraries
+from unittest import TestCase
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+OWN_DIR = os.path.dirname(os.path.realpath(__file__))
+
+sys.path.insert(0, os.path.realpath(os.path.join(OWN_DIR, '..', '..', 'scripts')))
+from eth_pending import MINED, PENDING, REPLACED, PendingTransactions
+
+SENDER = '0x' + 'ab' * 20
+
+
+def transaction(nonce, gas_price=1, data='0x'):
+    return {'from': SENDER, 'to': '0x' + 'cd' * 20, 'value': 0, 'data': data, 'gas': 21000,
+            'gasPrice': gas_price, 'nonce': nonce}
+
+
+def receipt(block_number):
+    return {'blockNumber': hex(block_number), 'gasUsed': '0x5208', 'status': '0x1'}
+
+
+class TestPendingTransactions(TestCase):
+    """
+    run test with python -m unittest tests.scripts.test_eth_pending
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'pending.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def journal(self, **kwargs):
+        return PendingTransactions(self.path, None, None, None, **kwargs)
+
+    def test_find(self):
+        pending = self.journal()
+        pending.track('0x01', transaction(0))
+        pending.track('0x02', transaction(0, gas_price=2))
+        self.assertEqual(pending.find(transaction(0)), '0x01')
+        self.assertEqual(pending.find(dict(transaction(0, gas_price=2), **{'from': SENDER.upper()})), '0x02')
+        self.assertIsNone(pending.find(transaction(0, data='0x00')))
+        self.assertIsNone(pending.find(transaction(1)))
+
+    def test_mined_replacement(self):
+        pending = self.journal()
+        pending.track('0x01', transaction(0))
+        pending.track('0x02', transaction(0, gas_price=2))
+        pending.track('0x03', transaction(1))
+        self.assertEqual(sorted(pending.pending()), ['0x01', '0x02', '0x03'])
+        pending.record_receipts(['0x01', '0x02'], [None, receipt(10)])
+        self.assertEqual([pending.entries[h]['status'] for h in ('0x01', '0x02', '0x03')], [REPLACED, MINED, PENDING])
+        self.assertEqual(pending.entries['0x02']['blockNumber'], 10)
+        self.assertEqual(pending.pending(), ['0x03'])
+
+    def test_prune(self):
+        pending = self.journal(prune_after=5)
+        pending.track('0x01', transaction(0))
+        pending.track('0x02', transaction(1))
+        pending.record_receipts(['0x01', '0x02'], [receipt(10), receipt(12)])
+        pending.prune(14)
+        self.assertEqual(sorted(pending.entries), ['0x01', '0x02'])
+        # A hash somebody waits on is kept however old it is
+        pending.waiting['0x02'] += 1
+        pending.prune(20)
+        self.assertEqual(sorted(pending.entries), ['0x02'])
+        self.assertNotIn((SENDER, 0), pending.groups)
+
+    def test_save_merges_other_processes(self):
+        first = self.journal()
+        second = self.journal()
+        first.track('0x01', transaction(0))
+        first.save()
+        second.track('0x02', transaction(1))
+        second.save()
+        with open(self.path, 'r') as journal_file:
+            self.assertEqual(sorted(json.load(journal_file)), ['0x01', '0x02'])
+
+        # Pruned entries are removed from the file, the other process' entries stay
+        first.record_receipts(['0x01'], [receipt(10)])
+        first.prune(200)
+        first.save()
+        self.assertEqual(sorted(self.journal().entries), ['0x02'])
@@ -0,0 +1,64 @@
+# standard libraries
+from unittest import TestCase
+import os
+import sys
+
+OWN_DIR = os.path.dirname(os.path.realpath(__file__))
+
+sys.path.insert(0, os.path.realpath(os.path.join(OWN_DIR, '..', '..', 'scripts')))
+from eth_schedule import DeploymentGraph
+
+
+def get_label(instruction):
+    return instruction.get('label')
+
+
+def deployment(label, params=(), libraries=None):
+    instruction = {'type': 'deployment', 'label': label, 'params': list(params)}
+    if libraries:
+        instruction['libraries'] = libraries
+    return instruction
+
+
+class TestDeploymentGraph(TestCase):
+    """
+    run test with python -m unittest tests.scripts.test_eth_schedule
+    """
+
+    def test_rounds(self):
+        graph = DeploymentGraph([deployment('SafeMath'),
+                                 deployment('Token', ['0x' + '00' * 20, 5], {'SafeMath': 'SafeMath'}),
+                                 {'type': 'abi', 'abi': [], 'addresses': []},
+                                 deployment('Safe', ['Token']),
+                                 deployment('Wallet', [['Token', 'Safe']]),
+                                 deployment('Registry')],
+                                get_label)
+        self.assertEqual(graph.rounds(), [['SafeMath', 'Registry'], ['Token'], ['Safe'], ['Wallet']])
+        self.assertEqual(graph.dependencies['Wallet'], ['Token', 'Safe'])
+        self.assertEqual(graph.critical_path(), ['SafeMath', 'Token', 'Safe', 'Wallet'])
+
+    def test_unknown_references_are_plain_params(self):
+        graph = DeploymentGraph([deployment('Token', ['GMT', 'Safe'])], get_label)
+        self.assertEqual(graph.dependencies['Token'], [])
+        self.assertEqual(graph.rounds(), [['Token']])
+
+    def test_empty(self):
+        graph = DeploymentGraph([], get_label)
+        self.assertEqual(graph.rounds(), [])
+        self.assertEqual(graph.critical_path(), [])
+
+    def test_cycle(self):
+        with self.assertRaisesRegex(ValueError, 'Circular reference'):
+            DeploymentGraph([deployment('A', ['C']), deployment('B', ['A']), deployment('C', ['B'])], get_label)
+
+    def test_self_reference(self):
+        with self.assertRaisesRegex(ValueError, 'Circular reference'):
+            DeploymentGraph([deployment('A', ['A'])], get_label)
+
+    def test_duplicate_label(self):
+        with self.assertRaisesRegex(ValueError, 'Duplicate deployment label'):
+            DeploymentGraph([deployment('A'), deployment('A')], get_label)
+
+    def test_missing_label(self):
+        with self.assertRaisesRegex(ValueError, 'need a label'):
+            DeploymentGraph([deployment(None)], get_label)
@@ -0,0 +1,130 @@
+# standard libraries
+from unittest import TestCase
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+OWN_DIR = os.path.dirname(os.path.realpath(__file__))
+
+sys.path.insert(0, os.path.realpath(os.path.join(OWN_DIR, '..', '..', 'scripts')))
+from eth_view_cache import BLOCK, CONSTANT, IMMUTABLE, ViewCache, classify, source_path_for
+
+CONTRACTS_DIR = os.path.realpath(os.path.join(OWN_DIR, '..', '..', 'contracts'))
+ABI_DIR = os.path.realpath(os.path.join(OWN_DIR, '..', '..', 'abi'))
+
+
+def contract_abi(file_name, contract_name):
+    with open(os.path.join(ABI_DIR, file_name), 'r') as abi_file:
+        units = json.load(abi_file)
+    return [output['abi'] for unit, output in units.items() if unit.endswith(':' + contract_name)][0]
+
+
+def read_source(path):
+    with open(os.path.join(CONTRACTS_DIR, path), 'r') as source_file:
+        return source_file.read()
+
+
+class FakeContractBatch:
+    """
+    Answers eth_call with the values in results, keyed by function name, and
+    counts the calls that reached the node.
+    """
+
+    address = '0x' + 'ab' * 20
+
+    def __init__(self, results, code='0x6000'):
+        self.results = results
+        self.code = code
+        self.rpc = self
+        self.calls = 0
+
+    def batch(self, calls):
+        if calls[0][0] == 'net_version':
+            return ['1', self.code]
+        self.calls += len(calls)
+        return [self.results[params[0]] for _, params in calls]
+
+    def block_number(self):
+        return 100
+
+    def eth_call(self, function_name, args, _from=None, block='latest'):
+        return 'eth_call', [function_name, block]
+
+    def decode(self, function_name, result):
+        if result == '0x':
+            raise ValueError('Empty result of {}'.format(function_name))
+        return int(result, 16)
+
+
+class TestClassify(TestCase):
+    """
+    run test with python -m unittest tests.scripts.test_eth_view_cache
+    """
+
+    def test_gmt_token(self):
+        classes = classify(contract_abi('GMToken.json', 'GMToken'), read_source('Tokens/GMTokenFlattened.sol'))
+        for name in ('name', 'symbol', 'decimals', 'tokenUnit', 'minCap', 'gmtFund', 'gasLimitInWei',
+                     'baseEthCapPerAddress', 'blocksInFirstCapPeriod', 'blocksInSecondCapPeriod'):
+            self.assertEqual(classes[name], CONSTANT, name)
+        for name in ('startBlock', 'endBlock', 'firstCapEndingBlock', 'secondCapEndingBlock', 'tokenExchangeRate',
+                     'baseTokenCapPerAddress', 'ethFundAddress', 'gmtFundAddress', 'totalSupply'):
+            self.assertEqual(classes[name], IMMUTABLE, name)
+        for name in ('assignedSupply', 'isStopped', 'isFinalized', 'owner', 'registered', 'purchases',
+                     'balanceOf', 'allowance'):
+            self.assertEqual(classes[name], BLOCK, name)
+        # Only view functions are classified
+        self.assertNotIn('claimTokens', classes)
+
+    def test_gmt_safe(self):
+        classes = classify(contract_abi('GMTSafe.json', 'GMTSafe'), read_source('Safe/GMTSafeFlattened.sol'))
+        self.assertEqual(classes, {'gmtAddress': IMMUTABLE, 'unlockDate': IMMUTABLE})
+
+    def test_without_source(self):
+        classes = classify(contract_abi('GMToken.json', 'GMToken'))
+        self.assertEqual(set(classes.values()), {BLOCK})
+
+    def test_source_path_for(self):
+        self.assertEqual(os.path.realpath(source_path_for(contract_abi('GMTSafe.json', 'GMTSafe'))),
+                         os.path.join(CONTRACTS_DIR, 'Safe', 'GMTSafeFlattened.sol'))
+        self.assertIsNone(source_path_for([{'type': 'function', 'name': 'unknown', 'inputs': [], 'outputs': []}]))
+
+
+class TestViewCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'view_cache.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hits_and_misses(self):
+        batch = FakeContractBatch({'startBlock': '0x05', 'assignedSupply': '0x07'})
+        cache = ViewCache(batch, {'startBlock': IMMUTABLE, 'assignedSupply': BLOCK})
+        calls = [('startBlock', ()), ('assignedSupply', ())]
+        self.assertEqual(cache.call(calls), [5, 7])
+        self.assertEqual(cache.call(calls), [5, 7])
+        self.assertEqual(batch.calls, 2)
+        self.assertEqual(cache.stats()[IMMUTABLE]['hits'], 1)
+        self.assertEqual(cache.stats()[BLOCK]['misses'], 1)
+
+    def test_empty_result_is_not_cached(self):
+        batch = FakeContractBatch({'startBlock': '0x'})
+        cache = ViewCache(batch, {'startBlock': IMMUTABLE}, path=self.path)
+        with self.assertRaises(ValueError):
+            cache.call([('startBlock', ())])
+        self.assertEqual(cache.permanent, {})
+        self.assertFalse(os.path.isfile(self.path))
+
+    def test_saved_values_need_the_same_code(self):
+        batch = FakeContractBatch({'startBlock': '0x05'})
+        ViewCache(batch, {'startBlock': IMMUTABLE}, path=self.path).call([('startBlock', ())])
+        self.assertEqual(ViewCache(batch, {'startBlock': IMMUTABLE}, path=self.path).call([('startBlock', ())]), [5])
+        self.assertEqual(batch.calls, 1)
+
+        # Redeployed at the same address after a chain reset
+        batch = FakeContractBatch({'startBlock': '0x06'}, code='0x6001')
+        self.assertEqual(ViewCache(batch, {'startBlock': IMMUTABLE}, path=self.path).call([('startBlock', ())]), [6])
+        self.assertEqual(batch.calls, 1)
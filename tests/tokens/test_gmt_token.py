@@ -7,25 +7,25 @@ class TestContract(AbstractTestContracts):
     run test with python -m unittest tests.tokens.test_gmt_token
     """
 
-    def __init__(self, *args, **kwargs):
-        super(TestContract, self).__init__(*args, **kwargs)
+    @classmethod
+    def deploy_contracts(cls):
         # NOTE: balances default to 1 ETH
-        self.gmt_wallet_address = accounts[1]
-        self.eth_wallet_address = accounts[2]
-        self.startBlock = 4097906
-        self.exchangeRate = 5000
-        self.saleDuration = round((30*60*60*24)/18)
-        self.endBlock = self.startBlock + self.saleDuration
-        self.gmt_token= self.create_contract('Tokens/GMTokenFlattened.sol',
-                                                args=(self.eth_wallet_address,
-                                                self.gmt_wallet_address,
-                                                self.startBlock,
-                                                self.endBlock,
-                                                self.exchangeRate))
-        self.owner = self.gmt_token.owner()
-        self.gmtFund = 500000000 * (10**18)
-        self.totalSupply = 1000000000 * (10**18)
-        self.m = 4316
+        cls.gmt_wallet_address = accounts[1]
+        cls.eth_wallet_address = accounts[2]
+        cls.startBlock = 4097906
+        cls.exchangeRate = 5000
+        cls.saleDuration = round((30*60*60*24)/18)
+        cls.endBlock = cls.startBlock + cls.saleDuration
+        cls.gmt_token= cls.create_contract('Tokens/GMTokenFlattened.sol',
+                                                args=(cls.eth_wallet_address,
+                                                cls.gmt_wallet_address,
+                                                cls.startBlock,
+                                                cls.endBlock,
+                                                cls.exchangeRate))
+        cls.owner = cls.gmt_token.owner()
+        cls.gmtFund = 500000000 * (10**18)
+        cls.totalSupply = 1000000000 * (10**18)
+        cls.m = 4316
         
 
     def test_meta_data(self):